@@ -0,0 +1,300 @@
+"""
+Harness of the endpoint benchmarks in `store/tests.py` and `order/tests.py`.
+
+The benchmarks seed a synthetic catalog, request every endpoint and record its query
+count, p50/p95 latency, peak Python memory and response size. Query counts are checked
+against budgets that do not depend on the size of the catalog, and endpoints with a budget
+must not repeat a query shape (see `ecommerce_platform/query_inspector.py`), so N+1
+patterns fail the tests. They are configured with environment variables:
+
+* `BENCHMARK_SIZES`: comma-separated catalog sizes in products, "1000" by default,
+  e.g. "1000,10000,100000". The catalog grows from one size to the next.
+* `BENCHMARK_REPEAT`: number of timed requests per endpoint, 10 by default.
+* `BENCHMARK_REPORT`: path of a JSON report holding every measurement, to compare
+  between commits. No report is written when it is not set.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from decimal import Decimal
+from typing import Callable, Optional
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from store.category_tree import load_category_tree, refresh_primary_roots
+from store.models import Category, Product
+from store.search import get_search_backend
+from store.stats import rebuild_category_stats
+
+from .query_inspector import inspect_queries
+
+MANUFACTURERS = ('Acme', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli', 'Vandelay')
+
+# A wide tree, 20 children under each of 20 children of the root, and a deep one,
+# a chain of 12 levels with 2 leaves on every level.
+WIDE_ROOT = 'Benchmark wide'
+DEEP_ROOT = 'Benchmark deep'
+
+
+def get_sizes() -> list[int]:
+    return [int(size) for size in os.environ.get('BENCHMARK_SIZES', '1000').split(',') if size]
+
+
+def get_repeat() -> int:
+    return int(os.environ.get('BENCHMARK_REPEAT', 10))
+
+
+def _tree_nodes() -> list[dict]:
+    wide = {'name': WIDE_ROOT, 'children': [
+        {'name': f'Wide {branch}', 'children': [
+            {'name': f'Wide {branch}.{leaf}', 'children': []} for leaf in range(20)
+        ]}
+        for branch in range(20)
+    ]}
+
+    deep = {'name': DEEP_ROOT, 'children': []}
+    node = deep
+    for level in range(1, 13):
+        child = {'name': f'Deep {level}', 'children': []}
+        node['children'] = [
+            child,
+            {'name': f'Deep {level} leaf a', 'children': []},
+            {'name': f'Deep {level} leaf b', 'children': []},
+        ]
+        node = child
+
+    for tree in (wide, deep):
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            node['description'] = ''
+            stack.extend(node['children'])
+
+    return [wide, deep]
+
+
+def seed_catalog(size: int, batch_size: int = 5000) -> None:
+    """
+    Grow the synthetic catalog to `size` products, every product belonging to a
+    leaf of the wide tree and to a category of the deep tree.
+
+    Primary roots, statistics and the search index are updated once the products are added.
+
+    @param size: The number of products the catalog must hold.
+    @param batch_size: Number of rows inserted per query.
+    """
+    if not Category.objects.filter(name=WIDE_ROOT).exists():
+        load_category_tree(_tree_nodes())
+
+    wide_leaves = list(Category.objects.filter(
+        tree_id=Category.objects.get(name=WIDE_ROOT).tree_id, level=2
+    ).values_list('id', flat=True))
+    deep_categories = list(Category.objects.filter(
+        tree_id=Category.objects.get(name=DEEP_ROOT).tree_id, level__gt=0
+    ).values_list('id', flat=True))
+
+    start = Product.objects.filter(sku__startswith='BENCH-').count()
+    through = Product.categories.through
+    for offset in range(start, size, batch_size):
+        products = Product.objects.bulk_create([
+            Product(
+                sku=f'BENCH-{index}',
+                name=f'Benchmark product {index}',
+                description=f'Synthetic product number {index} of the benchmark catalog.',
+                manufacturer=MANUFACTURERS[index % len(MANUFACTURERS)],
+                price=Decimal(index % 5000) + Decimal('0.99'),
+                stock_quantity=index % 7 * 1000,
+            )
+            for index in range(offset, min(offset + batch_size, size))
+        ])
+        through.objects.bulk_create([
+            through(product_id=product.pk, category_id=category_id)
+            for product in products
+            for category_id in (
+                wide_leaves[product.pk % len(wide_leaves)],
+                deep_categories[product.pk % len(deep_categories)],
+            )
+        ])
+
+    refresh_primary_roots(Product.objects.filter(primary_root__isnull=True).values('id'))
+    rebuild_category_stats()
+    get_search_backend().rebuild()
+
+
+def _percentile(samples: list[float], percent: int) -> float:
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[percent - 1]
+
+
+def _consume(response: HttpResponse) -> HttpResponse:
+    # Streaming responses run their queries while the content is iterated.
+    if response.streaming and response.is_async:
+        async_to_sync(_aconsume)(response)
+    elif response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+async def _aconsume(response: HttpResponse) -> None:
+    async for _ in response.streaming_content:
+        pass
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+            text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkReport:
+    """Measurements of a test run, written as JSON to `BENCHMARK_REPORT`."""
+    results: list[dict] = []
+
+    @classmethod
+    def add(cls, result: dict) -> None:
+        cls.results.append(result)
+
+    @classmethod
+    def write(cls) -> None:
+        path = os.environ.get('BENCHMARK_REPORT')
+        if not path:
+            return
+
+        report = {
+            'commit': _git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'repeat': get_repeat(),
+            'results': cls.results,
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+# Test mirrors of the replicas are separate connections, which do not see the rows
+# of the test transaction, so the benchmarks read everything from the primary.
+@override_settings(DATABASE_REPLICA_APPS=())
+class BenchmarkTestCase(TestCase):
+    """
+    Base class of the endpoint benchmarks.
+
+    Subclasses call `benchmark()` for every endpoint; the query budgets of
+    `query_budgets` are keyed by measurement label or URL name, and None marks an endpoint whose query
+    count still grows with the catalog, which is recorded but not checked.
+    """
+    query_budgets: dict[str, Optional[int]] = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        BenchmarkReport.write()
+
+    def benchmark(
+            self, name: str, size: int, url: str, client: Optional[Client | AsyncClient] = None,
+            method: str = 'get', data: Optional[dict] = None,
+            setup: Optional[Callable[[], None]] = None, expected_status: int = 200,
+            label: Optional[str] = None, headers: Optional[dict] = None,
+    ) -> dict:
+        """
+        Measure an endpoint and check its query count against its budget.
+
+        The query count and the peak memory come from one request, the latency from
+        `BENCHMARK_REPEAT` others. `setup` runs untimed before every request, e.g.
+        to clear the page cache or refill a cart.
+
+        Args:
+            name: The URL name, the key of the query budget unless the label has one.
+            size: The size of the catalog, recorded in the report.
+            url: The URL to request.
+            client: The test client, e.g. a logged-in one or an AsyncClient for
+                async views; a new client by default.
+            method: The HTTP method.
+            data: The request data.
+            setup: Called before every request.
+            expected_status: The expected response status code.
+            label: Name of the measurement in the report; the URL name by default.
+            headers: Extra request headers, e.g. If-None-Match.
+
+        Returns:
+            dict: The measurement.
+        """
+        client = client or Client()
+        send = getattr(client, method)
+        if isinstance(client, AsyncClient):
+            send = async_to_sync(send)
+
+        def request() -> HttpResponse:
+            return _consume(send(url, data, headers=headers))
+
+        def prepare() -> None:
+            if setup is not None:
+                setup()
+
+        prepare()
+        with CaptureQueriesContext(connection) as context, inspect_queries() as inspection:
+            response = request()
+        # Read the queries now, later requests reset the query log of the connection.
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(response.status_code, expected_status, f'{method.upper()} {url}')
+
+        prepare()
+        tracemalloc.start()
+        request()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings = []
+        for _ in range(get_repeat()):
+            prepare()
+            started = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        budget = self.query_budgets[label if label in self.query_budgets else name]
+
+        result = {
+            'name': label or name,
+            'url': url,
+            'method': method.upper(),
+            'size': size,
+            'queries': len(queries),
+            'budget': budget,
+            'repeated_queries': [
+                {'count': shape['count'], 'origin': shape['origin'], 'sql': shape['fingerprint']}
+                for shape in inspection.repeated
+            ],
+            'p50_ms': round(_percentile(timings, 50), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+            # Bytes sent, after compression; streamed content is not kept.
+            'response_bytes': None if response.streaming else len(response.content),
+        }
+        BenchmarkReport.add(result)
+
+        if budget is not None:
+            self.assertLessEqual(
+                len(queries), budget,
+                f'{url} ran {len(queries)} queries, over its budget of {budget}:\n'
+                + '\n'.join(queries),
+            )
+            self.assertFalse(
+                inspection.repeated, f'{url} repeats queries:\n' + '\n'.join(inspection.problems()),
+            )
+
+        return result
@@ -0,0 +1,102 @@
+"""
+Routing of the read-only catalog views to read replicas.
+
+Every database alias other than "default" is a replica of it. Views decorated with
+`use_replica` pick one replica for the whole request and read the models of
+`DATABASE_REPLICA_APPS` from it; every other read, such as sessions and users, and
+every write go to the primary. Without replicas, everything uses the primary.
+
+Replicas lag behind the primary, so whatever is cached under the current versions of
+`store.caching`, such as rendered pages, is read from the primary within `use_primary`:
+read from a replica right after a write, it could hold the data of the previous version
+for as long as the cache entry lives. Uncached JSON responses may still come from a
+replica a moment behind the version in their ETag.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Callable, Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_replica: ContextVar[Optional[str]] = ContextVar('replica', default=None)
+
+
+def replica_aliases() -> list[str]:
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def use_replica(view: Callable) -> Callable:
+    """
+    Read the catalog of a view from a replica, chosen at random for each request.
+
+    @param view: The view function, synchronous or asynchronous. It must not write
+        catalog data that it reads again afterwards.
+    @return: The decorated view.
+    """
+    def choose() -> Optional[str]:
+        aliases = replica_aliases()
+        return random.choice(aliases) if aliases else None
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = _replica.set(choose())
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _replica.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _replica.set(choose())
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _replica.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    """
+    Read from the primary within the block, also in `use_replica` views, e.g. to
+    build data cached under the current versions.
+    """
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send the catalog reads of `use_replica` views to their replica, everything else to the primary."""
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        # Related objects are read from the database their instance came from.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        alias = _replica.get()
+        if alias is not None and model._meta.app_label in settings.DATABASE_REPLICA_APPS:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        # Replicas receive the schema from the primary.
+        return False if db in replica_aliases() else None
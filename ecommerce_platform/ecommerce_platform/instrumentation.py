@@ -0,0 +1,54 @@
+"""
+Query execute wrappers that follow the request rather than the thread.
+
+`connection.execute_wrapper()` only applies to the connection object of the current
+thread. Under ASGI, the queries of an async view run in a worker thread of
+`sync_to_async`, with other connection objects than the event loop thread where the
+middleware runs. `query_wrapper()` therefore keeps its wrappers in a context variable,
+which `sync_to_async` copies into the worker thread, and a dispatcher installed once
+on every connection calls the wrappers of the current context.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Callable, Iterator
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_wrappers: ContextVar[tuple[Callable, ...]] = ContextVar('query_wrappers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    wrappers = _wrappers.get()
+    # The first registered wrapper is the outermost one, as with nested execute_wrapper().
+    for wrapper in reversed(wrappers):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_dispatcher(sender, connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+@contextmanager
+def query_wrapper(wrapper: Callable) -> Iterator[None]:
+    """
+    Call an execute wrapper around every query run in the current context, on any
+    database connection and in any thread reached through `sync_to_async`.
+
+    @param wrapper: Callable with the signature of `connection.execute_wrapper()` wrappers.
+    @return: Context manager registering the wrapper during the block.
+    """
+    # Connections of this thread may predate the connection_created receiver.
+    for connection in connections.all():
+        install_dispatcher(None, connection)
+
+    token = _wrappers.set((*_wrappers.get(), wrapper))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
@@ -0,0 +1,154 @@
+"""
+Serving of uploaded media with long-lived HTTP caching.
+
+URLs of files under `MEDIA_FINGERPRINT_PREFIXES` embed a hash of the file content,
+e.g. `/media/products/toaster.3f2a1b9c0d4e.jpg`. Such a URL always designates the
+same bytes, so its responses are marked immutable and cached by browsers for a year.
+Files under `MEDIA_CONTENT_ADDRESSED_PREFIXES` are named after their content when
+they are written, so their plain URLs are immutable already and are not hashed again.
+A new upload gets a new URL, and the pages referring to it are invalidated by the
+store cache versions.
+
+Every response carries an ETag and a Last-Modified header, and conditional requests
+are answered with 304 Not Modified. Files are streamed with FileResponse, which uses
+the `wsgi.file_wrapper` of the server (sendfile under gunicorn or uWSGI), or handed
+over to the front web server with `MEDIA_ACCEL_REDIRECT_PREFIX`.
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, HttpResponseRedirect
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+# Fingerprints keyed by file name, with the (mtime, size) they were computed for.
+_fingerprints: dict[str, tuple[int, int, str]] = {}
+
+
+def _is_content_addressed(name: str) -> bool:
+    return name.startswith(tuple(settings.MEDIA_CONTENT_ADDRESSED_PREFIXES))
+
+
+def _is_fingerprinted(name: str) -> bool:
+    return (name.startswith(tuple(settings.MEDIA_FINGERPRINT_PREFIXES))
+            and not _is_content_addressed(name))
+
+
+def file_fingerprint(path: str, name: str) -> str:
+    """
+    Return the content hash of a media file, computed once per version of the file.
+
+    @param path: The absolute path of the file.
+    @param name: The storage name of the file.
+    @return: The first 12 hex digits of the MD5 digest of the file.
+    @raise OSError: If the file cannot be read.
+    """
+    stat = os.stat(path)
+    cached = _fingerprints.get(name)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    digest = hashlib.md5(usedforsecurity=False)
+    with open(path, 'rb') as file:
+        while chunk := file.read(64 * 1024):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()[:12]
+    _fingerprints[name] = (stat.st_mtime_ns, stat.st_size, fingerprint)
+
+    return fingerprint
+
+
+class FingerprintedStorage(FileSystemStorage):
+    """File system storage whose URLs embed the content hash of fingerprinted files."""
+
+    def url(self, name):
+        if name and _is_fingerprinted(name):
+            try:
+                fingerprint = file_fingerprint(self.path(name), name)
+            except OSError:
+                return super().url(name)
+            root, ext = posixpath.splitext(name)
+            name = f'{root}.{fingerprint}{ext}'
+
+        return super().url(name)
+
+
+def _etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _file_response(path: str, name: str) -> HttpResponse:
+    accel_prefix: Optional[str] = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+
+    if accel_prefix:
+        # Let the front web server send the file from its internal location.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + name
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+
+    return response
+
+
+@require_safe
+def serve_media(request: HttpRequest, path: str) -> HttpResponse:
+    """
+    Serve a file of MEDIA_ROOT, resolving fingerprinted names to the stored file.
+
+    A fingerprinted URL whose hash no longer matches the file redirects to the
+    current URL of the file, so immutable responses never hold outdated content.
+
+    @param request: The HTTP request object.
+    @param path: The path of the file relative to MEDIA_URL.
+    @return: The file, a 304 response to a matching conditional request, or a redirect.
+    @raise Http404: If the file does not exist.
+    """
+    name = posixpath.normpath(path).lstrip('/')
+    fingerprint = None
+    match = FINGERPRINT_RE.match(name)
+    if match and _is_fingerprinted(name):
+        name = match['stem'] + match['ext']
+        fingerprint = match['fingerprint']
+
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(full_path)
+        current_fingerprint = file_fingerprint(full_path, name) if fingerprint else None
+    except (SuspiciousFileOperation, OSError):
+        raise Http404(f'"{path}" does not exist') from None
+    if not os.path.isfile(full_path):
+        raise Http404(f'"{path}" does not exist')
+
+    if fingerprint and fingerprint != current_fingerprint:
+        return HttpResponseRedirect(default_storage.url(name))
+
+    etag, last_modified = _etag(stat), int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(full_path, name)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+
+    if fingerprint or _is_content_addressed(name):
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_FINGERPRINT_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+
+    return response
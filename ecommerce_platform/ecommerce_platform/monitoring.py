@@ -0,0 +1,295 @@
+"""
+Lightweight per-request performance instrumentation.
+
+`PerformanceMiddleware` measures, for every request, the number and duration of
+database queries, the template rendering time and the total time. It reports them
+in a `Server-Timing` header, readable in the network panel of browsers, and adds
+them to rolling per-URL-name histograms kept in the cache, so every worker process
+contributes to the same statistics. Template rendering is timed by the
+`TimedDjangoTemplates` backend.
+
+Measurements are buffered in each process and added to the cache with atomic
+increments every `MONITORING_FLUSH_INTERVAL` seconds, so that a request costs a
+few timer calls rather than cache round trips. Statistics are grouped in windows
+of `MONITORING_WINDOW` seconds, and `monitoring_stats` returns those of the last
+`MONITORING_WINDOWS` windows.
+
+The middleware supports async views natively; queries are counted in whichever thread
+they run, see `ecommerce_platform/instrumentation.py`.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.template.backends.django import DjangoTemplates
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from .instrumentation import query_wrapper
+
+# Names of the per-request counters; durations are summed in microseconds.
+FIELDS = ('count', 'queries', 'db_us', 'template_us', 'total_us')
+UNRESOLVED = '<unresolved>'
+
+_current: ContextVar[Optional[dict]] = ContextVar('monitoring_request', default=None)
+
+
+def get_cache():
+    return caches[settings.MONITORING_CACHE_ALIAS]
+
+
+class TimedTemplate:
+    """Template wrapper adding its rendering time to the measurements of the request."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics['template_us'] += int((time.perf_counter() - started) * 1_000_000)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend whose templates report their rendering time."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class _Buffer:
+    """Measurements of this process not yet added to the cache, keyed by URL name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(lambda: defaultdict(int))
+        self.flushed_at = time.monotonic()
+
+    def add(self, name: str, metrics: dict) -> None:
+        bucket = _bucket(metrics['total_us'] / 1000)
+        with self.lock:
+            values = self.values[name]
+            for field in FIELDS:
+                values[field] += metrics[field]
+            values[f'bucket_{bucket}'] += 1
+
+    def flush(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.flushed_at < settings.MONITORING_FLUSH_INTERVAL:
+                return
+            pending, self.values = self.values, defaultdict(lambda: defaultdict(int))
+            self.flushed_at = now
+
+        cache = get_cache()
+        window = _window()
+        timeout = settings.MONITORING_WINDOW * (settings.MONITORING_WINDOWS + 1)
+        for name, values in pending.items():
+            for field, value in values.items():
+                key = _key(window, name, field)
+                # add() is a no-op when the key exists, then incr() is atomic.
+                cache.add(key, 0, timeout=timeout)
+                try:
+                    cache.incr(key, value)
+                except ValueError:
+                    cache.set(key, value, timeout=timeout)
+
+
+_buffer = _Buffer()
+
+
+def _window(now: Optional[float] = None) -> int:
+    return int((now or time.time()) // settings.MONITORING_WINDOW)
+
+
+def _key(window: int, name: str, field: str) -> str:
+    return f'monitoring:{window}:{name}:{field}'
+
+
+def _bucket(duration_ms: float) -> int:
+    """Index of the histogram bucket of a duration, the last one being unbounded."""
+    for index, bound in enumerate(settings.MONITORING_BUCKETS):
+        if duration_ms <= bound:
+            return index
+    return len(settings.MONITORING_BUCKETS)
+
+
+class PerformanceMiddleware:
+    """
+    Measure query count, database time, template time and total time of every request.
+
+    Must come first in MIDDLEWARE, so that the total time covers the other middleware.
+    Queries run while a streaming response is iterated are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.MONITORING_ENABLED:
+            return self.get_response(request)
+
+        metrics, execute_wrapper = self.start()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with query_wrapper(execute_wrapper):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.MONITORING_ENABLED:
+            return await self.get_response(request)
+
+        metrics, execute_wrapper = self.start()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with query_wrapper(execute_wrapper):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def start(self) -> tuple[dict, Callable]:
+        metrics = dict.fromkeys(FIELDS, 0)
+        metrics['count'] = 1
+
+        def execute_wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                metrics['queries'] += 1
+                metrics['db_us'] += int((time.perf_counter() - started) * 1_000_000)
+
+        return metrics, execute_wrapper
+
+    def finish(
+            self, request: HttpRequest, response: HttpResponse, metrics: dict, started: float
+    ) -> HttpResponse:
+        metrics['total_us'] = int((time.perf_counter() - started) * 1_000_000)
+
+        if settings.MONITORING_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics["db_us"] / 1000:.2f};desc="{metrics["queries"]} queries"',
+                f'tpl;dur={metrics["template_us"] / 1000:.2f}',
+                f'total;dur={metrics["total_us"] / 1000:.2f}',
+            ])
+
+        match = request.resolver_match
+        _buffer.add(match.view_name if match else UNRESOLVED, metrics)
+        _buffer.flush()
+
+        return response
+
+
+def _url_names(resolver: Optional[URLResolver] = None, namespace: str = '') -> list[str]:
+    """List the names of all URL patterns, prefixed with their namespaces."""
+    names = []
+    for pattern in (resolver or get_resolver()).url_patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            names.extend(_url_names(pattern, prefix))
+        elif isinstance(pattern, URLPattern):
+            names.append(f'{namespace}{pattern.name}' if pattern.name else pattern.lookup_str)
+    return names
+
+
+def _percentile(buckets: list[int], count: int, percent: int) -> Optional[float]:
+    """Upper bound of the bucket holding a percentile, None when it is unbounded."""
+    rank = count * percent / 100
+    seen = 0
+    for index, bucket_count in enumerate(buckets):
+        seen += bucket_count
+        if seen >= rank:
+            bounds = settings.MONITORING_BUCKETS
+            return bounds[index] if index < len(bounds) else None
+    return None
+
+
+def collect_stats() -> dict[str, dict]:
+    """
+    Merge the measurements of the last windows, including those of this process.
+
+    @return: Statistics keyed by URL name, for URL names with requests.
+    """
+    _buffer.flush(force=True)
+    current = _window()
+    windows = range(current - settings.MONITORING_WINDOWS + 1, current + 1)
+    fields = [*FIELDS, *(f'bucket_{index}' for index in range(len(settings.MONITORING_BUCKETS) + 1))]
+    names = [*_url_names(), UNRESOLVED]
+
+    values = get_cache().get_many([
+        _key(window, name, field) for window in windows for name in names for field in fields
+    ])
+    stats = {}
+    for name in names:
+        totals = {
+            field: sum(values.get(_key(window, name, field), 0) for window in windows)
+            for field in fields
+        }
+        count = totals['count']
+        if not count:
+            continue
+
+        buckets = [totals[f'bucket_{index}'] for index in range(len(settings.MONITORING_BUCKETS) + 1)]
+        stats[name] = {
+            'requests': count,
+            'avg_queries': round(totals['queries'] / count, 2),
+            'avg_db_ms': round(totals['db_us'] / count / 1000, 3),
+            'avg_template_ms': round(totals['template_us'] / count / 1000, 3),
+            'avg_total_ms': round(totals['total_us'] / count / 1000, 3),
+            'p50_ms': _percentile(buckets, count, 50),
+            'p95_ms': _percentile(buckets, count, 95),
+            'histogram': dict(zip(
+                [*map(str, settings.MONITORING_BUCKETS), 'inf'], buckets
+            )),
+        }
+
+    return stats
+
+
+@staff_member_required
+def monitoring_stats(request: HttpRequest) -> JsonResponse:
+    """
+    Return the rolling performance statistics of every URL name, for staff users.
+
+    Percentiles are the upper bounds of the histogram buckets holding them,
+    or None when they fall in the unbounded last bucket.
+
+    @param request: The HTTP request object.
+    @return: JSON with the window length, the number of windows and the statistics.
+    """
+    return JsonResponse({
+        'window_seconds': settings.MONITORING_WINDOW,
+        'windows': settings.MONITORING_WINDOWS,
+        'bucket_bounds_ms': list(settings.MONITORING_BUCKETS),
+        'stats': collect_stats(),
+    })
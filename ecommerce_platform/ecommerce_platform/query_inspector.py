@@ -0,0 +1,194 @@
+"""
+Detection of N+1 query patterns and slow queries.
+
+`inspect_queries()` wraps the execution of every query on the database connections
+and groups the queries by fingerprint, their SQL with literals and placeholders
+replaced. A fingerprint seen `QUERY_INSPECTOR_REPEAT_THRESHOLD` times or more within
+one inspection is reported as a repeated query, typically a related object loaded
+inside a loop, and queries slower than `QUERY_INSPECTOR_SLOW_MS` are reported as
+slow. Every finding is attributed to the innermost frame of the project code that
+ran the query.
+
+`QueryInspectorMiddleware` inspects every request when `QUERY_INSPECTOR_ENABLED` is
+set, logs the findings, and in strict mode fails the request, which makes test runs
+fail on new N+1 patterns.
+"""
+import logging
+import re
+import time
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a request runs repeated or slow queries."""
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Reduce a query to its shape, so that queries differing only by their
+    parameters, or by the length of an IN list, share the same fingerprint.
+
+    @param sql: The SQL of the query.
+    @return: The normalized SQL.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _origin() -> str:
+    """Describe the innermost frame of the project code, outside of the instrumentation."""
+    base_dir = str(Path(settings.BASE_DIR).resolve())
+    for frame, line in traceback.walk_stack(None):
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base_dir) and filename not in (__file__, instrumentation.__file__)
+            and 'site-packages' not in filename
+        ):
+            return f'{Path(filename).relative_to(base_dir)}:{line} in {frame.f_code.co_name}'
+    return '<unknown>'
+
+
+class QueryReport:
+    """Queries seen during an inspection, grouped by fingerprint."""
+
+    def __init__(self, repeat_threshold: int, slow_ms: float):
+        self.repeat_threshold = repeat_threshold
+        self.slow_ms = slow_ms
+        self.query_count = 0
+        # Fingerprint: {'count', 'duration_ms', 'origin'}.
+        self.shapes: dict[str, dict] = {}
+        self.slow: list[dict] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.query_count += 1
+            shape = self.shapes.setdefault(
+                fingerprint(sql), {'count': 0, 'duration_ms': 0.0, 'origin': None}
+            )
+            shape['count'] += 1
+            shape['duration_ms'] += duration_ms
+            # Walking the stack is costly, so only suspicious queries are attributed.
+            if shape['count'] == self.repeat_threshold:
+                shape['origin'] = _origin()
+            if duration_ms >= self.slow_ms:
+                self.slow.append({'sql': sql, 'duration_ms': duration_ms, 'origin': _origin()})
+
+    @property
+    def repeated(self) -> list[dict]:
+        """The fingerprints run at least `repeat_threshold` times, most frequent first."""
+        return sorted(
+            (
+                {'fingerprint': sql, **shape} for sql, shape in self.shapes.items()
+                if shape['count'] >= self.repeat_threshold
+            ),
+            key=lambda shape: -shape['count'],
+        )
+
+    def problems(self) -> list[str]:
+        """Describe every repeated and slow query, empty when there is none."""
+        return [
+            *(
+                f'{shape["count"]} queries of the same shape from {shape["origin"]}: '
+                f'{shape["fingerprint"]}'
+                for shape in self.repeated
+            ),
+            *(
+                f'Slow query ({query["duration_ms"]:.1f}ms) from {query["origin"]}: {query["sql"]}'
+                for query in self.slow
+            ),
+        ]
+
+
+@contextmanager
+def inspect_queries(
+        repeat_threshold: Optional[int] = None, slow_ms: Optional[float] = None
+) -> Iterator[QueryReport]:
+    """
+    Record the queries run on every database connection in the current context.
+
+    @param repeat_threshold: Occurrences of a fingerprint reported as repeated,
+        `QUERY_INSPECTOR_REPEAT_THRESHOLD` by default.
+    @param slow_ms: Duration of a query reported as slow, `QUERY_INSPECTOR_SLOW_MS` by default.
+    @return: Context manager yielding the QueryReport filled during the block.
+    """
+    report = QueryReport(
+        repeat_threshold or settings.QUERY_INSPECTOR_REPEAT_THRESHOLD,
+        slow_ms if slow_ms is not None else settings.QUERY_INSPECTOR_SLOW_MS,
+    )
+    with instrumentation.query_wrapper(report):
+        yield report
+
+
+class QueryInspectorMiddleware:
+    """
+    Report the repeated and slow queries of every request, when `QUERY_INSPECTOR_ENABLED`.
+
+    Findings are logged as warnings with the URL name of the request. With
+    `QUERY_INSPECTOR_STRICT`, they raise QueryBudgetExceeded instead, except for the
+    URL names listed in `QUERY_INSPECTOR_IGNORE`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            return self.get_response(request)
+
+        with inspect_queries() as report:
+            response = self.get_response(request)
+        self.check(request, report)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            return await self.get_response(request)
+
+        with inspect_queries() as report:
+            response = await self.get_response(request)
+        self.check(request, report)
+        return response
+
+    def check(self, request: HttpRequest, report: QueryReport) -> None:
+        problems = report.problems()
+        if not problems:
+            return
+
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        message = (f'{view_name} ran {report.query_count} queries:\n'
+                   + '\n'.join(problems))
+        if settings.QUERY_INSPECTOR_STRICT and view_name not in settings.QUERY_INSPECTOR_IGNORE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from django.conf.global_settings import MEDIA_ROOT
@@ -49,6 +50,9 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "user.CustomUser"
 
 MIDDLEWARE = [
+    "ecommerce_platform.monitoring.PerformanceMiddleware",
+    "ecommerce_platform.query_inspector.QueryInspectorMiddleware",
+    "ecommerce_platform.write_queue.SerializedWritesMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -63,7 +67,7 @@ ROOT_URLCONF = "ecommerce_platform.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "ecommerce_platform.monitoring.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -83,11 +87,114 @@ WSGI_APPLICATION = "ecommerce_platform.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# SQLite by default. DB_ENGINE=postgresql connects to DB_NAME on DB_HOST:DB_PORT as
+# DB_USER with DB_PASSWORD; DB_REPLICA_HOSTS (comma-separated) adds read replicas of
+# it. With SQLite, DB_REPLICA_NAME names a copy of the database standing in for a
+# replica, e.g. for testing the routing offline.
+
+# SQLite connections sync the disk less often, map and cache more of the file, and start
+# transactions with BEGIN IMMEDIATE so writers queue on the busy timeout (in seconds)
+# instead of failing to upgrade their read lock. Set DB_SQLITE_TUNED=0 for the SQLite
+# defaults. Write-ahead logging, stored in the database file rather than set per
+# connection, is enabled once per deployment with `manage.py enable_sqlite_wal`.
+if os.environ.get("DB_SQLITE_TUNED", "1") == "1":
+    SQLITE_OPTIONS = {
+        "init_command": (
+            "PRAGMA synchronous=NORMAL;"
+            "PRAGMA mmap_size=268435456;"
+            "PRAGMA cache_size=-65536;"
+            "PRAGMA temp_store=MEMORY;"
+        ),
+        "transaction_mode": "IMMEDIATE",
+        "timeout": 20,
+    }
+else:
+    SQLITE_OPTIONS = {}
+
+if os.environ.get("DB_ENGINE", "sqlite") == "postgresql":
+    # Pooled connections (psycopg[pool]) are returned to the pool after every request
+    # and cannot be persistent.
+    _DB_POOL = os.environ.get("DB_POOL", "0") == "1"
+    _PRIMARY = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("DB_NAME", "ecommerce_platform"),
+        "USER": os.environ.get("DB_USER", ""),
+        "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+        "HOST": os.environ.get("DB_HOST", "localhost"),
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": 0 if _DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        # Behind PgBouncer in transaction pooling mode, cursors cannot outlive a transaction.
+        "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("DB_PGBOUNCER", "0") == "1",
+        "OPTIONS": {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+                "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            },
+        } if _DB_POOL else {},
     }
+    DATABASES = {"default": _PRIMARY}
+    _REPLICA_HOSTS = [
+        host.strip() for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()
+    ]
+    for _index, _host in enumerate(_REPLICA_HOSTS, start=1):
+        DATABASES[f"replica{_index}"] = {**_PRIMARY, "HOST": _host, "TEST": {"MIRROR": "default"}}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": SQLITE_OPTIONS,
+        }
+    }
+    if os.environ.get("DB_REPLICA_NAME"):
+        DATABASES["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / os.environ["DB_REPLICA_NAME"],
+            "OPTIONS": SQLITE_OPTIONS,
+            "TEST": {"MIRROR": "default"},
+        }
+
+# Views decorated with use_replica read the models of these apps from a replica,
+# see ecommerce_platform/db_routing.py.
+DATABASE_ROUTERS = ["ecommerce_platform.db_routing.PrimaryReplicaRouter"]
+DATABASE_REPLICA_APPS = ("store",)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The local-memory default is private to each process; set CACHE_BACKEND and
+# CACHE_LOCATION to share the cache between workers, e.g.
+# django.core.cache.backends.redis.RedisCache and redis://127.0.0.1:6379/1.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    },
+    # Histograms of the performance monitoring, kept apart so that they never evict pages,
+    # versions or sessions. Point it at a cache shared by all the workers in production.
+    "monitoring": {
+        "BACKEND": os.environ.get(
+            "MONITORING_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("MONITORING_CACHE_LOCATION", "monitoring"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # Anonymous carts, kept apart so that page and version entries never evict them. They
+    # follow the default backend, e.g. a Redis server shared by every worker and host.
+    "carts": {
+        "BACKEND": os.environ.get(
+            "CART_CACHE_BACKEND",
+            os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        ),
+        "LOCATION": os.environ.get("CART_CACHE_LOCATION", os.environ.get("CACHE_LOCATION") or "carts"),
+        "KEY_PREFIX": "carts",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
 }
 
 
@@ -138,3 +245,137 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
+
+
+# Product feed
+# Page sizes of the streaming, keyset-paginated /products/feed/ endpoint.
+
+STORE_FEED_PAGE_SIZE = 100
+STORE_FEED_MAX_PAGE_SIZE = 1000
+STORE_FEED_CHUNK_SIZE = 500
+
+
+# Category pages
+# Products of a category page are keyset-paginated in one of the store.pagination.SORTS
+# orders, with links to STORE_CATEGORY_PAGE_WINDOW pages on each side of the current one.
+
+STORE_CATEGORY_PAGE_SIZE = 3
+STORE_CATEGORY_PAGE_WINDOW = 2
+STORE_CATEGORY_DEFAULT_SORT = "name"
+
+
+# Store API serialization
+# JSON of the /products/ and /categories/ endpoints, see store/serialization.py. It is
+# encoded by orjson when installed, and responses of at least STORE_API_COMPRESS_MIN_LENGTH
+# bytes are compressed with brotli (when installed) or gzip for clients accepting it.
+
+STORE_API_FAST_JSON = True
+STORE_API_COMPRESS_MIN_LENGTH = 1024
+STORE_API_GZIP_LEVEL = 6
+STORE_API_BROTLI_QUALITY = 4
+
+
+# Store page cache
+# Rendered category and product pages are cached under versioned keys, see store/caching.py.
+
+STORE_CACHE_ALIAS = "default"
+STORE_PAGE_CACHE_TIMEOUT = 60 * 60
+
+
+# Product search
+# The FTS5 index of the store migrations only exists on SQLite; other databases use
+# "store.search.SimpleSearchBackend", matching terms with LIKE queries.
+
+STORE_SEARCH_BACKEND = os.environ.get("STORE_SEARCH_BACKEND") or (
+    "store.search.SQLiteFTS5Backend"
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+    else "store.search.SimpleSearchBackend"
+)
+STORE_SEARCH_PAGE_SIZE = 20
+
+# Upper bounds of the price buckets of the /products/browse/ price facet.
+STORE_FACET_PRICE_BUCKETS = (100, 500, 1000, 5000)
+
+
+# Order history
+# Number of orders on a page of the keyset-paginated /order/history/ view.
+
+ORDER_HISTORY_PAGE_SIZE = 10
+
+
+# Anonymous carts
+# Carts of anonymous visitors live in this cache, see order/cart.py. Sessions are
+# read through the default cache, so cart requests do not query the session table.
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+ANONYMOUS_CART_CACHE_ALIAS = "carts"
+ANONYMOUS_CART_TIMEOUT = 60 * 60 * 24 * 14
+
+
+# Product image derivatives
+# Resized copies of product images, generated in a background thread pool, see store/images.py.
+
+STORE_THUMBNAIL_WIDTHS = (160, 320, 640)
+STORE_THUMBNAIL_FORMATS = ("webp", "jpeg")
+STORE_THUMBNAIL_QUALITY = 80
+STORE_THUMBNAIL_WORKERS = 2
+
+
+# Media serving
+# Uploaded files are served by ecommerce_platform/media.py. URLs of files under these
+# prefixes embed a content hash and are cached by browsers as immutable.
+
+STORAGES = {
+    "default": {
+        "BACKEND": "ecommerce_platform.media.FingerprintedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+MEDIA_FINGERPRINT_PREFIXES = ("products/",)
+# Files whose names already embed a hash of their content, such as the image derivatives
+# of store/images.py: their URLs are not fingerprinted again, but cached just as long.
+MEDIA_CONTENT_ADDRESSED_PREFIXES = ("products/derivatives/",)
+MEDIA_FINGERPRINT_MAX_AGE = 60 * 60 * 24 * 365
+# Internal location under which a front server such as nginx sends the files itself
+# (X-Accel-Redirect), e.g. "/protected-media/". None streams them from Django.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get("MEDIA_ACCEL_REDIRECT_PREFIX") or None
+
+
+# Performance monitoring
+# Per-request query, template and total timings, see ecommerce_platform/monitoring.py.
+# Statistics of the last MONITORING_WINDOWS windows are served at /monitoring/stats/.
+
+MONITORING_ENABLED = os.environ.get("MONITORING_ENABLED", "1") == "1"
+MONITORING_SERVER_TIMING = True
+MONITORING_CACHE_ALIAS = "monitoring"
+MONITORING_WINDOW = 60
+MONITORING_WINDOWS = 15
+MONITORING_FLUSH_INTERVAL = 10
+# Upper bounds in milliseconds of the response time histogram buckets.
+MONITORING_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+# Query inspection
+# Repeated (N+1) and slow queries of every request, see ecommerce_platform/query_inspector.py.
+# QUERY_INSPECTOR=1 logs them, QUERY_INSPECTOR=strict fails the request, for tests and staging.
+
+QUERY_INSPECTOR_ENABLED = os.environ.get("QUERY_INSPECTOR", "0") in ("1", "strict")
+QUERY_INSPECTOR_STRICT = os.environ.get("QUERY_INSPECTOR") == "strict"
+# Number of queries of the same shape in one request reported as an N+1 pattern.
+QUERY_INSPECTOR_REPEAT_THRESHOLD = 5
+QUERY_INSPECTOR_SLOW_MS = 100
+# URL names whose findings are only logged in strict mode, while they are being fixed.
+QUERY_INSPECTOR_IGNORE = ()
+
+
+# SQLite write queue
+# Writing requests of these URL names (or namespace prefixes) take a lock shared by all
+# threads and processes before writing, see ecommerce_platform/write_queue.py. Off by
+# default: set SQLITE_SERIALIZE_WRITES=1 on deployments where the "serialized" mode of
+# `manage.py benchmark_sqlite` beats "tuned", typically many workers with bursts of writes.
+
+SQLITE_SERIALIZE_WRITES = os.environ.get("SQLITE_SERIALIZE_WRITES", "0") == "1"
+SQLITE_SERIALIZED_VIEWS = ("admin:", "order:")
+SQLITE_WRITE_LOCK_FILE = BASE_DIR / ".sqlite-write.lock"
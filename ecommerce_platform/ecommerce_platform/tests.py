@@ -0,0 +1,160 @@
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve
+
+from order import services
+from order.models import CartItem, Order
+from store.models import Product
+from user.models import CustomUser
+
+from . import write_queue
+
+
+class MediaServingTests(SimpleTestCase):
+    """Fingerprinted media URLs, their redirects, and conditional requests."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        media_root = override_settings(MEDIA_ROOT=self.root)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def write(self, name: str, content: bytes) -> str:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return default_storage.url(name)
+
+    def get(self, url: str, **headers):
+        response = self.client.get(url, headers=headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_fingerprinted_url(self):
+        url = self.write('products/toaster.jpg', b'first image')
+        self.assertRegex(url, r'^/media/products/toaster\.[0-9a-f]{12}\.jpg$')
+
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), b'first image')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.MEDIA_FINGERPRINT_MAX_AGE}', response['Cache-Control'])
+
+    def test_stale_fingerprint_redirects(self):
+        old_url = self.write('products/kettle.png', b'old kettle')
+        new_url = self.write('products/kettle.png', b'new kettle, larger')
+        self.assertNotEqual(old_url, new_url)
+
+        response = self.get(old_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], new_url)
+        self.assertEqual(self.get(new_url).getvalue(), b'new kettle, larger')
+        self.assertEqual(self.get('/media/products/kettle.000000000000.png').status_code, 302)
+
+    def test_conditional_requests(self):
+        url = self.write('products/lamp.jpg', b'lamp')
+        response = self.get(url)
+
+        for headers in (
+            {'If-None-Match': response['ETag']},
+            {'If-Modified-Since': response['Last-Modified']},
+        ):
+            with self.subTest(headers=headers):
+                not_modified = self.get(url, **headers)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified.getvalue(), b'')
+                self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        self.assertEqual(self.get(url, **{'If-None-Match': '"other"'}).status_code, 200)
+
+    def test_unfingerprinted_files(self):
+        # Derivatives are named after their content already; other files are revalidated.
+        derivative = default_storage.save('products/derivatives/0123abcd_320.webp', ContentFile(b'x'))
+        self.assertEqual(default_storage.url(derivative), f'/media/{derivative}')
+        self.assertIn('immutable', self.get(f'/media/{derivative}')['Cache-Control'])
+
+        url = self.write('banners/sale.jpg', b'sale')
+        self.assertEqual(url, '/media/banners/sale.jpg')
+        self.assertIn('no-cache', self.get(url)['Cache-Control'])
+
+    def test_missing_and_unsafe_paths(self):
+        self.write('products/toaster.jpg', b'toaster')
+        for url in (
+            '/media/products/missing.jpg',
+            '/media/products/missing.0123456789ab.jpg',
+            '/media/products',
+            '/media/../settings.py',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url).status_code, 404)
+        self.assertEqual(self.client.post('/media/products/toaster.jpg').status_code, 405)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect(self):
+        url = self.write('products/toaster.jpg', b'toaster')
+        response = self.get(url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/products/toaster.jpg')
+        self.assertEqual(response.getvalue(), b'')
+
+
+class SerializedWritesTests(TestCase):
+    """Writing requests of the admin and of the orders run in the SQLite write queue."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        queue = override_settings(
+            SQLITE_SERIALIZE_WRITES=True, SQLITE_WRITE_LOCK_FILE=Path(directory.name) / 'write.lock',
+        )
+        queue.enable()
+        self.addCleanup(queue.disable)
+
+    def test_serialized_views(self):
+        middleware = write_queue.SerializedWritesMiddleware(lambda request: None)
+        factory = RequestFactory()
+        self.assertEqual(resolve('/order/checkout/').view_name, 'order:checkout')
+        for method, path, serialized in (
+            ('post', '/order/checkout/', True),
+            ('post', '/order/cart/add/', True),
+            ('post', '/admin/login/', True),
+            ('get', '/order/cart/', False),
+            ('post', '/products/', False),
+            ('post', '/missing/', False),
+        ):
+            with self.subTest(method=method, path=path):
+                request = getattr(factory, method)(path)
+                self.assertEqual(middleware.serialized(request), serialized)
+
+    def test_checkout_holds_the_lock(self):
+        user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@example.com', password='buyer'
+        )
+        product = Product.objects.create(
+            name='Toaster', manufacturer='Acme', price=Decimal(20), stock_quantity=1
+        )
+        CartItem.objects.create(cart=services.get_cart(user), product=product)
+        self.client.force_login(user)
+
+        held = []
+
+        def checkout(checkout_user):
+            held.append(getattr(write_queue._held, 'value', False))
+            return services.checkout(checkout_user)
+
+        with mock.patch('order.views.checkout', checkout):
+            response = self.client.post('/order/checkout/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(held, [True])
+        self.assertTrue(Order.objects.filter(user=user).exists())
+        self.assertFalse(getattr(write_queue._held, 'value', False))
@@ -1,20 +1,20 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from debug_toolbar.toolbar import debug_toolbar_urls
 
+from .media import serve_media
+from .monitoring import monitoring_stats
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include("store.urls", namespace="store")),
     path('order/', include("order.urls")),
+    path('monitoring/stats/', monitoring_stats, name='monitoring_stats'),
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media, name='media'),
 ] + debug_toolbar_urls()
 
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-
 admin.site.site_header = 'Ecommerce Platform Admin'
 admin.site.index_title = 'Ecommerce Platform'
\ No newline at end of file
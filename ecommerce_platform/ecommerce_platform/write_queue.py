@@ -0,0 +1,104 @@
+"""
+Serialization of the writes to a SQLite database.
+
+SQLite has a single writer at a time. Writers waiting for it rely on the busy handler
+of SQLite, which retries with growing sleeps and no ordering, so under a burst of
+admin saves and checkouts a writer can keep losing the race until its busy timeout
+expires with "database is locked".
+
+`SerializedWritesMiddleware` makes the writing requests of `SQLITE_SERIALIZED_VIEWS`
+queue instead on an exclusive lock of `SQLITE_WRITE_LOCK_FILE`, shared by every thread
+and process of the server, and run one after the other. Reading requests never take
+the lock: in WAL mode they neither block the writer nor wait for it.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, HttpResponse
+from django.urls import Resolver404, resolve
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Fallback lock of the threads of this process, where file locks are not available.
+_process_lock = threading.Lock()
+_held = threading.local()
+
+
+def serialization_enabled() -> bool:
+    return settings.SQLITE_SERIALIZE_WRITES and connections[DEFAULT_DB_ALIAS].vendor == 'sqlite'
+
+
+@contextmanager
+def serialized_writes() -> Iterator[None]:
+    """
+    Hold the write lock of the SQLite database during the block.
+
+    Nested blocks of the same thread reuse the lock. Does nothing unless
+    `SQLITE_SERIALIZE_WRITES` is set and the default database is SQLite.
+    """
+    if not serialization_enabled() or getattr(_held, 'value', False):
+        yield
+        return
+
+    _held.value = True
+    try:
+        if fcntl is None:
+            with _process_lock:
+                yield
+        else:
+            # Each acquisition opens the file, so threads of a process exclude each other too.
+            with open(settings.SQLITE_WRITE_LOCK_FILE, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+    finally:
+        _held.value = False
+
+
+class SerializedWritesMiddleware:
+    """Run the writing requests of `SQLITE_SERIALIZED_VIEWS` one at a time."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.serialized(request):
+            return self.get_response(request)
+
+        with serialized_writes():
+            return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not self.serialized(request):
+            return await self.get_response(request)
+
+        # The lock blocks, so it is held by a worker thread for the whole request.
+        @sync_to_async
+        def locked() -> HttpResponse:
+            with serialized_writes():
+                return async_to_sync(self.get_response)(request)
+
+        return await locked()
+
+    def serialized(self, request: HttpRequest) -> bool:
+        if request.method in SAFE_METHODS or not serialization_enabled():
+            return False
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return False
+        return view_name.startswith(settings.SQLITE_SERIALIZED_VIEWS)
@@ -1,8 +1,47 @@
 from django.contrib import admin
-from .models import UserCart
+from .models import CartItem, Order, OrderItem, UserCart
+
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    extra = 0
+    raw_id_fields = ('product',)
 
 
 @admin.register(UserCart)
 class UserCartAdmin(admin.ModelAdmin):
     list_display = ('user',)
+    inlines = (CartItemInline,)
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ('product',)
+    readonly_fields = ('product_name', 'quantity', 'unit_price')
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    """Admin configuration for Order model."""
+    list_display = ('id', 'user', 'status', 'total_price', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__username',)
+    search_help_text = 'Search by username'
+    list_select_related = ('user',)
+    readonly_fields = ('total_price', 'created_at', 'updated_at')
+    inlines = (OrderItemInline,)
+    list_per_page = 20
+
+    def has_add_permission(self, request, obj=None) -> bool:
+        """
+        Orders are only placed by the checkout, which reserves the stock and computes the total.
+
+        Args:
+            request: The HTTP request object.
+            obj: The edited order, if any.
 
+        Returns:
+            bool: Always False.
+        """
+        return False
@@ -0,0 +1,122 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpRequest
+
+from .models import CartItem
+from .services import get_cart
+
+SESSION_TOKEN_KEY = 'cart_token'
+
+
+class SessionCart:
+    """
+    Cart of an anonymous visitor.
+
+    The items live in the cache under a random token kept in the session, so
+    changing the cart never touches the database. Only storing the token creates
+    the session, once per visitor. The session survives the login, which lets
+    `order.signals` merge the cart into the user's cart.
+    """
+
+    def __init__(self, request: HttpRequest):
+        self.session = request.session
+        self.cache = caches[settings.ANONYMOUS_CART_CACHE_ALIAS]
+
+    @staticmethod
+    def cache_key(token: str) -> str:
+        return f'order:anonymous_cart:{token}'
+
+    def _key(self, create: bool = False):
+        token = self.session.get(SESSION_TOKEN_KEY)
+        if token is None and create:
+            token = self.session[SESSION_TOKEN_KEY] = uuid.uuid4().hex
+        return self.cache_key(token) if token else None
+
+    def contents(self) -> dict[int, int]:
+        """Return the quantities in the cart keyed by product id."""
+        key = self._key()
+        return self.cache.get(key, {}) if key else {}
+
+    def _save(self, items: dict[int, int]) -> None:
+        self.cache.set(self._key(create=True), items, timeout=settings.ANONYMOUS_CART_TIMEOUT)
+
+    def add(self, product_id: int, quantity: int) -> None:
+        """Add a quantity of a product to the cart."""
+        items = self.contents()
+        items[product_id] = items.get(product_id, 0) + quantity
+        self._save(items)
+
+    def update(self, product_id: int, quantity: int) -> None:
+        """Set the quantity of a product, removing it when the quantity is 0."""
+        items = self.contents()
+        if quantity:
+            items[product_id] = quantity
+        else:
+            items.pop(product_id, None)
+        self._save(items)
+
+    def remove(self, product_id: int) -> None:
+        """Remove a product from the cart."""
+        self.update(product_id, 0)
+
+
+class DatabaseCart:
+    """Cart of an authenticated user, stored as CartItem rows."""
+
+    def __init__(self, request: HttpRequest):
+        self.user = request.user
+
+    def contents(self) -> dict[int, int]:
+        """Return the quantities in the cart keyed by product id."""
+        return dict(
+            CartItem.objects.filter(cart_id=self.user.pk).values_list('product_id', 'quantity')
+        )
+
+    def _write(self, product_id: int, quantity: int, increment: bool) -> bool:
+        value = F('quantity') + quantity if increment else quantity
+        return bool(
+            CartItem.objects.filter(cart_id=self.user.pk, product_id=product_id).update(quantity=value)
+        )
+
+    def _upsert(self, product_id: int, quantity: int, increment: bool) -> None:
+        if self._write(product_id, quantity, increment):
+            return
+
+        cart = get_cart(self.user)
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(cart=cart, product_id=product_id, quantity=quantity)
+        except IntegrityError:
+            # A concurrent request added the product first.
+            self._write(product_id, quantity, increment)
+
+    def add(self, product_id: int, quantity: int) -> None:
+        """Add a quantity of a product to the cart."""
+        self._upsert(product_id, quantity, increment=True)
+
+    def update(self, product_id: int, quantity: int) -> None:
+        """Set the quantity of a product, removing it when the quantity is 0."""
+        if not quantity:
+            self.remove(product_id)
+        else:
+            self._upsert(product_id, quantity, increment=False)
+
+    def remove(self, product_id: int) -> None:
+        """Remove a product from the cart."""
+        CartItem.objects.filter(cart_id=self.user.pk, product_id=product_id).delete()
+
+
+def get_request_cart(request: HttpRequest):
+    """
+    Return the cart of the visitor of a request.
+
+    @param request: The HTTP request object.
+    @return: A DatabaseCart for authenticated users, a SessionCart otherwise.
+    """
+    if request.user.is_authenticated:
+        return DatabaseCart(request)
+    return SessionCart(request)
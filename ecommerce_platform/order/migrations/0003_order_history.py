@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def populate_order_summaries(apps, schema_editor):
+    Order = apps.get_model("order", "Order")
+    UserOrderSummary = apps.get_model("order", "UserOrderSummary")
+
+    totals = Order.objects.values("user_id").annotate(
+        order_count=Count("id"),
+        lifetime_spend=Sum("total_price"),
+        last_order_at=Max("created_at"),
+    )
+    UserOrderSummary.objects.bulk_create(
+        UserOrderSummary(**row) for row in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0002_order_cartitem_orderitem"),
+        ("user", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserOrderSummary",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="order_summary",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("order_count", models.PositiveIntegerField(default=0)),
+                (
+                    "lifetime_spend",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("last_order_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "User's Order Summary",
+                "verbose_name_plural": "Users' Order Summaries",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_history_idx"
+            ),
+        ),
+        migrations.RunPython(populate_order_summaries, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,10 @@
 from django.db import models
 from user.models import CustomUser
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from store.models import Product
 
 
 class UserCart(models.Model):
+    """Cart of a user, created on first access by `order.services.get_cart`."""
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True)
 
     def __str__(self):
@@ -14,7 +14,74 @@ class UserCart(models.Model):
         verbose_name = "User's Cart"
         verbose_name_plural = "Users' Carts"
 
-@receiver(post_save, sender=CustomUser)
-def create_user_cart(sender, instance, created, **kwargs):
-    if created:
-        UserCart.objects.create(user=instance)
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(UserCart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
+
+class Order(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='orders')
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('placed', 'Placed'),
+            ('paid', 'Paid'),
+            ('shipped', 'Shipped'),
+            ('cancelled', 'Cancelled'),
+        ],
+        default='placed',
+    )
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Order #{self.pk} of {self.user}'
+
+    class Meta:
+        indexes = [
+            # Serves the keyset-paginated order history of a user.
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_history_idx'),
+        ]
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, related_name='+', null=True, blank=True
+    )
+    # Kept so the order history stays readable once the product is deleted.
+    product_name = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=7, decimal_places=2)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_name}'
+
+
+class UserOrderSummary(models.Model):
+    """Order totals of a user, updated by the checkout instead of aggregated on every read."""
+    user = models.OneToOneField(
+        CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='order_summary'
+    )
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username}'s order summary"
+
+    class Meta:
+        verbose_name = "User's Order Summary"
+        verbose_name_plural = "Users' Order Summaries"
@@ -0,0 +1,246 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+
+from store.models import Product
+from store.signals import products_updated
+from user.models import CustomUser
+from .models import CartItem, Order, OrderItem, UserCart, UserOrderSummary
+
+
+class CheckoutError(Exception):
+    """Base class of the errors preventing a checkout."""
+
+
+class EmptyCartError(CheckoutError):
+    """Raised when checking out a cart without items."""
+
+    def __init__(self):
+        super().__init__('The cart is empty.')
+
+
+class InsufficientStockError(CheckoutError):
+    """Raised when a product of the cart is inactive or has less stock than requested."""
+
+    def __init__(self, product_id: int):
+        self.product_id = product_id
+        super().__init__(f'Product {product_id} is not available in the requested quantity.')
+
+
+def get_cart(user: CustomUser) -> UserCart:
+    """
+    Return the cart of a user, creating it on first access. Carts are not created
+    on registration, so users without a cart cost no extra write.
+
+    Args:
+        user: The cart owner.
+
+    Returns:
+        UserCart: The cart of the user.
+    """
+    cart, _ = UserCart.objects.get_or_create(user=user)
+    return cart
+
+
+def merge_cart(user: CustomUser, items: dict[int, int]) -> None:
+    """
+    Add the items of an anonymous cart to the cart of a user with a single upsert.
+    Quantities of products already in the user's cart are summed, and products
+    that no longer exist or are inactive are dropped, as anonymous carts are not
+    checked when products are added.
+
+    Args:
+        user: The user who logged in.
+        items: The quantities of the anonymous cart keyed by product id.
+    """
+    if not items:
+        return
+
+    cart = get_cart(user)
+    existing = dict(
+        CartItem.objects.filter(cart=cart, product_id__in=items.keys()).values_list(
+            'product_id', 'quantity'
+        )
+    )
+    product_ids = Product.objects.filter(id__in=items.keys(), is_active=True).values_list(
+        'id', flat=True
+    )
+    CartItem.objects.bulk_create(
+        [
+            CartItem(
+                cart=cart, product_id=product_id,
+                quantity=existing.get(product_id, 0) + items[product_id],
+            )
+            for product_id in product_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['cart', 'product'],
+        update_fields=['quantity'],
+    )
+
+
+def checkout(user: CustomUser) -> Order:
+    """
+    Turn the cart of a user into an order, reserving the stock of every product.
+
+    Stock is decremented by conditional UPDATE statements
+    (`... WHERE stock_quantity >= quantity`), so concurrent checkouts never
+    oversell and never wait on a lock held in Python. Products are updated in
+    id order, so concurrent transactions lock rows in the same order.
+    If any product lacks stock, the whole transaction is rolled back. Only the
+    cart items that were ordered are removed from the cart.
+
+    Args:
+        user: The user checking out.
+
+    Returns:
+        Order: The placed order.
+
+    Raises:
+        EmptyCartError: If the cart has no items.
+        InsufficientStockError: If a product is inactive or lacks stock.
+    """
+    with transaction.atomic():
+        # The rows are locked until the commit, so items cannot change while they are ordered.
+        items = list(
+            CartItem.objects.select_for_update().filter(cart_id=user.pk).order_by(
+                'product_id'
+            ).values_list('product_id', 'quantity')
+        )
+        if not items:
+            raise EmptyCartError()
+
+        now = timezone.now()
+        for product_id, quantity in items:
+            reserved = Product.objects.filter(
+                pk=product_id, is_active=True, stock_quantity__gte=quantity
+            ).update(stock_quantity=F('stock_quantity') - quantity, updated_at=now)
+            if not reserved:
+                raise InsufficientStockError(product_id)
+
+        products = Product.objects.in_bulk([product_id for product_id, _ in items])
+        order_items = [
+            OrderItem(
+                product_id=product_id,
+                product_name=products[product_id].name,
+                quantity=quantity,
+                unit_price=products[product_id].price,
+            )
+            for product_id, quantity in items
+        ]
+        order = Order.objects.create(
+            user=user,
+            total_price=sum(
+                (item.unit_price * item.quantity for item in order_items), Decimal(0)
+            ),
+        )
+        for item in order_items:
+            item.order = order
+        OrderItem.objects.bulk_create(order_items)
+        # Only the ordered quantities leave the cart, on databases without row locks too.
+        ordered = Q()
+        for product_id, quantity in items:
+            ordered |= Q(product_id=product_id, quantity=quantity)
+        CartItem.objects.filter(ordered, cart_id=user.pk).delete()
+        record_order(order)
+
+        product_ids = list(products)
+        transaction.on_commit(lambda: products_updated.send(
+            sender=Order, product_ids=product_ids, fields=['stock_quantity', 'updated_at'],
+        ))
+
+    return order
+
+
+def record_order(order: Order) -> None:
+    """
+    Add a new order to the order summary of its user with a single UPDATE.
+
+    Args:
+        order: The placed order.
+    """
+    UserOrderSummary.objects.get_or_create(user_id=order.user_id)
+    UserOrderSummary.objects.filter(user_id=order.user_id).update(
+        order_count=F('order_count') + 1,
+        lifetime_spend=F('lifetime_spend') + order.total_price,
+        last_order_at=order.created_at,
+    )
+
+
+def encode_history_cursor(order: Order) -> str:
+    """
+    Build the opaque cursor pointing after an order in the order history.
+
+    Args:
+        order: The last order of a page.
+
+    Returns:
+        str: URL-safe cursor holding the creation time and id of the order.
+    """
+    payload = json.dumps([order.created_at.isoformat(), order.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Read a cursor built by `encode_history_cursor`.
+
+    Args:
+        cursor: The cursor.
+
+    Returns:
+        tuple[datetime, int]: The creation time and id of the order.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (binascii.Error, TypeError, ValueError) as error:
+        raise ValueError('Invalid cursor.') from error
+
+
+def get_order_history(
+        user: CustomUser, cursor: Optional[str], page_size: int
+) -> tuple[list[Order], Optional[str]]:
+    """
+    Load one page of the orders of a user, newest first, with their items.
+
+    Pages are delimited by a (created_at, id) keyset, served by the
+    `order_user_history_idx` index, so deep pages cost the same as the first one.
+    Items of the whole page are loaded with one extra query.
+
+    Args:
+        user: The owner of the orders.
+        cursor: The cursor returned for the previous page, or None for the first page.
+        page_size: The number of orders per page.
+
+    Returns:
+        tuple[list[Order], Optional[str]]: The orders, and the cursor of the next page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    orders = Order.objects.filter(user=user).order_by('-created_at', '-id').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.only(
+            'order_id', 'product_id', 'product_name', 'quantity', 'unit_price'
+        ).order_by('id'))
+    )
+    if cursor:
+        created_at, order_id = decode_history_cursor(cursor)
+        orders = orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        )
+
+    page = list(orders[:page_size + 1])
+    next_cursor = encode_history_cursor(page[page_size - 1]) if len(page) > page_size else None
+
+    return page[:page_size], next_cursor
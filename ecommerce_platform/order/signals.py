@@ -0,0 +1,16 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .cart import SESSION_TOKEN_KEY, SessionCart
+from .services import merge_cart
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    """Move the anonymous cart of a visitor into their cart on login."""
+    if request is None or SESSION_TOKEN_KEY not in request.session:
+        return
+
+    anonymous_cart = SessionCart(request)
+    merge_cart(user, anonymous_cart.contents())
+    anonymous_cart.cache.delete(SessionCart.cache_key(request.session.pop(SESSION_TOKEN_KEY)))
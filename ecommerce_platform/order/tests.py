@@ -1,3 +1,343 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+
+from ecommerce_platform.benchmarks import BenchmarkTestCase, get_sizes, seed_catalog
+from store.models import Product
+from store.signals import products_updated
+from user.models import CustomUser
+from .cart import SESSION_TOKEN_KEY, SessionCart
+from .models import CartItem, Order, OrderItem, UserOrderSummary
+from .services import decode_history_cursor, encode_history_cursor, get_cart
+
+
+def seed_orders(user: CustomUser, count: int, products: list[Product]) -> None:
+    """Grow the order history of a user to `count` orders of two items each."""
+    start = Order.objects.filter(user=user).count()
+    orders = Order.objects.bulk_create([
+        Order(user=user, total_price=products[index % len(products)].price * 2)
+        for index in range(start, count)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, product=product, product_name=product.name,
+            quantity=1, unit_price=product.price,
+        )
+        for index, order in enumerate(orders)
+        for product in (products[index % len(products)], products[(index + 1) % len(products)])
+    ])
+    UserOrderSummary.objects.update_or_create(user=user, defaults={
+        'order_count': count,
+        'lifetime_spend': Order.objects.filter(user=user).aggregate(
+            total=Sum('total_price')
+        )['total'],
+        'last_order_at': Order.objects.filter(user=user).latest('created_at').created_at,
+    })
+
+
+class OrderEndpointBenchmarks(BenchmarkTestCase):
+    """Query counts and latency of the cart, checkout and order history endpoints."""
+    query_budgets = {
+        'order:order_page_view': 0,
+        'order:cart (anonymous)': 1,
+        'order:cart_add (anonymous)': 0,
+        'order:cart_update (anonymous)': 0,
+        'order:cart_remove (anonymous)': 0,
+        'order:cart (user)': 3,
+        'order:cart_add (user)': 3,
+        'order:cart_update (user)': 3,
+        'order:cart_remove (user)': 2,
+        'order:order_history': 4,
+        # Checkout reserves the stock of each of the 3 cart items with its own UPDATE.
+        'order:checkout': 13,
+    }
+
+    def test_endpoints(self):
+        user = CustomUser.objects.create_user(
+            username='benchmark', email='benchmark@example.com', password='benchmark'
+        )
+        user_client = Client()
+        user_client.force_login(user)
+        anonymous_client = Client()
+
+        for size in get_sizes():
+            seed_catalog(size)
+            products = list(
+                Product.objects.filter(sku__startswith='BENCH-', stock_quantity__gt=0)[:50]
+            )
+            seed_orders(user, max(1, size // 10), products)
+
+            for product in products[:5]:
+                anonymous_client.post('/order/cart/add/', {'product_id': product.id, 'quantity': 1})
+
+            def fill_cart():
+                cart = get_cart(user)
+                CartItem.objects.bulk_create(
+                    [CartItem(cart=cart, product=product, quantity=1) for product in products[:3]],
+                    ignore_conflicts=True,
+                )
+
+            product_data = {'product_id': products[0].id, 'quantity': 2}
+            endpoints = [
+                ('order:order_page_view', '/order/', 'get', None, anonymous_client, None, 200, None),
+                ('order:cart', '/order/cart/', 'get', None, anonymous_client, None, 200, 'anonymous'),
+                ('order:cart_add', '/order/cart/add/', 'post', product_data, anonymous_client, None,
+                 200, 'anonymous'),
+                ('order:cart_update', '/order/cart/update/', 'post', product_data, anonymous_client,
+                 None, 200, 'anonymous'),
+                ('order:cart_remove', '/order/cart/remove/', 'post', product_data, anonymous_client,
+                 None, 200, 'anonymous'),
+                ('order:cart', '/order/cart/', 'get', None, user_client, fill_cart, 200, 'user'),
+                ('order:cart_add', '/order/cart/add/', 'post', product_data, user_client, None,
+                 200, 'user'),
+                ('order:cart_update', '/order/cart/update/', 'post', product_data, user_client, None,
+                 200, 'user'),
+                ('order:cart_remove', '/order/cart/remove/', 'post', product_data, user_client, None,
+                 200, 'user'),
+                ('order:order_history', '/order/history/', 'get', None, user_client, None, 200, None),
+                ('order:checkout', '/order/checkout/', 'post', None, user_client, fill_cart, 201, None),
+            ]
+            for name, url, method, data, client, setup, status, variant in endpoints:
+                label = f'{name} ({variant})' if variant else name
+                with self.subTest(endpoint=label, size=size):
+                    self.benchmark(
+                        name, size, url, client=client, method=method, data=data, setup=setup,
+                        expected_status=status, label=label,
+                    )
+
+
+class CheckoutTests(TransactionTestCase):
+    """Checkout reserves stock in one transaction, and publishes the change once committed."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@example.com', password='buyer'
+        )
+        self.client.force_login(self.user)
+        self.toaster = Product.objects.create(
+            name='Toaster', manufacturer='Acme', price=Decimal('20.00'), stock_quantity=5
+        )
+        self.kettle = Product.objects.create(
+            name='Kettle', manufacturer='Globex', price=Decimal('15.00'), stock_quantity=1
+        )
+        cart = get_cart(self.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=self.toaster, quantity=2),
+            CartItem(cart=cart, product=self.kettle, quantity=2),
+        ])
+
+        # (product ids, whether the sender was still inside a transaction) of every signal.
+        self.updates = []
+
+        def receiver(sender, product_ids, **kwargs):
+            self.updates.append((sorted(product_ids), connection.in_atomic_block))
+
+        products_updated.connect(receiver, sender=Order, weak=False)
+        self.addCleanup(products_updated.disconnect, receiver, sender=Order)
+
+    def stock(self) -> list[int]:
+        return list(Product.objects.order_by('id').values_list('stock_quantity', flat=True))
+
+    def test_oversell_rolls_back(self):
+        response = self.client.post('/order/checkout/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['product_id'], self.kettle.id)
+        # The toaster was reserved before the kettle failed, and released by the rollback.
+        self.assertEqual(self.stock(), [5, 1])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(UserOrderSummary.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart_id=self.user.pk).count(), 2)
+        self.assertEqual(self.updates, [])
+
+    def test_inactive_product(self):
+        CartItem.objects.filter(product=self.kettle).update(quantity=1)
+        Product.objects.filter(id=self.kettle.id).update(is_active=False)
+
+        response = self.client.post('/order/checkout/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.stock(), [5, 1])
+
+    def test_empty_cart(self):
+        CartItem.objects.all().delete()
+        response = self.client.post('/order/checkout/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_checkout(self):
+        CartItem.objects.filter(product=self.kettle).update(quantity=1)
+
+        response = self.client.post('/order/checkout/')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.json()['order_id'])
+        self.assertEqual(order.total_price, Decimal('55.00'))
+        self.assertEqual(
+            list(order.items.order_by('product_id').values_list(
+                'product_name', 'quantity', 'unit_price'
+            )),
+            [('Toaster', 2, Decimal('20.00')), ('Kettle', 1, Decimal('15.00'))],
+        )
+        self.assertEqual(self.stock(), [3, 0])
+        self.assertFalse(CartItem.objects.exists())
+        summary = UserOrderSummary.objects.get(user=self.user)
+        self.assertEqual((summary.order_count, summary.lifetime_spend), (1, Decimal('55.00')))
+        self.assertEqual(self.updates, [([self.toaster.id, self.kettle.id], False)])
+
+
+class OrderAdminTests(TestCase):
+    """Orders are only placed by checkout, never added in the admin."""
+
+    def test_add_is_disabled(self):
+        admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/admin/order/order/add/').status_code, 403)
+        self.assertEqual(self.client.get('/admin/order/order/').status_code, 200)
+
+
+class OrderHistoryTests(TestCase):
+    """The order history pages follow the (created_at, id) keyset without gaps or repeats."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='history', email='history@example.com', password='history'
+        )
+        self.client.force_login(self.user)
+        products = [
+            Product.objects.create(name=f'Product {index}', manufacturer='Acme', price=Decimal(index))
+            for index in range(1, 4)
+        ]
+        # Orders created by one bulk insert often share their creation time.
+        seed_orders(self.user, 7, products)
+
+    def test_cursor_round_trip(self):
+        order = Order.objects.first()
+        self.assertEqual(
+            decode_history_cursor(encode_history_cursor(order)), (order.created_at, order.id)
+        )
+        for cursor in ('garbage', encode_history_cursor(order)[:-4], 'WzEsMl0='):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_history_cursor(cursor)
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=3)
+    def test_pages(self):
+        seen, pages = [], 0
+        cursor = None
+        while True:
+            response = self.client.get('/order/history/', {'cursor': cursor} if cursor else {})
+            orders = response.context['orders']
+            self.assertTrue(all(len(order.items.all()) == 2 for order in orders))
+            seen.extend(order.id for order in orders)
+            pages += 1
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            seen, list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        )
+        self.assertEqual(response.context['summary'].order_count, 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/order/history/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CartTests(TestCase):
+    """Anonymous carts live in the cart cache, and move into the user's cart on login."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='shopper', email='shopper@example.com', password='shopper'
+        )
+        self.toaster = Product.objects.create(name='Toaster', manufacturer='Acme', price=Decimal(20))
+        self.kettle = Product.objects.create(name='Kettle', manufacturer='Globex', price=Decimal(15))
+
+    def contents(self) -> dict[int, int]:
+        items = self.client.get('/order/cart/').json()['items']
+        return {item['product_id']: item['quantity'] for item in items}
+
+    def post(self, action: str, product: Product, quantity: int = 1):
+        return self.client.post(
+            f'/order/cart/{action}/', {'product_id': product.id, 'quantity': quantity}
+        )
+
+    def test_anonymous_cart(self):
+        self.post('add', self.toaster, 2)
+        self.post('add', self.toaster)
+        self.post('update', self.kettle, 4)
+        self.assertEqual(self.contents(), {self.toaster.id: 3, self.kettle.id: 4})
+
+        self.client.post('/order/cart/remove/', {'product_id': self.toaster.id})
+        self.post('update', self.kettle, 0)
+        self.assertEqual(self.contents(), {})
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_user_cart(self):
+        self.client.force_login(self.user)
+        self.post('add', self.toaster, 2)
+        self.post('add', self.toaster)
+        self.post('update', self.kettle, 4)
+        self.post('update', self.kettle, 1)
+        self.assertEqual(self.contents(), {self.toaster.id: 3, self.kettle.id: 1})
+
+        self.post('update', self.toaster, 0)
+        self.assertEqual(
+            dict(CartItem.objects.values_list('product_id', 'quantity')), {self.kettle.id: 1}
+        )
+
+    def test_unavailable_products(self):
+        inactive = Product.objects.create(
+            name='Old kettle', manufacturer='Globex', price=Decimal(5), is_active=False
+        )
+        self.client.force_login(self.user)
+        for action in ('add', 'update'):
+            with self.subTest(action=action):
+                missing = self.client.post(
+                    f'/order/cart/{action}/', {'product_id': 999999, 'quantity': 1}
+                )
+                self.assertEqual(missing.status_code, 404)
+                self.assertEqual(self.post(action, inactive).status_code, 404)
+        self.assertEqual(self.contents(), {})
+
+        self.assertEqual(
+            self.client.post('/order/cart/add/', {'product_id': 'one'}).status_code, 400
+        )
+        self.assertEqual(self.post('add', self.toaster, 0).status_code, 400)
+
+    def test_merge_on_login(self):
+        cart = get_cart(self.user)
+        CartItem.objects.create(cart=cart, product=self.toaster, quantity=1)
+        self.post('add', self.toaster, 2)
+        self.post('add', self.kettle)
+        token = self.client.session[SESSION_TOKEN_KEY]
+        # Anonymous carts accept any product without a query; merging drops unavailable ones.
+        gone = Product.objects.create(name='Gone', manufacturer='Acme', price=Decimal(1))
+        inactive = Product.objects.create(
+            name='Old kettle', manufacturer='Globex', price=Decimal(5), is_active=False
+        )
+        with self.assertNumQueries(0):
+            self.post('add', gone)
+            self.post('update', inactive, 2)
+        gone.delete()
+
+        self.assertTrue(self.client.login(username='shopper', password='shopper'))
+
+        # Quantities are summed, and deleted or inactive products are dropped.
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity')),
+            {self.toaster.id: 3, self.kettle.id: 1},
+        )
+        self.assertNotIn(SESSION_TOKEN_KEY, self.client.session)
+        self.assertIsNone(caches[settings.ANONYMOUS_CART_CACHE_ALIAS].get(SessionCart.cache_key(token)))
+
+        # A later login does not merge the same cart again.
+        self.client.logout()
+        self.client.login(username='shopper', password='shopper')
+        self.assertEqual(CartItem.objects.get(cart=cart, product=self.toaster).quantity, 3)
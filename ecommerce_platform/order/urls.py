@@ -1,7 +1,14 @@
 from django.urls import path
 from . import views
 
+app_name='order'
+
 urlpatterns = [
     path('', views.order_page_view, name='order_page_view'),
     path('history/', views.order_history, name='order_history'),
+    path('cart/', views.cart_view, name='cart'),
+    path('cart/add/', views.cart_add_view, name='cart_add'),
+    path('cart/update/', views.cart_update_view, name='cart_update'),
+    path('cart/remove/', views.cart_remove_view, name='cart_remove'),
+    path('checkout/', views.checkout_view, name='checkout'),
 ]
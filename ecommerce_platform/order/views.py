@@ -1,9 +1,176 @@
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from store.models import Product
+from .cart import get_request_cart
+from .models import UserOrderSummary
+from .services import CheckoutError, InsufficientStockError, checkout, get_order_history
 
 
 def order_page_view(request):
     return HttpResponse("Welcome to the Order page!")
 
-def order_history(request):
-    return HttpResponse("Here is your order history!")
+@login_required
+def order_history(request: HttpRequest) -> HttpResponse:
+    """
+    Renders the order history of the logged-in user, newest first, with the items of
+    every order and a summary of all the user's orders.
+
+    Query parameters:
+        cursor: The `next_cursor` of the previous page.
+
+    @param request: The HTTP request object.
+    @return: The HTTP response with the rendered order history.
+    """
+    try:
+        orders, next_cursor = get_order_history(
+            request.user, request.GET.get('cursor'), settings.ORDER_HISTORY_PAGE_SIZE
+        )
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor.')
+
+    summary = UserOrderSummary.objects.filter(user=request.user).first()
+    context = {
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'summary': summary or UserOrderSummary(user=request.user),
+    }
+
+    return render(request, 'order_history.html', context)
+
+
+def _unavailable_product(product_id: int) -> Optional[JsonResponse]:
+    # Only user carts are checked, as their rows reference the product. Session carts never
+    # touch the database: their products are checked when merged on login and at checkout.
+    if Product.objects.filter(id=product_id, is_active=True).exists():
+        return None
+    return JsonResponse({'error': f'Product {product_id} does not exist.'}, status=404)
+
+
+def _cart_response(cart) -> JsonResponse:
+    items = cart.contents()
+    products = Product.objects.only('name', 'price').in_bulk(items.keys())
+    data = [
+        {
+            'product_id': product_id,
+            'name': products[product_id].name,
+            'price': products[product_id].price,
+            'quantity': quantity,
+        }
+        for product_id, quantity in items.items() if product_id in products
+    ]
+    return JsonResponse({'items': data})
+
+
+@require_GET
+def cart_view(request: HttpRequest) -> JsonResponse:
+    """
+    Return the contents of the visitor's cart, kept in the session for anonymous visitors.
+
+    @param request: The HTTP request object.
+    @return: JSON with the products and quantities in the cart.
+    """
+    return _cart_response(get_request_cart(request))
+
+
+@require_POST
+def cart_add_view(request: HttpRequest) -> JsonResponse:
+    """
+    Add a quantity of a product to the visitor's cart.
+
+    POST parameters:
+        product_id: The product to add.
+        quantity: The quantity to add, 1 by default.
+
+    @param request: The HTTP request object.
+    @return: JSON with an acknowledgement, or the reason the request was rejected:
+        a 404 for unknown or inactive products added to the cart of a user.
+    """
+    try:
+        product_id = int(request.POST['product_id'])
+        quantity = int(request.POST.get('quantity', 1))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'product_id and quantity must be integers.'}, status=400)
+    if quantity < 1:
+        return JsonResponse({'error': 'quantity must be a positive integer.'}, status=400)
+    if request.user.is_authenticated and (error := _unavailable_product(product_id)):
+        return error
+
+    get_request_cart(request).add(product_id, quantity)
+    return JsonResponse({'product_id': product_id, 'added': quantity})
+
+
+@require_POST
+def cart_update_view(request: HttpRequest) -> JsonResponse:
+    """
+    Set the quantity of a product in the visitor's cart; a quantity of 0 removes it.
+
+    POST parameters:
+        product_id: The product to update.
+        quantity: The new quantity.
+
+    @param request: The HTTP request object.
+    @return: JSON with an acknowledgement, or the reason the request was rejected:
+        a 404 for unknown or inactive products added to the cart of a user.
+    """
+    try:
+        product_id = int(request.POST['product_id'])
+        quantity = int(request.POST['quantity'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'product_id and quantity must be integers.'}, status=400)
+    if quantity < 0:
+        return JsonResponse({'error': 'quantity must not be negative.'}, status=400)
+    if quantity and request.user.is_authenticated and (error := _unavailable_product(product_id)):
+        return error
+
+    get_request_cart(request).update(product_id, quantity)
+    return JsonResponse({'product_id': product_id, 'quantity': quantity})
+
+
+@require_POST
+def cart_remove_view(request: HttpRequest) -> JsonResponse:
+    """
+    Remove a product from the visitor's cart.
+
+    POST parameters:
+        product_id: The product to remove.
+
+    @param request: The HTTP request object.
+    @return: JSON with an acknowledgement, or the reason the request was rejected.
+    """
+    try:
+        product_id = int(request.POST['product_id'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'product_id must be an integer.'}, status=400)
+
+    get_request_cart(request).remove(product_id)
+    return JsonResponse({'product_id': product_id, 'removed': True})
+
+
+@login_required
+@require_POST
+def checkout_view(request: HttpRequest) -> JsonResponse:
+    """
+    Place an order with the items of the user's cart.
+
+    @param request: The HTTP request object.
+    @return: JSON with the placed order, or the reason the checkout failed.
+    """
+    try:
+        order = checkout(request.user)
+    except InsufficientStockError as error:
+        return JsonResponse({'error': str(error), 'product_id': error.product_id}, status=409)
+    except CheckoutError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse({
+        'order_id': order.id,
+        'status': order.status,
+        'total_price': order.total_price,
+        'created_at': order.created_at,
+    }, status=201)
@@ -2,20 +2,23 @@ from decimal import Decimal
 from typing import Optional
 
 from django.contrib import admin
-from django.core.cache import cache
+from django.contrib.admin.views.main import ChangeList
 from django.db.models import QuerySet
 from django.http import HttpRequest
 
+from .caching import get_root_names
 from .models import Product, Category
+from .search import get_search_backend
+from .stats import get_category_stats
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """Admin configuration for Product model."""
-    list_display = ('name', 'manufacturer', 'price', 'stock_quantity', 'total_value')
+    list_display = ('name', 'sku', 'manufacturer', 'price', 'stock_quantity', 'total_value')
     list_filter = ('is_active', 'manufacturer', 'created_at', 'updated_at')
     search_fields = ('name', 'categories__name')
-    search_help_text = 'Search by product name or category'
+    search_help_text = 'Search by product name, description, manufacturer or category'
     list_editable = ('stock_quantity', 'price')
     ordering = ('stock_quantity',)
     prefetch_related = ('categories',)
@@ -23,6 +26,25 @@ class ProductAdmin(admin.ModelAdmin):
     save_on_top = True
     list_per_page = 10
 
+    def get_search_results(
+            self, request: HttpRequest, queryset: QuerySet, search_term: str
+    ) -> tuple[QuerySet, bool]:
+        """
+        Search products through the full-text search index instead of LIKE queries.
+
+        Args:
+            request: The HTTP request object.
+            queryset: The changelist queryset.
+            search_term: The text typed in the admin search box.
+
+        Returns:
+            tuple[QuerySet, bool]: The matching products, and whether they may contain duplicates.
+        """
+        if not search_term.strip():
+            return queryset, False
+
+        return get_search_backend().filter(queryset, search_term), False
+
     @admin.display(description='Total Value')
     def total_value(self, instance: Product) -> Decimal:
         """
@@ -36,7 +58,7 @@ class ProductAdmin(admin.ModelAdmin):
         """
         return instance.stock_quantity * instance.price
 
-    def view_on_site(self, instance: Product) -> str:
+    def view_on_site(self, instance: Product) -> Optional[str]:
         """
         Generates the URL for viewing the product.
 
@@ -44,10 +66,11 @@ class ProductAdmin(admin.ModelAdmin):
             instance: The Product instance.
 
         Returns:
-            str: URL for viewing the product on the site.
+            Optional[str]: URL for viewing the product on the site, None for products without categories.
         """
-        root_category = instance.categories.first().get_root()
-        return f'http://localhost:8000/category/{root_category.id}/products/{instance.id}/'
+        if instance.primary_root_id is None:
+            return None
+        return f'http://localhost:8000/category/{instance.primary_root_id}/products/{instance.id}/'
 
 
 @admin.register(Category)
@@ -62,31 +85,20 @@ class CategoryAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request: HttpRequest) -> QuerySet:
         """
-        Enhance the base queryset with product counts.
+        Join the denormalized category statistics, which hold the product counts.
 
         Args:
             request: The HTTP request object.
 
         Returns:
-            QuerySet: Enhanced queryset with product counts.
+            QuerySet: Categories with their statistics.
         """
-        queryset_for_count = super().get_queryset(request)
-
-        # Add count of products directly in this category
-        queryset_for_count = Category.objects.add_related_count(
-            queryset_for_count, Product, 'categories',
-            'products_cumulative_count',cumulative=True
-        )
-
-        # Add count of products in this category and all descendants
-        queryset_for_count = Category.objects.add_related_count(
-            queryset_for_count, Product, 'categories',
-            'products_count', cumulative=False
-        )
+        return super().get_queryset(request).select_related('stats')
 
-        return queryset_for_count
-
-    @admin.display(description='Products count (for this specific category)')
+    @admin.display(
+        description='Products count (for this specific category)',
+        ordering='stats__direct_product_count',
+    )
     def category_products(self, instance) -> int:
         """
         Get the number of products directly in this category.
@@ -97,9 +109,12 @@ class CategoryAdmin(admin.ModelAdmin):
         Returns:
             int: Number of products in this category.
         """
-        return instance.products_count
+        return get_category_stats(instance).direct_product_count
 
-    @admin.display(description='Products count (in tree)')
+    @admin.display(
+        description='Products count (in tree)',
+        ordering='stats__cumulative_product_count',
+    )
     def tree_products(self, instance) -> int:
         """
         Get the total number of products in a main category,
@@ -111,12 +126,24 @@ class CategoryAdmin(admin.ModelAdmin):
         Returns:
             int: Total number of products in the main category tree.
         """
-        return instance.products_cumulative_count
+        return get_category_stats(instance).cumulative_product_count
+
+    def get_changelist(self, request: HttpRequest, **kwargs) -> type[ChangeList]:
+        """
+        Use a changelist that resolves the root names of a whole page at once.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            type[ChangeList]: The changelist class.
+        """
+        return CategoryChangeList
 
     @admin.display(description='Main category')
     def root_category(self, instance) -> Optional[str]:
         """
-        Get the root category name with caching.
+        Get the root category name from the shared root name map.
 
         Args:
             instance: The Category instance.
@@ -127,10 +154,23 @@ class CategoryAdmin(admin.ModelAdmin):
         if instance.is_root_node():
             return None
 
-        cache_key = f'root_name:{instance.tree_id}'
-        root_category_name = cache.get(cache_key)
-        if not root_category_name:
-            root_category_name= instance.get_root().name
-            cache.set(cache_key, root_category_name, timeout=3600)
+        if not hasattr(instance, 'root_name'):
+            instance.root_name = get_root_names().get(instance.tree_id)
+
+        return instance.root_name
 
-        return root_category_name
+
+class CategoryChangeList(ChangeList):
+    """Changelist attaching root names to the page rows from a single lookup."""
+
+    def get_results(self, request: HttpRequest) -> None:
+        """
+        Load the page rows and attach the name of their root category.
+
+        Args:
+            request: The HTTP request object.
+        """
+        super().get_results(request)
+        root_names = get_root_names()
+        for category in self.result_list:
+            category.root_name = root_names.get(category.tree_id)
@@ -0,0 +1,207 @@
+"""
+Asynchronous variants of the catalog views, served under `/async/`.
+
+Under ASGI, the synchronous views of `views.py` each run in a worker thread, while
+these run in the event loop and only hand their queries to the async ORM. Queries
+that do not depend on each other are started together with `asyncio.gather`; with
+the current Django backends the async ORM still runs them one after the other in the
+thread of the request, so they become concurrent as soon as the backend is async.
+Templates are rendered in that thread too, where lazy lookups are allowed.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Prefetch
+from django.http import (
+    HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from django.shortcuts import aget_object_or_404, render
+from django.views.decorators.http import condition
+
+from ecommerce_platform.db_routing import use_replica
+
+from .caching import (
+    catalog_etag, catalog_last_modified, categories_page_key, category_page_key, product_page_key,
+    versioned_cache_page,
+)
+from .category_tree import breadcrumb_categories
+from .feeds import alist, astream_product_feed
+from .images import image_srcsets
+from .models import Category, Product
+from .pagination import SORTS, build_page, page_queries, parse_page_request
+from .serialization import (
+    CATEGORY_FIELDS, PRODUCT_FIELDS, aserialize_products, json_response, parse_fields, select_fields,
+    serialize_rows,
+)
+from .stats import get_category_stats, subtree_products
+from .views import breadcrumb_category, parse_keyset_params, parse_since
+
+
+@use_replica
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+async def list_products(request: HttpRequest) -> HttpResponse:
+    """
+    Return the payload of `views.list_products`, loading the products and their
+    categories concurrently. The document is encoded and compressed in a worker
+    thread, keeping the event loop free meanwhile.
+
+    @param request: The HTTP request object.
+    @return: JSON containing product information.
+    """
+    try:
+        since = parse_since(request)
+        fields = parse_fields(request, PRODUCT_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    products = Product.objects.order_by('id')
+    if since is not None:
+        products = products.filter(updated_at__gt=since)
+
+    data = await aserialize_products(products, fields)
+
+    return await sync_to_async(json_response, thread_sensitive=False)(request, data)
+
+
+async def products_feed(request: HttpRequest) -> HttpResponse:
+    """
+    Stream one keyset page of the catalog as JSON, like `views.products_feed`.
+
+    @param request: The HTTP request object.
+    @return: A streaming JSON response with `results` and `next_cursor`.
+    """
+    try:
+        after_id, limit = parse_keyset_params(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    content = astream_product_feed(after_id, limit, settings.STORE_FEED_CHUNK_SIZE)
+
+    return StreamingHttpResponse(content, content_type='application/json')
+
+
+@use_replica
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+async def list_categories(request: HttpRequest) -> HttpResponse:
+    """
+    Return the payload of `views.list_categories`, with the parents joined to the categories.
+
+    @param request: The HTTP request object.
+    @return: JSON containing category information.
+    """
+    try:
+        since = parse_since(request)
+        fields = parse_fields(request, CATEGORY_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    categories = Category.objects.order_by('tree_id', 'lft')
+    if since is not None:
+        categories = categories.filter(updated_at__gt=since)
+
+    rows = await alist(select_fields(categories, CATEGORY_FIELDS, fields))
+    data = serialize_rows(rows, CATEGORY_FIELDS, fields)
+
+    return await sync_to_async(json_response, thread_sensitive=False)(request, data)
+
+
+@versioned_cache_page(categories_page_key)
+async def categories_list_view(request: HttpRequest) -> HttpResponse:
+    """
+    Render the root categories and the amount of their products, like `views.categories_list_view`.
+
+    @param request: The HTTP request object.
+    @return: The HTTP response with the rendered list of root categories and product amounts.
+    """
+    categories_data = [
+        {
+            'category': category,
+            'total_products': get_category_stats(category).cumulative_product_count,
+        }
+        async for category in Category.objects.root_nodes().select_related('stats')
+    ]
+
+    return await sync_to_async(render)(request, 'categories.html', {'categories': categories_data})
+
+
+@versioned_cache_page(category_page_key)
+async def category_detailed_view(request: HttpRequest, category_id: int) -> HttpResponse:
+    """
+    Render a category with its statistics and a page of its products, like
+    `views.category_detailed_view`. The requested page and the pages before it are
+    loaded concurrently.
+
+    @param request: The HTTP request object.
+    @param category_id: The ID of the category to retrieve.
+    @return: The HTTP response with the rendered category details, products, and statistics.
+    """
+    try:
+        page_request = parse_page_request(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    category = await aget_object_or_404(Category.objects.select_related('stats'), id=category_id)
+    products = subtree_products(category).annotate(total_value=F('price') * F('stock_quantity'))
+
+    category_stats = get_category_stats(category)
+    total = category_stats.cumulative_product_count
+    results = await asyncio.gather(
+        *(alist(query) for query in page_queries(products, page_request, total))
+    )
+    page_object = build_page(page_request, results, total)
+
+    statistics = {
+        'category_total_value': category_stats.total_stock_value,
+        'max_price': category_stats.max_price,
+        'min_price': category_stats.min_price,
+        'avg_price': category_stats.avg_price,
+        'total_products': category_stats.cumulative_product_count,
+    }
+
+    context = {
+        'category': category,
+        'page_object': page_object,
+        'sorts': SORTS,
+        'statistics': statistics,
+    }
+
+    return await sync_to_async(render)(request, 'category.html', context)
+
+
+@versioned_cache_page(product_page_key)
+async def product_detailed_view(request: HttpRequest, category_id: int, product_id: int) -> HttpResponse:
+    """
+    Render a product with its breadcrumbs, like `views.product_detailed_view`.
+
+    @param request: The HTTP request object.
+    @param category_id: The ID of the root category associated with the product.
+    @param product_id: The ID of the product to retrieve.
+    @return: The HTTP response with the rendered product details.
+    """
+    product = await aget_object_or_404(
+        Product.objects.prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('name', 'path')),
+        ),
+        id=product_id,
+    )
+    product_categories = list(product.categories.all())
+
+    last = breadcrumb_category(product_categories, category_id)
+    if last is not None:
+        breadcrumbs = await alist(breadcrumb_categories(last))
+    else:
+        breadcrumbs = []
+    category = next((crumb for crumb in breadcrumbs if crumb.id == category_id), None)
+    if category is None:
+        category = await aget_object_or_404(Category.objects.only('id', 'name'), id=category_id)
+
+    context = {
+        'product': product,
+        'product_categories': ', '.join(category.name for category in product_categories),
+        'category': category,
+        'breadcrumbs': breadcrumbs,
+        'image_srcsets': image_srcsets(product),
+    }
+
+    return await sync_to_async(render)(request, 'product.html', context)
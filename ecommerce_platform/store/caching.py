@@ -0,0 +1,291 @@
+"""
+Versioned caching of the rendered store pages.
+
+Every cached page key embeds the versions of the data the page depends on:
+
+* the catalog version, bumped on any catalog write, for the root category list;
+* the version of a category tree (per `Category.tree_id`), for category pages;
+* the version of a product, for product pages;
+* the structure generation, bumped when tree ids may have shifted (root inserts,
+  moves and reorders), which is part of every key.
+
+The catalog version and the time of the last catalog write also serve as ETag and
+Last-Modified of the catalog JSON endpoints. The category version, bumped on category
+writes only, versions the nested category tree and its ETag.
+
+Writes only bump versions, so stale pages are never read again and simply
+expire from the cache. Everything cached under a version is read from the primary
+database, as a replica may not have caught up with the version yet.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Iterable, Optional
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+
+from ecommerce_platform.db_routing import use_primary
+
+from .models import Category
+
+GENERATION_KEY = 'store:version:generation'
+CATALOG_KEY = 'store:version:catalog'
+ROOT_NAMES_KEY = 'store:root_names'
+CATALOG_MODIFIED_KEY = 'store:catalog_modified'
+CATEGORIES_KEY = 'store:version:categories'
+
+
+def get_cache():
+    return caches[settings.STORE_CACHE_ALIAS]
+
+
+def tree_key(tree_id: int) -> str:
+    return f'store:version:tree:{tree_id}'
+
+
+def product_key(product_id: int) -> str:
+    return f'store:version:product:{product_id}'
+
+
+def _new_version() -> int:
+    # Start missing versions from the clock, so a version key evicted from the cache
+    # never comes back with a value that was already used for cached pages.
+    return time.time_ns() // 1000
+
+
+def get_versions(*keys: str) -> list[int]:
+    """
+    Read the current value of version keys, initializing the missing ones.
+
+    @param keys: The version keys to read.
+    @return: The versions, in the order of the keys.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys: Iterable[str]) -> None:
+    """
+    Increment version keys once the current transaction commits, so readers
+    never cache pages of uncommitted data under the new versions.
+
+    @param keys: The version keys to bump.
+    """
+    keys = set(keys)
+
+    def bump():
+        cache = get_cache()
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _new_version(), timeout=None)
+        if CATALOG_KEY in keys:
+            cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+
+    if keys:
+        transaction.on_commit(bump)
+
+
+def invalidate_catalog(
+        tree_ids: Iterable[int] = (), product_ids: Iterable[int] = (), structure: bool = False
+) -> None:
+    """
+    Invalidate the cached pages affected by a catalog write.
+
+    @param tree_ids: The category trees whose pages changed.
+    @param product_ids: The products whose pages changed.
+    @param structure: Whether tree ids may have shifted, which invalidates every page.
+    """
+    keys = [CATALOG_KEY, *map(tree_key, tree_ids), *map(product_key, product_ids)]
+    if structure:
+        keys.append(GENERATION_KEY)
+    bump_versions(keys)
+
+
+def catalog_etag(request: HttpRequest) -> str:
+    """
+    Build the ETag of a catalog JSON response from the catalog version, without
+    touching the database. The query string is part of it, as it selects the content.
+
+    @param request: The HTTP request object.
+    @return: A weak ETag.
+    """
+    generation, catalog = get_versions(GENERATION_KEY, CATALOG_KEY)
+    return f'W/"catalog-{generation}-{catalog}-{_query_digest(request)}"'
+
+
+def category_tree_etag(request: HttpRequest) -> str:
+    """
+    Build the ETag of a category tree response from the category version.
+
+    @param request: The HTTP request object.
+    @return: A weak ETag.
+    """
+    version, = get_versions(CATEGORIES_KEY)
+    return f'W/"categories-{version}-{_query_digest(request)}"'
+
+
+def _query_digest(request: HttpRequest) -> str:
+    return hashlib.md5(request.META.get('QUERY_STRING', '').encode()).hexdigest()[:12]
+
+
+def catalog_last_modified(request: HttpRequest) -> datetime:
+    """
+    Return the time of the last catalog write, or the current time when it is unknown,
+    e.g. after a cache eviction, as the catalog may have changed at any time before.
+
+    @param request: The HTTP request object.
+    @return: An aware datetime.
+    """
+    cache = get_cache()
+    timestamp = cache.get(CATALOG_MODIFIED_KEY)
+    if timestamp is None:
+        timestamp = time.time()
+        cache.add(CATALOG_MODIFIED_KEY, timestamp, timeout=None)
+
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def get_root_names() -> dict[int, str]:
+    """
+    Map every tree id to the name of its root category, loaded with a single
+    query and shared through the cache until a category is saved or deleted.
+
+    @return: Dictionary of tree ids to root category names.
+    """
+    cache = get_cache()
+    root_names = cache.get(ROOT_NAMES_KEY)
+    if root_names is None:
+        with use_primary():
+            root_names = dict(Category.objects.root_nodes().values_list('tree_id', 'name'))
+        cache.set(ROOT_NAMES_KEY, root_names, timeout=settings.STORE_PAGE_CACHE_TIMEOUT)
+
+    return root_names
+
+
+def invalidate_categories() -> None:
+    """
+    Drop the shared root name map and bump the category version once the current
+    transaction commits.
+    """
+    transaction.on_commit(lambda: get_cache().delete(ROOT_NAMES_KEY))
+    bump_versions([CATEGORIES_KEY])
+
+
+def get_category_tree_id(category_id: int, generation: int) -> Optional[int]:
+    """
+    Resolve the tree of a category, cached until the structure generation changes.
+
+    @param category_id: The ID of the category.
+    @param generation: The current structure generation.
+    @return: The tree id, or None when the category does not exist.
+    """
+    cache = get_cache()
+    key = f'store:category_tree:{generation}:{category_id}'
+    tree_id = cache.get(key)
+    if tree_id is None:
+        with use_primary():
+            tree_id = Category.objects.filter(id=category_id).values_list('tree_id', flat=True).first()
+        if tree_id is not None:
+            cache.set(key, tree_id, timeout=settings.STORE_PAGE_CACHE_TIMEOUT)
+
+    return tree_id
+
+
+def categories_page_key(request: HttpRequest) -> str:
+    generation, catalog = get_versions(GENERATION_KEY, CATALOG_KEY)
+    return f'store:page:categories:{generation}:{catalog}'
+
+
+def category_page_key(request: HttpRequest, category_id: int) -> Optional[str]:
+    generation, = get_versions(GENERATION_KEY)
+    tree_id = get_category_tree_id(category_id, generation)
+    if tree_id is None:
+        return None
+
+    tree_version, = get_versions(tree_key(tree_id))
+    # The page, its sort and its cursor are all in the query string.
+    return f'store:page:category:{generation}:{tree_version}:{category_id}:{_query_digest(request)}'
+
+
+def product_page_key(request: HttpRequest, category_id: int, product_id: int) -> Optional[str]:
+    generation, product_version = get_versions(GENERATION_KEY, product_key(product_id))
+    tree_id = get_category_tree_id(category_id, generation)
+    if tree_id is None:
+        return None
+
+    tree_version, = get_versions(tree_key(tree_id))
+    return (f'store:page:product:{generation}:{tree_version}:{product_version}:'
+            f'{category_id}:{product_id}')
+
+
+def versioned_cache_page(key_func: Callable[..., Optional[str]]) -> Callable:
+    """
+    Cache successful GET responses of a view under the key built by `key_func`,
+    which receives the view arguments and returns None to skip caching.
+    Both synchronous and asynchronous views are supported. Responses are rendered
+    from the primary database, as a lagging replica would be cached under the new
+    versions, so cached views are not decorated with `use_replica`.
+
+    @param key_func: Builds the versioned cache key of a request.
+    @return: The view decorator.
+    """
+    def decorator(view_func: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+        def store(key: Optional[str], response: HttpResponse) -> None:
+            if key and response.status_code == 200 and not response.streaming:
+                get_cache().set(
+                    key, (response.content, response['Content-Type']),
+                    timeout=settings.STORE_PAGE_CACHE_TIMEOUT,
+                )
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+                if request.method not in ('GET', 'HEAD'):
+                    return await view_func(request, *args, **kwargs)
+
+                with use_primary():
+                    # Key functions may query the database.
+                    key = await sync_to_async(key_func)(request, *args, **kwargs)
+                    cached = await get_cache().aget(key) if key else None
+                    if cached is not None:
+                        content, content_type = cached
+                        return HttpResponse(content, content_type=content_type)
+
+                    response = await view_func(request, *args, **kwargs)
+                await sync_to_async(store)(key, response)
+                return response
+
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            with use_primary():
+                key = key_func(request, *args, **kwargs)
+                cached = get_cache().get(key) if key else None
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                response = view_func(request, *args, **kwargs)
+            store(key, response)
+            return response
+
+        return wrapper
+
+    return decorator
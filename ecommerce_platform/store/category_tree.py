@@ -0,0 +1,425 @@
+"""
+Bulk loading and integrity checks of the category tree.
+
+Saving categories one by one through MPTTModel.save() shifts the `lft`/`rght` values
+of every following node on each insert, as siblings are kept ordered by name. The
+loader instead merges a whole taxonomy with the existing tree in memory, assigns
+the MPTT fields of every node in one pass, and writes them with bulk queries.
+
+The nested JSON tree of the API is assembled the other way round: from one query of
+the nodes in `lft` order, in a single pass, and cached until a category changes.
+The materialized paths of the categories and the primary roots of the products are
+derived from the tree in the same way whenever it changes.
+"""
+import csv
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Count, F, IntegerField, Max, Min, OuterRef, Q, QuerySet, Subquery, Sum, Value,
+)
+from django.db.models.functions import Cast, Left, Mod, StrIndex
+
+from ecommerce_platform.db_routing import use_primary
+
+from .caching import (
+    CATEGORIES_KEY, get_cache, get_versions, invalidate_catalog, invalidate_categories,
+)
+from .models import Category, CategoryStats, Product
+from .serialization import encode_json
+
+TREE_FIELDS = ('tree_id', 'lft', 'rght', 'level')
+
+
+def _new_node(name: str, description: str = '') -> dict:
+    return {'name': name, 'description': description, 'children': []}
+
+
+def read_tree_json(path: Path) -> list[dict]:
+    """
+    Read a taxonomy from a JSON file holding a node or a list of root nodes.
+
+    Nodes are objects with a `name`, and optionally a `description` and a list of
+    `children` nodes.
+
+    @param path: The file to read.
+    @return: The root nodes, as dictionaries with name, description and children.
+    @raise ValueError: If a node has no name.
+    """
+    def convert(node: dict) -> dict:
+        if not node.get('name'):
+            raise ValueError('Every category needs a name.')
+        converted = _new_node(node['name'].strip(), node.get('description') or '')
+        converted['children'] = [convert(child) for child in node.get('children', [])]
+        return converted
+
+    with path.open(encoding='utf-8') as file:
+        data = json.load(file)
+
+    return [convert(node) for node in (data if isinstance(data, list) else [data])]
+
+
+def read_tree_csv(path: Path, separator: str = '/') -> list[dict]:
+    """
+    Read a taxonomy from a CSV file with a `path` column, e.g. "Electronics/Cameras",
+    and an optional `description` column. Missing intermediate categories are added.
+
+    @param path: The file to read.
+    @param separator: The separator of the category names in a path.
+    @return: The root nodes, as dictionaries with name, description and children.
+    """
+    roots = []
+    nodes = {}
+    with path.open(newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            names = [name.strip() for name in row['path'].split(separator) if name.strip()]
+            for depth in range(len(names)):
+                key = tuple(names[:depth + 1])
+                if key not in nodes:
+                    nodes[key] = _new_node(names[depth])
+                    siblings = nodes[key[:-1]]['children'] if depth else roots
+                    siblings.append(nodes[key])
+            if names and row.get('description'):
+                nodes[tuple(names)]['description'] = row['description']
+
+    return roots
+
+
+def _key(category: Optional[Category]):
+    """Key of a category in the children map: its id, or its identity before it is saved."""
+    if category is None:
+        return None
+    return category.pk if category.pk is not None else id(category)
+
+
+def _merge(roots: list[dict], existing: dict[str, Category]) -> tuple[dict, list[Category]]:
+    """
+    Merge the loaded nodes into the existing categories, matching them by name.
+
+    @param roots: The loaded root nodes.
+    @param existing: The existing categories keyed by name.
+    @return: The children of every category keyed by `_key` of the parent, and the
+        new, unsaved categories, parents first.
+    @raise ValueError: If a loaded category exists under another parent, or appears twice.
+    """
+    children = {}
+    for category in existing.values():
+        children.setdefault(category.parent_id, []).append(category)
+
+    created = []
+    seen = set()
+    stack = [(node, None) for node in reversed(roots)]
+    while stack:
+        node, parent = stack.pop()
+        name = node['name']
+        if name in seen:
+            raise ValueError(f'"{name}" appears more than once.')
+        seen.add(name)
+
+        category = existing.get(name)
+        if category is None:
+            category = Category(name=name, description=node['description'], parent=parent)
+            children.setdefault(_key(parent), []).append(category)
+            created.append(category)
+        elif (parent is not None and parent.pk is None) or category.parent_id != _key(parent):
+            raise ValueError(f'"{name}" already exists under another parent.')
+
+        stack.extend((child, category) for child in reversed(node['children']))
+
+    return children, created
+
+
+def _assign_tree_fields(children: dict) -> None:
+    """Number every node of the forest depth first, siblings and roots ordered by name."""
+    def sorted_children(category: Optional[Category]) -> list[Category]:
+        return sorted(children.get(_key(category), []), key=lambda child: child.name)
+
+    for tree_id, root in enumerate(sorted_children(None), start=1):
+        counter = 1
+        root.tree_id, root.lft, root.level = tree_id, counter, 0
+        stack = [(root, iter(sorted_children(root)))]
+        while stack:
+            category, pending = stack[-1]
+            child = next(pending, None)
+            counter += 1
+            if child is None:
+                category.rght = counter
+                stack.pop()
+            else:
+                child.tree_id, child.lft, child.level = tree_id, counter, category.level + 1
+                stack.append((child, iter(sorted_children(child))))
+
+
+def load_category_tree(roots: list[dict], batch_size: int = 1000) -> int:
+    """
+    Add a taxonomy to the category tree, keeping the existing categories.
+
+    Loaded categories whose name exists must sit under the same parent, and add
+    their new children to the existing category. The MPTT fields of the whole forest
+    are computed in memory, existing categories whose position changed are updated
+    with bulk_update, and new categories are inserted with one bulk_create per level,
+    as children need the ids of their parents.
+
+    @param roots: The root nodes, as returned by `read_tree_json` or `read_tree_csv`.
+    @param batch_size: Number of categories written per query.
+    @return: The number of created categories.
+    @raise ValueError: If the taxonomy conflicts with the existing tree.
+    """
+    with transaction.atomic(), Category.objects.disable_mptt_updates():
+        existing = {
+            category.name: category
+            for category in Category.objects.select_for_update().only(
+                'id', 'name', 'parent_id', 'path', *TREE_FIELDS
+            )
+        }
+        original = {
+            category.pk: tuple(getattr(category, field) for field in TREE_FIELDS)
+            for category in existing.values()
+        }
+
+        children, created = _merge(roots, existing)
+        if not created:
+            return 0
+
+        _assign_tree_fields(children)
+        moved = [
+            category for category in existing.values()
+            if tuple(getattr(category, field) for field in TREE_FIELDS) != original[category.pk]
+        ]
+        Category.objects.bulk_update(moved, TREE_FIELDS, batch_size=batch_size)
+
+        for level in range(max(category.level for category in created) + 1):
+            level_categories = [category for category in created if category.level == level]
+            for category in level_categories:
+                # Parents were created on the previous level, after being assigned.
+                if category.parent is not None:
+                    category.parent_id = category.parent.pk
+            Category.objects.bulk_create(level_categories, batch_size=batch_size)
+            if any(category.pk is None for category in level_categories):
+                # Databases without RETURNING support do not set the primary keys.
+                ids = dict(Category.objects.filter(
+                    name__in=[category.name for category in level_categories]
+                ).values_list('name', 'id'))
+                for category in level_categories:
+                    category.pk = ids[category.name]
+            # Paths embed the ids, known once the level is inserted.
+            for category in level_categories:
+                category.path = f'{category.parent.path if category.parent else ""}{category.pk}/'
+            Category.objects.bulk_update(level_categories, ['path'], batch_size=batch_size)
+
+        CategoryStats.objects.bulk_create(
+            [CategoryStats(category_id=category.pk) for category in created], batch_size=batch_size
+        )
+        invalidate_catalog(structure=True)
+        invalidate_categories()
+
+    return len(created)
+
+
+def verify_category_tree() -> list[str]:
+    """
+    Check the MPTT fields of all categories with a few aggregate queries.
+
+    Every tree must have one root and number its nodes from 1 to twice their count
+    with distinct values, every node must enclose an odd range, and every child must
+    sit inside its parent, one level below it and in the same tree.
+
+    @return: A description of every problem found, empty when the tree is valid.
+    """
+    errors = []
+
+    trees = Category.objects.values('tree_id').annotate(
+        nodes=Count('id'),
+        roots=Count('id', filter=Q(parent__isnull=True)),
+        min_lft=Min('lft'),
+        max_rght=Max('rght'),
+        distinct_lft=Count('lft', distinct=True),
+        distinct_rght=Count('rght', distinct=True),
+        bound_sum=Sum(F('lft') + F('rght')),
+    ).order_by('tree_id')
+    for tree in trees:
+        count = tree['nodes']
+        if (
+            tree['roots'] != 1 or tree['min_lft'] != 1 or tree['max_rght'] != 2 * count
+            or tree['distinct_lft'] != count or tree['distinct_rght'] != count
+            or tree['bound_sum'] != count * (2 * count + 1)
+        ):
+            errors.append(f'Tree {tree["tree_id"]} is not numbered consecutively.')
+
+    invalid_ranges = Category.objects.annotate(
+        width_parity=Mod(F('rght') - F('lft'), 2)
+    ).filter(Q(lft__gte=F('rght')) | Q(width_parity=0) | Q(parent__isnull=True, level__gt=0))
+    for name in invalid_ranges.values_list('name', flat=True):
+        errors.append(f'"{name}" has an invalid lft/rght range or level.')
+
+    misplaced = Category.objects.filter(parent__isnull=False).exclude(
+        tree_id=F('parent__tree_id'),
+        lft__gt=F('parent__lft'),
+        rght__lt=F('parent__rght'),
+        level=F('parent__level') + 1,
+    )
+    for name in misplaced.values_list('name', flat=True):
+        errors.append(f'"{name}" is not placed inside its parent.')
+
+    if not errors:
+        rows = Category.objects.order_by('tree_id', 'lft').values_list('id', 'level', 'path', 'name')
+        paths = compute_paths((category_id, level) for category_id, level, _, _ in rows)
+        for category_id, _, path, name in rows:
+            if paths[category_id] != path:
+                errors.append(f'"{name}" has a stale path.')
+
+    return errors
+
+
+def nest_categories(rows: Iterable[dict]) -> list[dict]:
+    """
+    Assemble categories in tree order into nested nodes, in a single pass: in `lft`
+    order, the parent of a node is the last node seen one level above it.
+
+    @param rows: The `id`, `name`, `level`, `lft` and `rght` of the categories, ordered
+                 by `tree_id` and `lft`, e.g. whole subtrees cut at some level.
+    @return: The top nodes, each with `id`, `name`, `has_children` and the nested `children`.
+    """
+    top_nodes = []
+    # (level, node) of the ancestors of the current row, innermost last.
+    ancestors = []
+    for row in rows:
+        node = {
+            'id': row['id'],
+            'name': row['name'],
+            # Also tells whether children were cut off by a depth limit.
+            'has_children': row['rght'] - row['lft'] > 1,
+            'children': [],
+        }
+        while ancestors and ancestors[-1][0] >= row['level']:
+            ancestors.pop()
+        (ancestors[-1][1]['children'] if ancestors else top_nodes).append(node)
+        ancestors.append((row['level'], node))
+
+    return top_nodes
+
+
+def category_tree_json(
+        root_id: Optional[int], depth: Optional[int], pretty: bool = False
+) -> Optional[bytes]:
+    """
+    Return the nested JSON category tree, cached until a category changes.
+
+    @param root_id: The category whose subtree is returned, or None for every tree.
+    @param depth: The number of levels below the top nodes included, or None for all of them.
+    @param pretty: Whether to indent the document.
+    @return: The JSON document, or None when the root category does not exist.
+    """
+    version, = get_versions(CATEGORIES_KEY)
+    key = f'store:category_tree_json:{version}:{root_id}:{depth}:{int(pretty)}'
+    cache = get_cache()
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    # Cached under the current version, so read from the primary, see store.caching.
+    with use_primary():
+        categories = Category.objects.order_by('tree_id', 'lft')
+        top_level = 0
+        if root_id is not None:
+            root = Category.objects.filter(id=root_id).values(
+                'tree_id', 'lft', 'rght', 'level'
+            ).first()
+            if root is None:
+                return None
+            categories = categories.filter(
+                tree_id=root['tree_id'], lft__gte=root['lft'], rght__lte=root['rght'],
+            )
+            top_level = root['level']
+        if depth is not None:
+            categories = categories.filter(level__lte=top_level + depth)
+
+        rows = list(categories.values('id', 'name', 'level', 'lft', 'rght'))
+    content = encode_json(nest_categories(rows), pretty=pretty)
+    cache.set(key, content, timeout=settings.STORE_PAGE_CACHE_TIMEOUT)
+    return content
+
+
+def compute_paths(rows: Iterable[tuple[int, int]], prefix: str = '') -> dict[int, str]:
+    """
+    Compute the materialized paths of categories in tree order, in a single pass.
+
+    @param rows: The (id, level) of whole subtrees, ordered by `tree_id` and `lft`.
+    @param prefix: The path of the parent of the top nodes, empty for whole trees.
+    @return: The path of every category id.
+    """
+    paths = {}
+    # (level, path) of the ancestors of the current row, innermost last.
+    ancestors = []
+    for category_id, level in rows:
+        while ancestors and ancestors[-1][0] >= level:
+            ancestors.pop()
+        paths[category_id] = f'{ancestors[-1][1] if ancestors else prefix}{category_id}/'
+        ancestors.append((level, paths[category_id]))
+
+    return paths
+
+
+def refresh_category_paths(top: Optional[Category] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute the paths of a subtree from its tree fields, e.g. after it was moved,
+    or of every category.
+
+    @param top: The top category of the subtree, with current tree fields and parent,
+                or None for all the trees. Its `path` attribute is updated too.
+    @param batch_size: Number of categories written per query.
+    @return: The number of updated categories.
+    """
+    categories = Category.objects.order_by('tree_id', 'lft')
+    prefix = ''
+    if top is not None:
+        categories = categories.filter(tree_id=top.tree_id, lft__gte=top.lft, rght__lte=top.rght)
+        if top.parent_id is not None:
+            prefix = Category.objects.filter(id=top.parent_id).values_list('path', flat=True).get()
+
+    rows = list(categories.values_list('id', 'level', 'path'))
+    paths = compute_paths(((category_id, level) for category_id, level, _ in rows), prefix)
+    changed = [
+        Category(id=category_id, path=paths[category_id])
+        for category_id, _, path in rows if path != paths[category_id]
+    ]
+    Category.objects.bulk_update(changed, ['path'], batch_size=batch_size)
+    if top is not None:
+        top.path = paths.get(top.id, top.path)
+
+    return len(changed)
+
+
+def refresh_primary_roots(product_ids=None) -> int:
+    """
+    Set the primary root of products, the root of the first category they were added
+    to, with one query: the root id is the first id of the path of that category.
+
+    @param product_ids: The product ids, or a queryset of them; every product by default.
+    @return: The number of updated products.
+    """
+    first_path = Subquery(
+        Product.categories.through.objects.filter(
+            product_id=OuterRef('pk')
+        ).order_by('id').values('category__path')[:1]
+    )
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    return products.update(
+        primary_root=Cast(Left(first_path, StrIndex(first_path, Value('/')) - 1), IntegerField())
+    )
+
+
+def breadcrumb_categories(category: Category) -> QuerySet:
+    """
+    Build the query of the categories of the path of a category, root first,
+    e.g. for breadcrumbs.
+
+    @param category: The last category of the breadcrumbs.
+    @return: QuerySet of the categories, with their name only.
+    """
+    return Category.objects.filter(id__in=category.path_ids).only('id', 'name').order_by('level')
@@ -0,0 +1,172 @@
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Count, Q, QuerySet
+from django.http import QueryDict
+
+from .models import Category, Product
+from .stats import subtree_products
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def _parse_boolean(params: QueryDict, name: str) -> Optional[bool]:
+    value = params.get(name)
+    if not value:
+        return None
+    if value.lower() not in BOOLEAN_VALUES:
+        raise ValueError(f'{name} must be true or false.')
+    return BOOLEAN_VALUES[value.lower()]
+
+
+def _parse_price(params: QueryDict, name: str) -> Optional[Decimal]:
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'{name} must be a number.') from None
+    if not price.is_finite():
+        raise ValueError(f'{name} must be a finite number.')
+    return price
+
+
+def parse_filters(params: QueryDict) -> tuple[dict[str, Q], Optional[Category]]:
+    """
+    Turn the query parameters of a browse request into one filter per facet.
+
+    Supported parameters are `manufacturer` (repeatable), `price_min`, `price_max`,
+    `in_stock`, `is_active` and `category`, which selects a whole subtree.
+
+    @param params: The query parameters.
+    @return: The filters keyed by facet name, and the selected category.
+    @raise ValueError: If a parameter has an invalid value.
+    @raise Category.DoesNotExist: If the selected category does not exist.
+    """
+    filters = {}
+
+    manufacturers = [value for value in params.getlist('manufacturer') if value]
+    if manufacturers:
+        filters['manufacturer'] = Q(manufacturer__in=manufacturers)
+
+    price_min = _parse_price(params, 'price_min')
+    price_max = _parse_price(params, 'price_max')
+    if price_min is not None or price_max is not None:
+        filters['price'] = Q()
+        if price_min is not None:
+            filters['price'] &= Q(price__gte=price_min)
+        if price_max is not None:
+            filters['price'] &= Q(price__lte=price_max)
+
+    in_stock = _parse_boolean(params, 'in_stock')
+    if in_stock is not None:
+        filters['in_stock'] = Q(stock_quantity__gt=0) if in_stock else Q(stock_quantity=0)
+
+    is_active = _parse_boolean(params, 'is_active')
+    if is_active is not None:
+        filters['is_active'] = Q(is_active=is_active)
+
+    category = None
+    if params.get('category'):
+        try:
+            category_id = int(params['category'])
+        except ValueError:
+            raise ValueError('category must be an integer.') from None
+        category = Category.objects.only('id', 'name', 'tree_id', 'lft', 'rght', 'level').get(
+            id=category_id
+        )
+        filters['category'] = Q(id__in=subtree_products(category).values('id'))
+
+    return filters, category
+
+
+def filter_products(filters: dict[str, Q], exclude: Optional[str] = None) -> QuerySet:
+    """
+    Apply the browse filters, optionally leaving out the filter of one facet.
+
+    Facet counts leave out their own filter, so that every value of the facet
+    shows how many products selecting it would return.
+
+    @param filters: The filters keyed by facet name.
+    @param exclude: The facet whose filter is left out.
+    @return: QuerySet of the matching products.
+    """
+    condition = Q()
+    for name, facet_filter in filters.items():
+        if name != exclude:
+            condition &= facet_filter
+
+    return Product.objects.filter(condition)
+
+
+def price_buckets() -> list[tuple[Decimal, Optional[Decimal]]]:
+    """Return the (min, max) price ranges of the price facet, the last one open-ended."""
+    bounds = [Decimal(0), *map(Decimal, settings.STORE_FACET_PRICE_BUCKETS)]
+    return list(zip(bounds, [*bounds[1:], None]))
+
+
+def compute_facets(filters: dict[str, Q], category: Optional[Category]) -> dict:
+    """
+    Count the products matching every facet value, with one aggregate query per facet.
+
+    @param filters: The filters keyed by facet name.
+    @param category: The selected category, whose children make up the category facet.
+        When no category is selected, the facet lists the root categories.
+    @return: The facet counts keyed by facet name.
+    """
+    manufacturers = filter_products(filters, exclude='manufacturer').values(
+        'manufacturer'
+    ).annotate(count=Count('id')).order_by('-count', 'manufacturer')
+
+    buckets = price_buckets()
+    price_counts = filter_products(filters, exclude='price').aggregate(**{
+        f'bucket_{index}': Count('id', filter=Q(price__gte=low) & (
+            Q(price__lt=high) if high is not None else Q()
+        ))
+        for index, (low, high) in enumerate(buckets)
+    })
+
+    stock_counts = filter_products(filters, exclude='in_stock').aggregate(
+        in_stock=Count('id', filter=Q(stock_quantity__gt=0)),
+        out_of_stock=Count('id', filter=Q(stock_quantity=0)),
+    )
+    active_counts = filter_products(filters, exclude='is_active').aggregate(
+        active=Count('id', filter=Q(is_active=True)),
+        inactive=Count('id', filter=Q(is_active=False)),
+    )
+
+    if category is not None:
+        children = list(category.get_children().only('id', 'name', 'tree_id', 'lft', 'rght'))
+    else:
+        children = list(Category.objects.root_nodes().only('id', 'name', 'tree_id', 'lft', 'rght'))
+
+    category_counts = {}
+    if children:
+        category_counts = Product.categories.through.objects.filter(
+            product_id__in=filter_products(filters, exclude='category').values('id')
+        ).aggregate(**{
+            f'category_{child.id}': Count('product_id', distinct=True, filter=Q(
+                category__tree_id=child.tree_id,
+                category__lft__gte=child.lft,
+                category__rght__lte=child.rght,
+            ))
+            for child in children
+        })
+
+    return {
+        'manufacturer': [
+            {'value': row['manufacturer'], 'count': row['count']} for row in manufacturers
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': price_counts[f'bucket_{index}']}
+            for index, (low, high) in enumerate(buckets)
+        ],
+        'in_stock': {'true': stock_counts['in_stock'], 'false': stock_counts['out_of_stock']},
+        'is_active': {'true': active_counts['active'], 'false': active_counts['inactive']},
+        'category': [
+            {'id': child.id, 'name': child.name, 'count': category_counts[f'category_{child.id}']}
+            for child in children
+        ],
+    }
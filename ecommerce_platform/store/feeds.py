@@ -0,0 +1,197 @@
+import asyncio
+import json
+from collections import defaultdict
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+
+from .images import image_srcsets
+from .models import Product
+
+
+def category_rows(product_ids) -> QuerySet:
+    """
+    Build the query of the categories of some products, in tree order.
+
+    @param product_ids: The product ids, or a queryset of them.
+    @return: QuerySet of (product id, category id, category name) tuples.
+    """
+    return Product.categories.through.objects.filter(
+        product_id__in=product_ids
+    ).order_by('category__tree_id', 'category__lft').values_list(
+        'product_id', 'category_id', 'category__name'
+    )
+
+
+def group_category_rows(rows: Iterable[tuple]) -> dict[int, list[dict]]:
+    """
+    Group the rows of a `category_rows()` query by product.
+
+    @param rows: The (product id, category id, category name) tuples.
+    @return: The `{'id', 'name'}` dictionaries of the categories of every product id.
+    """
+    category_map = defaultdict(list)
+    for product_id, category_id, category_name in rows:
+        category_map[product_id].append({'id': category_id, 'name': category_name})
+    return category_map
+
+
+def _attach_rows(products: list[Product], rows: Iterable[tuple]) -> None:
+    category_map = group_category_rows(rows)
+    for product in products:
+        product.category_list = category_map.get(product.id, [])
+
+
+def attach_categories(products: list[Product]) -> None:
+    """
+    Load the categories of a batch of products with a single query and
+    attach them to every product as `category_list`.
+
+    @param products: The batch of products to decorate.
+    """
+    _attach_rows(products, category_rows([product.id for product in products]))
+
+
+async def afetch_product_batch(queryset: QuerySet) -> list[Product]:
+    """
+    Load a page of products and their categories, running both queries concurrently:
+    the categories are selected with a subquery of the page rather than its ids.
+
+    @param queryset: The sliced, ordered queryset of the page.
+    @return: The products, decorated as by `attach_categories`.
+    """
+    products, rows = await asyncio.gather(
+        alist(queryset), alist(category_rows(queryset.values('id')))
+    )
+    _attach_rows(products, rows)
+    return products
+
+
+async def aattach_categories(products: list[Product]) -> None:
+    """Asynchronous `attach_categories`."""
+    _attach_rows(products, await alist(category_rows([product.id for product in products])))
+
+
+async def alist(queryset: QuerySet) -> list:
+    """Evaluate a queryset asynchronously."""
+    return [row async for row in queryset]
+
+
+def serialize_product(product: Product) -> dict:
+    """
+    Convert a product, decorated by `attach_categories`, into a JSON-ready dictionary.
+
+    @param product: The product to serialize.
+    @return: Dictionary with the same keys as the `list_products` payload.
+    """
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'stock_quantity': product.stock_quantity,
+        'image_url': product.image.url if product.image else None,
+        'image_srcset': image_srcsets(product),
+        'time_of_creation': product.created_at,
+        'time_of_update': product.updated_at,
+        'active_status': product.is_active,
+        'categories': product.category_list,
+    }
+
+
+def iter_product_batches(queryset: QuerySet, chunk_size: int) -> Iterator[list[Product]]:
+    """
+    Iterate over a product queryset with a server-side cursor, yielding
+    batches of products that already carry their categories.
+
+    @param queryset: The products to iterate over.
+    @param chunk_size: Number of rows fetched from the database per batch.
+    @return: Iterator over lists of at most `chunk_size` products.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while batch := list(islice(rows, chunk_size)):
+        attach_categories(batch)
+        yield batch
+
+
+def stream_product_feed(
+        after_id: Optional[int], limit: int, chunk_size: int
+) -> Iterable[str]:
+    """
+    Yield a JSON document holding one keyset page of products, piece by piece.
+
+    The page contains products with an id greater than `after_id`, ordered by id.
+    One extra row is read to find out whether another page follows, in which case
+    `next_cursor` holds the id to pass as `after` for the next request.
+
+    @param after_id: The cursor of the previous page, or None for the first page.
+    @param limit: The maximum number of products in the page.
+    @param chunk_size: Number of rows fetched from the database per batch.
+    @return: Iterator over chunks of the JSON document.
+    """
+    queryset = Product.objects.order_by('id')
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+
+    encoder = DjangoJSONEncoder()
+    emitted = 0
+    last_id = None
+    has_more = False
+
+    yield '{"results": ['
+    for batch in iter_product_batches(queryset[:limit + 1], min(chunk_size, limit + 1)):
+        if emitted + len(batch) > limit:
+            batch = batch[:limit - emitted]
+            has_more = True
+        if not batch:
+            break
+
+        items = ','.join(encoder.encode(serialize_product(product)) for product in batch)
+        yield (',' if emitted else '') + items
+        emitted += len(batch)
+        last_id = batch[-1].id
+
+    yield '], "next_cursor": %s}' % json.dumps(last_id if has_more else None)
+
+
+async def astream_product_feed(
+        after_id: Optional[int], limit: int, chunk_size: int
+) -> AsyncIterator[str]:
+    """
+    Asynchronous `stream_product_feed`, yielding the same JSON document.
+
+    Every batch is a keyset query following the previous one, whose products and
+    categories are loaded concurrently by `afetch_product_batch`.
+
+    @param after_id: The cursor of the previous page, or None for the first page.
+    @param limit: The maximum number of products in the page.
+    @param chunk_size: Number of products loaded per batch.
+    @return: Asynchronous iterator over chunks of the JSON document.
+    """
+    encoder = DjangoJSONEncoder()
+    emitted = 0
+    last_id = after_id
+    has_more = False
+
+    yield '{"results": ['
+    while True:
+        queryset = Product.objects.order_by('id')
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        # One extra row past the limit tells whether another page follows.
+        size = min(chunk_size, limit - emitted + 1)
+        batch = await afetch_product_batch(queryset[:size])
+        if emitted + len(batch) > limit:
+            batch = batch[:limit - emitted]
+            has_more = True
+
+        if batch:
+            items = ','.join(encoder.encode(serialize_product(product)) for product in batch)
+            yield (',' if emitted else '') + items
+            emitted += len(batch)
+            last_id = batch[-1].id
+        if has_more or len(batch) < size:
+            break
+
+    yield '], "next_cursor": %s}' % json.dumps(last_id if has_more else None)
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'products/derivatives'
+PILLOW_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.STORE_THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def _content_hash(name: str) -> str:
+    digest = hashlib.sha256()
+    with default_storage.open(name, 'rb') as file:
+        for chunk in file.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _encode(image: Image.Image, file_format: str) -> bytes:
+    if file_format == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(
+        buffer, PILLOW_FORMATS[file_format],
+        quality=settings.STORE_THUMBNAIL_QUALITY, optimize=True,
+    )
+    return buffer.getvalue()
+
+
+def build_derivatives(name: str) -> dict:
+    """
+    Write resized copies of a product image in every configured width and format.
+
+    Files are named after the hash of the source content, so an unchanged image
+    is never resized twice and a new upload never reuses the URL of an old one.
+    Widths larger than the source are skipped.
+
+    @param name: The storage name of the source image.
+    @return: Storage names of the derivatives, keyed by format and then by width.
+    """
+    content_hash = _content_hash(name)
+    derivatives = {file_format: {} for file_format in settings.STORE_THUMBNAIL_FORMATS}
+
+    with default_storage.open(name, 'rb') as file, Image.open(file) as source:
+        source.load()
+        for width in settings.STORE_THUMBNAIL_WIDTHS:
+            if width >= source.width:
+                continue
+            resized = None
+            for file_format in settings.STORE_THUMBNAIL_FORMATS:
+                derivative_name = f'{DERIVATIVES_DIR}/{content_hash}_{width}.{file_format}'
+                if not default_storage.exists(derivative_name):
+                    if resized is None:
+                        height = round(source.height * width / source.width)
+                        resized = source.resize((width, height), Image.Resampling.LANCZOS)
+                    default_storage.save(derivative_name, ContentFile(_encode(resized, file_format)))
+                derivatives[file_format][str(width)] = derivative_name
+
+    return derivatives
+
+
+def generate_product_derivatives(product_id: int) -> None:
+    """
+    Build the derivatives of a product image and store their names on the product.
+
+    The product row is only updated if its image did not change in the meantime.
+    Receivers of `products_updated` then invalidate the pages showing the product.
+
+    @param product_id: The ID of the product.
+    """
+    from .signals import products_updated
+
+    name = Product.objects.filter(pk=product_id).values_list('image', flat=True).first()
+    if name is None:
+        return
+
+    derivatives = build_derivatives(name) if name else {}
+    updated = Product.objects.filter(pk=product_id, image=name).update(
+        image_derivatives=derivatives, updated_at=timezone.now()
+    )
+    if updated:
+        products_updated.send(
+            sender=Product, product_ids=[product_id], fields=['image_derivatives', 'updated_at']
+        )
+
+
+def _run_in_background(product_id: int) -> None:
+    try:
+        generate_product_derivatives(product_id)
+    except Exception:
+        logger.exception('Could not generate the image derivatives of product %s', product_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(product_id: int) -> None:
+    """
+    Generate the derivatives of a product image in the worker pool, off the
+    request path, once the current transaction commits.
+
+    @param product_id: The ID of the product.
+    """
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_background, product_id))
+
+
+def image_srcsets(product: Product) -> dict[str, str]:
+    """
+    Build `srcset` attribute values from the derivatives of a product image.
+
+    @param product: The product.
+    @return: The srcset of every format with derivatives, e.g. {'webp': 'url 160w, url 320w'}.
+    """
+    return derivative_srcsets(product.image_derivatives)
+
+
+def derivative_srcsets(derivatives: dict) -> dict[str, str]:
+    """
+    Build `srcset` attribute values from an `image_derivatives` value, e.g. read with `.values()`.
+
+    @param derivatives: The derivative file names per format and width.
+    @return: The srcset of every format with derivatives.
+    """
+    return {
+        file_format: ', '.join(
+            f'{default_storage.url(name)} {width}w'
+            for width, name in sorted(names.items(), key=lambda item: int(item[0]))
+        )
+        for file_format, names in derivatives.items() if names
+    }
@@ -0,0 +1,142 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from django.utils.module_loading import import_string
+
+DEFAULT_PATHS = (
+    '/products/feed/?limit=100',
+    '/async/products/feed/?limit=100',
+    '/categories/',
+    '/async/categories/',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of catalog endpoints served in-process by the WSGI application '
+        'of wsgi.py, with one thread per concurrent request, and by the ASGI application of '
+        'asgi.py, with one task per concurrent request, against the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append',
+            help='Path to request, repeatable; sync and async catalog endpoints by default.',
+        )
+        parser.add_argument('--requests', type=int, default=100, help='Requests per path and server.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent requests.')
+        parser.add_argument('--host', default='localhost', help='Host header, must be in ALLOWED_HOSTS.')
+        parser.add_argument(
+            '--skip-middleware', action='append', default=[],
+            help='Dotted path of a MIDDLEWARE entry left out, e.g. the debug toolbar; repeatable.',
+        )
+
+    def run_wsgi(self, application, path: str, options: dict) -> tuple[list[float], int]:
+        url = urlsplit(path)
+
+        def request(_) -> tuple[float, bool]:
+            environ = {}
+            setup_testing_defaults(environ)
+            environ.update(
+                PATH_INFO=url.path, QUERY_STRING=url.query, HTTP_HOST=options['host'],
+                REQUEST_METHOD='GET',
+            )
+            status = []
+            started = time.perf_counter()
+            result = application(environ, lambda value, headers: status.append(value))
+            try:
+                for _ in result:
+                    pass
+            finally:
+                # Sends request_finished, which closes the database connection of the thread.
+                result.close()
+            return (time.perf_counter() - started) * 1000, status[0].startswith('200')
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(request, range(options['requests'])))
+        return [timing for timing, _ in results], sum(not ok for _, ok in results)
+
+    def run_asgi(self, application, path: str, options: dict) -> tuple[list[float], int]:
+        url = urlsplit(path)
+
+        async def request(semaphore: asyncio.Semaphore) -> tuple[float, bool]:
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(),
+                'query_string': url.query.encode(), 'root_path': '',
+                'headers': [(b'host', options['host'].encode())],
+                'client': ('127.0.0.1', 0), 'server': (options['host'], 80),
+            }
+            received = False
+
+            async def receive() -> dict:
+                nonlocal received
+                if not received:
+                    received = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects; Django cancels this once it has responded.
+                await asyncio.Event().wait()
+
+            status = []
+
+            async def send(message: dict) -> None:
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                return (time.perf_counter() - started) * 1000, status[0] == 200
+
+        async def run() -> list[tuple[float, bool]]:
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*(request(semaphore) for _ in range(options['requests'])))
+
+        results = asyncio.run(run())
+        return [timing for timing, _ in results], sum(not ok for _, ok in results)
+
+    def report(self, server: str, path: str, timings: list[float], elapsed: float, errors: int) -> None:
+        quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+        self.stdout.write(
+            f'{server:<5} {path:<40} {len(timings) / elapsed:8.1f} req/s  '
+            f'p50 {quantiles[49]:7.1f}ms  p95 {quantiles[94]:7.1f}ms  errors {errors}'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError('At least 2 requests are needed.')
+
+        middleware = [path for path in settings.MIDDLEWARE if path not in options['skip_middleware']]
+        sync_only = [
+            path for path in middleware if not getattr(import_string(path), 'async_capable', False)
+        ]
+        if sync_only:
+            self.stdout.write(self.style.WARNING(
+                'Sync-only middleware makes the ASGI application run async views in a thread too: '
+                f'{", ".join(sync_only)}. Leave it out with --skip-middleware.'
+            ))
+
+        with override_settings(MIDDLEWARE=middleware):
+            servers = {'wsgi': (get_wsgi_application(), self.run_wsgi),
+                       'asgi': (get_asgi_application(), self.run_asgi)}
+            for path in options['path'] or DEFAULT_PATHS:
+                for server, (application, run) in servers.items():
+                    # One untimed request warms up the caches and the connections.
+                    run(application, path, {**options, 'requests': 1, 'concurrency': 1})
+                    started = time.perf_counter()
+                    timings, errors = run(application, path, options)
+                    self.report(server, path, timings, time.perf_counter() - started, errors)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {options["requests"]} requests per path and server, '
+            f'{options["concurrency"]} at a time.'
+        ))
@@ -0,0 +1,146 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import F
+from django.test import override_settings
+
+from ecommerce_platform.write_queue import serialized_writes
+from store.models import Category, Product
+from store.stats import subtree_products
+
+MODES = ('default', 'tuned', 'serialized')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the read and write throughput of concurrent catalog readers and writers on '
+        'copies of the SQLite database, with the SQLite defaults ("default"), with SQLITE_OPTIONS '
+        '("tuned"), and with SQLITE_OPTIONS and the write queue ("serialized").'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Number of reading threads.')
+        parser.add_argument('--writers', type=int, default=2, help='Number of writing threads.')
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of every run.')
+        parser.add_argument(
+            '--batch-size', type=int, default=20, help='Number of products updated per write.',
+        )
+        parser.add_argument(
+            '--mode', choices=MODES, action='append',
+            help='Configuration to measure, repeatable; all of them by default.',
+        )
+
+    def read(self, alias: str, category_ids: list[int]) -> None:
+        category = Category.objects.using(alias).get(id=random.choice(category_ids))
+        list(subtree_products(category).using(alias).order_by('id')[:20])
+        list(Product.objects.using(alias).order_by('-id').values('id', 'name', 'price')[:50])
+
+    def write(self, alias: str, product_ids: list[int], batch_size: int) -> None:
+        with serialized_writes(), transaction.atomic(using=alias):
+            Product.objects.using(alias).filter(
+                id__in=random.sample(product_ids, min(batch_size, len(product_ids)))
+            ).update(stock_quantity=F('stock_quantity') + 1)
+
+    def run(self, alias: str, options: dict, category_ids: list[int], product_ids: list[int]) -> dict:
+        deadline = time.perf_counter() + options['seconds']
+        results = {'reads': [], 'writes': [], 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(operation, kind: str) -> None:
+            timings = []
+            errors = 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError:
+                        # "database is locked" once the busy timeout expired.
+                        errors += 1
+                    else:
+                        timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections[alias].close()
+            with lock:
+                results[kind].extend(timings)
+                results['errors'] += errors
+
+        def read():
+            self.read(alias, category_ids)
+
+        def write():
+            self.write(alias, product_ids, options['batch_size'])
+
+        threads = [
+            *(threading.Thread(target=worker, args=(read, 'reads')) for _ in range(options['readers'])),
+            *(threading.Thread(target=worker, args=(write, 'writes')) for _ in range(options['writers'])),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def report(self, mode: str, results: dict, seconds: float) -> None:
+        def p95(timings: list[float]) -> str:
+            if len(timings) < 2:
+                return '-'
+            return f'{statistics.quantiles(timings, n=100, method="inclusive")[94]:.1f}ms'
+
+        self.stdout.write(
+            f'{mode:<11} reads {len(results["reads"]) / seconds:8.1f}/s (p95 {p95(results["reads"])})'
+            f'  writes {len(results["writes"]) / seconds:7.1f}/s (p95 {p95(results["writes"])})'
+            f'  locked errors {results["errors"]}'
+        )
+
+    def handle(self, *args, **options):
+        source = connections.settings[DEFAULT_DB_ALIAS]
+        if source['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The default database is not SQLite.')
+
+        category_ids = list(Category.objects.values_list('id', flat=True))
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        if not category_ids or not product_ids:
+            raise CommandError('The catalog is empty.')
+
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in options['mode'] or MODES:
+                # Every run starts from a fresh copy, the journal mode being stored in the file.
+                path = Path(directory) / f'{mode}.sqlite3'
+                with closing(sqlite3.connect(source['NAME'])) as original, \
+                        closing(sqlite3.connect(path)) as copy:
+                    original.backup(copy)
+                    # The tuned configurations assume the one-time `enable_sqlite_wal` step.
+                    copy.execute(f'PRAGMA journal_mode={"DELETE" if mode == "default" else "WAL"}')
+
+                alias = f'benchmark_{mode}'
+                connections.settings[alias] = {
+                    **source,
+                    'NAME': path,
+                    'OPTIONS': {} if mode == 'default' else settings.SQLITE_OPTIONS,
+                }
+                try:
+                    with override_settings(
+                        SQLITE_SERIALIZE_WRITES=mode == 'serialized',
+                        SQLITE_WRITE_LOCK_FILE=Path(directory) / 'write.lock',
+                    ):
+                        results = self.run(alias, options, category_ids, product_ids)
+                finally:
+                    del connections.settings[alias]
+
+                self.report(mode, results, options['seconds'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Measured {options["readers"]} readers and {options["writers"]} writers '
+            f'for {options["seconds"]:.0f}s per configuration.'
+        ))
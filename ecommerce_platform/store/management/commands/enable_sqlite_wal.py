@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Switch a SQLite database to write-ahead logging, so readers never wait for the writer. '
+        'The journal mode is stored in the database file, so this runs once per deployment, '
+        'not on every connection. --disable restores the rollback journal, e.g. before copying '
+        'the file on its own.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS, help='Alias of the database to switch.',
+        )
+        parser.add_argument(
+            '--disable', action='store_true', help='Go back to the default rollback journal.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'The "{options["database"]}" database is not SQLite.')
+
+        mode = 'delete' if options['disable'] else 'wal'
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+            current = cursor.fetchone()[0].lower()
+        if current != mode:
+            # In-memory databases and open transactions of other connections keep their mode.
+            raise CommandError(f'The journal mode is still "{current}".')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{connection.settings_dict["NAME"]} uses the "{current}" journal mode.'
+        ))
@@ -0,0 +1,89 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from store.feeds import iter_product_batches
+from store.models import Product
+
+EXPORTED_FIELDS = (
+    'sku', 'name', 'description', 'manufacturer', 'price', 'stock_quantity', 'is_active',
+    'image', 'categories',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Export the catalog as CSV or JSON Lines, in the format read by import_products. '
+        'Products are streamed from a server-side cursor. Products without a SKU, which '
+        'import_products could not match, are skipped and counted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', help='The file to write; the standard output by default.',
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'), default='csv', help='File format.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of products fetched from the database per batch.',
+        )
+        parser.add_argument(
+            '--category-separator', default='|',
+            help='Separator of the category names in CSV files.',
+        )
+
+    def export_row(self, product: Product, csv_format: bool, separator: str) -> dict:
+        categories = [category['name'] for category in product.category_list]
+        return {
+            'sku': product.sku,
+            'name': product.name,
+            'description': product.description or '',
+            'manufacturer': product.manufacturer,
+            'price': str(product.price),
+            'stock_quantity': product.stock_quantity,
+            'is_active': product.is_active,
+            'image': product.image.name or '',
+            'categories': separator.join(categories) if csv_format else categories,
+        }
+
+    def handle(self, *args, **options):
+        output = sys.stdout
+        if options['path']:
+            output = open(options['path'], 'w', newline='', encoding='utf-8')
+        csv_format = options['format'] == 'csv'
+        separator = options['category_separator']
+        exported = 0
+
+        started = time.perf_counter()
+        try:
+            writer = csv.DictWriter(output, fieldnames=EXPORTED_FIELDS) if csv_format else None
+            if writer:
+                writer.writeheader()
+            queryset = Product.objects.exclude(sku__isnull=True).exclude(sku='').order_by('id')
+            for batch in iter_product_batches(queryset, options['chunk_size']):
+                rows = [self.export_row(product, csv_format, separator) for product in batch]
+                if writer:
+                    writer.writerows(rows)
+                else:
+                    output.writelines(json.dumps(row) + '\n' for row in rows)
+                exported += len(rows)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        elapsed = time.perf_counter() - started
+        skipped = Product.objects.filter(Q(sku__isnull=True) | Q(sku='')).count()
+        if skipped:
+            self.stderr.write(self.style.WARNING(
+                f'Skipped {skipped} products without a SKU; set one to export them.'
+            ))
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {exported} products in {elapsed:.2f}s '
+            f'({exported / elapsed if elapsed else 0:.0f} rows/s).'
+        ))
@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.images import generate_product_derivatives
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized derivatives of product images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only process products whose image has no derivatives yet.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.STORE_THUMBNAIL_WORKERS,
+            help='Number of images resized in parallel.',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if options['missing']:
+            products = products.filter(image_derivatives={})
+        product_ids = list(products.values_list('id', flat=True))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            # Consume the results so that errors of the workers are raised here.
+            list(executor.map(generate_product_derivatives, product_ids))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated derivatives of {len(product_ids)} product images in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,203 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.caching import invalidate_catalog
+from store.category_tree import refresh_primary_roots
+from store.images import schedule_derivatives
+from store.models import Category, Product
+from store.search import get_search_backend
+from store.stats import refresh_category_stats
+
+ProductCategories = Product.categories.through
+
+REQUIRED_FIELDS = {'sku', 'name', 'manufacturer', 'price'}
+OPTIONAL_FIELDS = {'description', 'stock_quantity', 'is_active', 'image'}
+
+
+def read_rows(path: Path, file_format: str) -> Iterator[dict]:
+    """
+    Stream the rows of a CSV file with a header line, or of a JSON Lines file.
+
+    Args:
+        path: The file to read.
+        file_format: Either 'csv' or 'jsonl'.
+
+    Yields:
+        dict: One product record per row.
+    """
+    with path.open(newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update products from a CSV or JSON Lines file, matching them by SKU. '
+        'Rows hold sku, name, manufacturer and price, and optionally description, stock_quantity, '
+        'is_active, image (a storage name) and categories, the names of the product categories '
+        'as a list, or joined by the category separator in CSV files. Every row must have the '
+        'same columns, which are the fields updated on existing products.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, help='The CSV or JSON Lines file to import.')
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'),
+            help='File format; guessed from the file extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help='Number of products upserted per query.',
+        )
+        parser.add_argument(
+            '--category-separator', default='|',
+            help='Separator of the category names in CSV files.',
+        )
+
+    def build_product(self, row: dict, line: int) -> Product:
+        values = {
+            field: value for field, value in row.items()
+            if field in REQUIRED_FIELDS | OPTIONAL_FIELDS
+        }
+        try:
+            values['price'] = Decimal(str(values['price']))
+            if 'stock_quantity' in values:
+                values['stock_quantity'] = int(values['stock_quantity'] or 0)
+        except (InvalidOperation, ValueError):
+            raise CommandError(f'Row {line}: invalid price or stock quantity.') from None
+        if isinstance(values.get('is_active'), str):
+            values['is_active'] = values['is_active'].strip().lower() in ('1', 'true', 'yes')
+        if not values['sku']:
+            raise CommandError(f'Row {line}: the SKU is empty.')
+
+        return Product(**values)
+
+    def category_names(self, row: dict, separator: str) -> list[str]:
+        names = row['categories'] or []
+        if isinstance(names, str):
+            names = names.split(separator)
+        return [name.strip() for name in names if name.strip()]
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'jsonl')
+        batch_size = options['batch_size']
+
+        # Category names are unique, so the whole taxonomy resolves from one query.
+        category_ids = dict(Category.objects.values_list('name', 'id'))
+        search_backend = get_search_backend()
+        unknown_categories = set()
+        columns = None
+        imported = 0
+
+        started = time.perf_counter()
+        rows = read_rows(path, file_format)
+        while batch := list(islice(rows, batch_size)):
+            if columns is None:
+                columns = set(batch[0])
+                missing = REQUIRED_FIELDS - columns
+                if missing:
+                    raise CommandError(f'Missing columns: {", ".join(sorted(missing))}.')
+                update_fields = sorted(((REQUIRED_FIELDS | OPTIONAL_FIELDS) & columns) - {'sku'})
+                if 'image' in columns:
+                    update_fields.append('image_derivatives')
+                update_fields.append('updated_at')
+
+            # The last row of a SKU wins, as one upsert cannot change a row twice.
+            entries = {}
+            for line, row in enumerate(batch, start=imported + 1):
+                if set(row) != columns:
+                    raise CommandError(f'Row {line}: the columns differ from the first row.')
+                product = self.build_product(row, line)
+                entries[product.sku] = (product, row)
+            products = [product for product, _ in entries.values()]
+
+            with transaction.atomic():
+                skus = [product.sku for product in products]
+                existing = {
+                    sku: (image, derivatives)
+                    for sku, image, derivatives in Product.objects.filter(
+                        sku__in=skus
+                    ).values_list('sku', 'image', 'image_derivatives')
+                }
+                changed_images = []
+                for product in products:
+                    image, derivatives = existing.get(product.sku, ('', {}))
+                    if 'image' in columns and (product.image.name or '') != (image or ''):
+                        changed_images.append(product.sku)
+                    else:
+                        product.image_derivatives = derivatives
+
+                Product.objects.bulk_create(
+                    products, batch_size=batch_size, update_conflicts=True,
+                    unique_fields=['sku'], update_fields=update_fields,
+                )
+                product_ids = dict(
+                    Product.objects.filter(sku__in=skus).values_list('sku', 'id')
+                )
+
+                # The categories of existing products keep their statistics current too.
+                affected_categories = set(
+                    ProductCategories.objects.filter(
+                        product_id__in=product_ids.values()
+                    ).values_list('category_id', flat=True)
+                )
+                if 'categories' in columns:
+                    # In the order of the rows, the first category of a product being its primary one.
+                    links = {}
+                    for product, row in entries.values():
+                        for name in self.category_names(row, options['category_separator']):
+                            if name in category_ids:
+                                links[product_ids[product.sku], category_ids[name]] = None
+                            else:
+                                unknown_categories.add(name)
+
+                    ProductCategories.objects.filter(product_id__in=product_ids.values()).delete()
+                    ProductCategories.objects.bulk_create(
+                        [
+                            ProductCategories(product_id=product_id, category_id=category_id)
+                            for product_id, category_id in links
+                        ],
+                        batch_size=batch_size,
+                    )
+                    affected_categories.update(category_id for _, category_id in links)
+                    refresh_primary_roots(product_ids.values())
+
+                # Statistics are refreshed with every batch, as it is committed on its own:
+                # an error in a later batch leaves the committed ones consistent.
+                refresh_category_stats(affected_categories)
+                search_backend.index_products(product_ids.values())
+                invalidate_catalog(
+                    product_ids=product_ids.values(),
+                    tree_ids=set(Category.objects.filter(
+                        id__in=affected_categories
+                    ).values_list('tree_id', flat=True)),
+                )
+                for sku in changed_images:
+                    schedule_derivatives(product_ids[sku])
+
+            imported += len(batch)
+            self.stdout.write(f'Processed {imported} rows...')
+
+        elapsed = time.perf_counter() - started
+        if unknown_categories:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped unknown categories: {", ".join(sorted(unknown_categories))}.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} products in {elapsed:.2f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/s).'
+        ))
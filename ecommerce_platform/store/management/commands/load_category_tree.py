@@ -0,0 +1,54 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.category_tree import (
+    load_category_tree, read_tree_csv, read_tree_json, verify_category_tree,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-load a category taxonomy from a nested JSON file, or a CSV file with a "path" '
+        'column such as "Electronics/Cameras". Existing categories are matched by name and '
+        'keep their place; the tree is verified once loaded.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, help='The JSON or CSV file to load.')
+        parser.add_argument(
+            '--format', choices=('json', 'csv'),
+            help='File format; guessed from the file extension by default.',
+        )
+        parser.add_argument(
+            '--path-separator', default='/', help='Separator of the category names in CSV paths.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help='Number of categories written per query.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'json')
+
+        started = time.perf_counter()
+        try:
+            if file_format == 'csv':
+                roots = read_tree_csv(path, options['path_separator'])
+            else:
+                roots = read_tree_json(path)
+            created = load_category_tree(roots, batch_size=options['batch_size'])
+        except ValueError as error:
+            raise CommandError(str(error)) from None
+        elapsed = time.perf_counter() - started
+
+        errors = verify_category_tree()
+        if errors:
+            raise CommandError('The category tree is invalid:\n' + '\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} categories in {elapsed:.2f}s '
+            f'({created / elapsed if elapsed else 0:.0f} categories/s).'
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.stats import rebuild_category_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized product statistics of every category.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of categories upserted per query.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = rebuild_category_stats(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt statistics of {total} categories in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.caching import invalidate_catalog, invalidate_categories
+from store.category_tree import refresh_category_paths, refresh_primary_roots, verify_category_tree
+from store.models import Category
+from store.stats import rebuild_category_stats
+
+
+class Command(BaseCommand):
+    help = 'Check the MPTT fields and paths of the category tree, and optionally rebuild them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Rebuild the tree from the parent links when it is invalid.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        errors = verify_category_tree()
+        elapsed = time.perf_counter() - started
+        if not errors:
+            self.stdout.write(self.style.SUCCESS(f'The category tree is valid ({elapsed:.2f}s).'))
+            return
+
+        for error in errors:
+            self.stdout.write(self.style.WARNING(error))
+        if not options['rebuild']:
+            raise CommandError(f'Found {len(errors)} problems in the category tree.')
+
+        Category.objects.rebuild()
+        # Cumulative statistics and paths were computed from the broken tree.
+        rebuild_category_stats()
+        refresh_category_paths()
+        refresh_primary_roots()
+        invalidate_catalog(structure=True)
+        invalidate_categories()
+        remaining = verify_category_tree()
+        if remaining:
+            raise CommandError('The category tree is still invalid after the rebuild.')
+        self.stdout.write(self.style.SUCCESS('Rebuilt the category tree.'))
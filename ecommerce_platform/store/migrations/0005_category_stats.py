@@ -0,0 +1,93 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, F, Max, Min, Sum
+
+
+def populate_category_stats(apps, schema_editor):
+    Category = apps.get_model("store", "Category")
+    CategoryStats = apps.get_model("store", "CategoryStats")
+    Product = apps.get_model("store", "Product")
+    ProductCategories = Product.categories.through
+
+    stats = []
+    for category in Category.objects.all():
+        product_ids = ProductCategories.objects.filter(
+            category__tree_id=category.tree_id,
+            category__lft__gte=category.lft,
+            category__rght__lte=category.rght,
+        ).values("product_id")
+        aggregates = Product.objects.filter(id__in=product_ids).aggregate(
+            cumulative_product_count=Count("id"),
+            total_stock_value=Sum(F("price") * F("stock_quantity")),
+            min_price=Min("price"),
+            max_price=Max("price"),
+            avg_price=Avg("price"),
+        )
+        aggregates["total_stock_value"] = aggregates["total_stock_value"] or 0
+        stats.append(
+            CategoryStats(
+                category=category,
+                direct_product_count=ProductCategories.objects.filter(
+                    category=category
+                ).count(),
+                **aggregates,
+            )
+        )
+
+    CategoryStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0004_alter_category_level_alter_category_lft_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryStats",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="store.category",
+                    ),
+                ),
+                ("direct_product_count", models.PositiveIntegerField(default=0)),
+                ("cumulative_product_count", models.PositiveIntegerField(default=0)),
+                (
+                    "total_stock_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=7, null=True
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=7, null=True
+                    ),
+                ),
+                (
+                    "avg_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=7, null=True
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Category statistics",
+            },
+        ),
+        migrations.RunPython(populate_category_stats, migrations.RunPython.noop),
+    ]
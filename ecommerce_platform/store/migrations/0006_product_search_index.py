@@ -0,0 +1,40 @@
+from django.db import migrations
+
+CREATE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS store_product_search USING fts5(
+    name, description, manufacturer, categories,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+POPULATE_SQL = """
+INSERT INTO store_product_search (rowid, name, description, manufacturer, categories)
+SELECT p.id, p.name, COALESCE(p.description, ''), p.manufacturer,
+    (SELECT COALESCE(GROUP_CONCAT(c.name, ' '), '') FROM store_product_categories pc
+     JOIN store_category c ON c.id = pc.category_id WHERE pc.product_id = p.id)
+FROM store_product p
+"""
+
+
+def create_search_index(apps, schema_editor):
+    # The FTS5 index only exists on SQLite; other databases use SimpleSearchBackend.
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(CREATE_SQL)
+        schema_editor.execute(POPULATE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_category_stats"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
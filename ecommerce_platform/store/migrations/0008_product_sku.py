@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_product_image_derivatives"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="sku",
+            field=models.CharField(
+                blank=True,
+                help_text="Supplier stock keeping unit, the key of bulk catalog imports.",
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="SKU",
+            ),
+        ),
+    ]
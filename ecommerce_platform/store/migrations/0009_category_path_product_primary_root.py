@@ -0,0 +1,63 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Left, StrIndex
+
+
+def populate_paths(apps, schema_editor):
+    Category = apps.get_model("store", "Category")
+    Product = apps.get_model("store", "Product")
+    ProductCategories = Product.categories.through
+
+    categories = []
+    ancestors = []
+    for category in Category.objects.order_by("tree_id", "lft").only("id", "level"):
+        while ancestors and ancestors[-1].level >= category.level:
+            ancestors.pop()
+        category.path = f"{ancestors[-1].path if ancestors else ''}{category.id}/"
+        ancestors.append(category)
+        categories.append(category)
+    Category.objects.bulk_update(categories, ["path"], batch_size=1000)
+
+    first_path = Subquery(
+        ProductCategories.objects.filter(product_id=OuterRef("pk"))
+        .order_by("id")
+        .values("category__path")[:1]
+    )
+    Product.objects.update(
+        primary_root=Cast(
+            Left(first_path, StrIndex(first_path, Value("/")) - 1), IntegerField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_product_sku"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="primary_root",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="store.category",
+            ),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_category_path_product_primary_root"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["price", "id"], name="store_product_price_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Q
+
+
+def backfill_skus(apps, schema_editor):
+    # Products created before SKUs existed get one derived from their id, so the
+    # catalog round-trips through export_products and import_products. A derived
+    # SKU already given to another product gets a numbered suffix instead.
+    Product = apps.get_model("store", "Product")
+    missing = Product.objects.filter(Q(sku__isnull=True) | Q(sku=""))
+    taken = set(Product.objects.exclude(pk__in=missing.values("pk")).values_list("sku", flat=True))
+
+    products = []
+    for product in missing.only("id").order_by("id").iterator():
+        sku, suffix = f"PRODUCT-{product.id}", 1
+        while sku in taken:
+            suffix += 1
+            sku = f"PRODUCT-{product.id}-{suffix}"
+        taken.add(sku)
+        product.sku = sku
+        products.append(product)
+    Product.objects.bulk_update(products, ["sku"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_product_price_id_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_skus, migrations.RunPython.noop),
+    ]
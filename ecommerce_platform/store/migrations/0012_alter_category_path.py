@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_backfill_product_sku"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="path",
+            field=models.TextField(db_index=True, default="", editable=False),
+        ),
+    ]
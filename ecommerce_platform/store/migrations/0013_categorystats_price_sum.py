@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-17 03:00
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_price_sums(apps, schema_editor):
+    Category = apps.get_model("store", "Category")
+    CategoryStats = apps.get_model("store", "CategoryStats")
+    Product = apps.get_model("store", "Product")
+    ProductCategories = Product.categories.through
+
+    for category in Category.objects.only("id", "tree_id", "lft", "rght").iterator():
+        product_ids = ProductCategories.objects.filter(
+            category__tree_id=category.tree_id,
+            category__lft__gte=category.lft,
+            category__rght__lte=category.rght,
+        ).values("product_id")
+        total = Product.objects.filter(id__in=product_ids).aggregate(total=Sum("price"))["total"]
+        CategoryStats.objects.filter(category_id=category.id).update(price_sum=total or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0012_alter_category_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="categorystats",
+            name="price_sum",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_price_sums, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,10 @@ from mptt.models import MPTTModel, TreeForeignKey
 
 
 class Product(models.Model):
+    sku = models.CharField(
+        verbose_name="SKU", max_length=64, unique=True, null=True, blank=True,
+        help_text="Supplier stock keeping unit, the key of bulk catalog imports.",
+    )
     name = models.CharField(max_length=255, db_index=True)
     description = models.TextField(verbose_name="product description", blank=True, null=True)
     manufacturer = models.CharField(max_length=100)
@@ -10,10 +14,24 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField(default=0)
     categories = models.ManyToManyField('Category', related_name='products')
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    # Storage names of the resized copies of the image, {format: {width: name}},
+    # written by `store.images` once the image is saved.
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    # Root of the first category the product was added to, the root category of its
+    # page URL, maintained by `store.signals` from the category paths.
+    primary_root = models.ForeignKey(
+        'Category', on_delete=models.SET_NULL, related_name='+', null=True, blank=True, editable=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the category pages by price, see store.pagination.
+            models.Index(fields=["price", "id"], name="store_product_price_id_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -24,6 +42,9 @@ class Category(MPTTModel):
         'self', on_delete=models.CASCADE, related_name='subcategories', null=True, blank=True
     )
     description = models.TextField(verbose_name="category description", blank=True)
+    # Ids of the ancestors and of the category itself, root first, e.g. "1/5/12/",
+    # maintained by `store.signals` on saves and tree moves. Unbounded, as is the tree depth.
+    path = models.TextField(db_index=True, editable=False, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
@@ -31,8 +52,50 @@ class Category(MPTTModel):
     def __str__(self):
         return self.name
 
+    @property
+    def path_ids(self) -> list[int]:
+        """Ids of the ancestors and of the category itself, root first."""
+        return [int(category_id) for category_id in self.path.split('/') if category_id]
+
+    @property
+    def root_id(self) -> int:
+        return self.path_ids[0]
+
+    def is_within(self, category_id: int) -> bool:
+        """Whether the category is the given category or one of its descendants, without a query."""
+        return f'/{category_id}/' in f'/{self.path}'
+
     class MPTTMeta:
         order_insertion_by = ['name']
 
     class Meta:
         verbose_name_plural = "Categories"
+
+
+class CategoryStats(models.Model):
+    """
+    Denormalized product statistics of a category, kept current by the receivers
+    in `store.signals` and rebuilt in bulk by the `rebuild_category_stats` command.
+
+    Cumulative values cover the products of the category and all of its descendants,
+    each product counted once.
+    """
+    category = models.OneToOneField(
+        Category, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    direct_product_count = models.PositiveIntegerField(default=0)
+    cumulative_product_count = models.PositiveIntegerField(default=0)
+    total_stock_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Sum of the cumulative product prices, from which avg_price is derived when a
+    # product changes, without aggregating the subtree again.
+    price_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    avg_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Statistics of {self.category}'
+
+    class Meta:
+        verbose_name_plural = "Category statistics"
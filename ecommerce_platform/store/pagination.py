@@ -0,0 +1,248 @@
+"""
+Keyset pagination of the products of a category page.
+
+Pages start after the sort value and id of the last product of the previous page,
+instead of at an offset, so deep pages cost the same as the first one, and the
+total number of products comes from `CategoryStats` instead of a COUNT query.
+
+The links of an elided window of pages around the current one are resolved from
+the queries of the page itself: the forward query reads the current page and the
+`STORE_CATEGORY_PAGE_WINDOW` pages after it, and a backward query, for pages past
+the first one, the pages before it. The last page is read backwards from the end.
+"""
+import base64
+import binascii
+import json
+from math import ceil
+from typing import NamedTuple, Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest
+
+from .models import Product
+
+# Sort orders of the category pages and their labels; ties are broken by product id.
+SORTS = {
+    'name': 'Name',
+    '-name': 'Name, descending',
+    'price': 'Lowest price',
+    '-price': 'Highest price',
+}
+LAST_PAGE = 'last'
+ELLIPSIS = '…'
+
+
+class PageRequest(NamedTuple):
+    """A page of products, as requested by the query string."""
+    sort: str
+    # Sort value and id of the product before the page, None for the first and last pages.
+    cursor: Optional[tuple]
+    last: bool
+    # Page number given with the cursor, only used for display.
+    number: int
+
+
+class PageLink(NamedTuple):
+    label: str
+    # Query string of the page, None for the current page and ellipses.
+    query: Optional[str]
+    current: bool = False
+
+
+class KeysetPage(NamedTuple):
+    sort: str
+    object_list: list
+    number: int
+    num_pages: int
+    previous: Optional[str]
+    next: Optional[str]
+    links: list[PageLink]
+
+
+def _sort_field(sort: str) -> tuple[str, bool]:
+    return sort.lstrip('-'), sort.startswith('-')
+
+
+def encode_cursor(product: Product, sort: str) -> str:
+    """
+    Build the opaque cursor pointing after a product in a sort order.
+
+    @param product: The last product of a page.
+    @param sort: One of `SORTS`.
+    @return: URL-safe cursor holding the sort value and id of the product.
+    """
+    field, _ = _sort_field(sort)
+    value = Product._meta.get_field(field).value_to_string(product)
+    return base64.urlsafe_b64encode(json.dumps([value, product.id]).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """
+    Read a cursor built by `encode_cursor`.
+
+    @param cursor: The cursor.
+    @param sort: The sort order of the cursor.
+    @return: The sort value and id of the product.
+    @raise ValueError: If the cursor is malformed.
+    """
+    field, _ = _sort_field(sort)
+    try:
+        value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return Product._meta.get_field(field).to_python(value), int(product_id)
+    except (binascii.Error, TypeError, ValueError, ValidationError) as error:
+        raise ValueError('Invalid cursor.') from error
+
+
+def parse_page_request(request: HttpRequest) -> PageRequest:
+    """
+    Read the `sort`, `after` and `page` parameters of a category page request.
+
+    @param request: The HTTP request object.
+    @return: The requested page.
+    @raise ValueError: If the sort order or the cursor is invalid.
+    """
+    sort = request.GET.get('sort') or settings.STORE_CATEGORY_DEFAULT_SORT
+    if sort not in SORTS:
+        raise ValueError(f'sort must be one of {", ".join(SORTS)}.')
+
+    page = request.GET.get('page', '')
+    if page == LAST_PAGE:
+        return PageRequest(sort, None, True, 0)
+
+    after = request.GET.get('after')
+    if not after:
+        return PageRequest(sort, None, False, 1)
+
+    try:
+        number = int(page)
+    except ValueError:
+        number = 2
+    return PageRequest(sort, decode_cursor(after, sort), False, max(number, 2))
+
+
+def _ordering(sort: str, reverse: bool = False) -> tuple[str, str]:
+    field, descending = _sort_field(sort)
+    prefix = '-' if descending != reverse else ''
+    return f'{prefix}{field}', f'{prefix}id'
+
+
+def _after(sort: str, cursor: tuple) -> Q:
+    field, descending = _sort_field(sort)
+    value, product_id = cursor
+    lookup = 'lt' if descending else 'gt'
+    return Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': product_id})
+
+
+def _last_page_size(total: int) -> int:
+    page_size = settings.STORE_CATEGORY_PAGE_SIZE
+    return (total - 1) % page_size + 1 if total else page_size
+
+
+def page_queries(products: QuerySet, page_request: PageRequest, total: int) -> list[QuerySet]:
+    """
+    Build the queries of a page and of the pages of its window.
+
+    @param products: The products of the category, unordered.
+    @param page_request: The requested page.
+    @param total: The number of products, from the category statistics.
+    @return: The sliced forward query, or the backward query of the last page, followed
+        by the backward query of the previous pages when the page has a cursor.
+    """
+    page_size = settings.STORE_CATEGORY_PAGE_SIZE
+    window = settings.STORE_CATEGORY_PAGE_WINDOW
+    backward = products.order_by(*_ordering(page_request.sort, reverse=True))
+    # One extra row tells whether more pages follow the window.
+    if page_request.last:
+        return [backward[:_last_page_size(total) + window * page_size + 1]]
+
+    forward = products.order_by(*_ordering(page_request.sort))
+    if page_request.cursor is None:
+        return [forward[:(window + 1) * page_size + 1]]
+
+    after = _after(page_request.sort, page_request.cursor)
+    return [
+        forward.filter(after)[:(window + 1) * page_size + 1],
+        backward.exclude(after)[:window * page_size + 1],
+    ]
+
+
+def build_page(page_request: PageRequest, results: list[list[Product]], total: int) -> KeysetPage:
+    """
+    Build a page and the links of its window from the results of `page_queries`.
+
+    Page numbers are exact when the backward query reached the first product; deeper
+    pages keep the number of their link, and the last page takes it from the total.
+
+    @param page_request: The requested page.
+    @param results: The evaluated queries of `page_queries`, in the same order.
+    @param total: The number of products, from the category statistics.
+    @return: The page.
+    """
+    page_size = settings.STORE_CATEGORY_PAGE_SIZE
+    window = settings.STORE_CATEGORY_PAGE_WINDOW
+    sort = page_request.sort
+
+    # `ahead` holds the products after the page, `behind` those before it, nearest first.
+    if page_request.last:
+        last_size = _last_page_size(total)
+        current, ahead, behind = results[0][:last_size][::-1], [], results[0][last_size:]
+    else:
+        current, ahead = results[0][:page_size], results[0][page_size:]
+        behind = results[1] if len(results) > 1 else []
+
+    if len(behind) <= window * page_size:
+        number = ceil(len(behind) / page_size) + 1
+    elif page_request.last:
+        number = max(ceil(total / page_size), window + 2)
+    else:
+        number = max(page_request.number, window + 2)
+
+    if len(ahead) <= window * page_size:
+        num_pages = number + ceil(len(ahead) / page_size)
+    else:
+        num_pages = max(ceil(total / page_size), number + window + 1)
+
+    def query(page_number: int, before: Optional[Product], last: bool = False) -> str:
+        params = {} if sort == settings.STORE_CATEGORY_DEFAULT_SORT else {'sort': sort}
+        if last:
+            params['page'] = LAST_PAGE
+        elif before is not None:
+            params.update(after=encode_cursor(before, sort), page=page_number)
+        return f'?{urlencode(params)}'
+
+    # Page number - k starts after behind[k * page_size], or is the first page.
+    previous_pages = [
+        (number - k, query(number - k, behind[k * page_size] if len(behind) > k * page_size else None))
+        for k in range(window, 0, -1) if len(behind) > (k - 1) * page_size
+    ]
+    # Page number + k starts after the last product of the page before it.
+    next_pages = [
+        (number + k, query(number + k, current[-1] if k == 1 else ahead[(k - 1) * page_size - 1]))
+        for k in range(1, window + 1) if len(ahead) > (k - 1) * page_size
+    ]
+
+    links = []
+    if previous_pages and previous_pages[0][0] > 1:
+        links.append(PageLink('1', query(1, None)))
+        if previous_pages[0][0] > 2:
+            links.append(PageLink(ELLIPSIS, None))
+    links.extend(PageLink(str(page_number), page_query) for page_number, page_query in previous_pages)
+    links.append(PageLink(str(number), None, current=True))
+    links.extend(PageLink(str(page_number), page_query) for page_number, page_query in next_pages)
+    if next_pages and next_pages[-1][0] < num_pages:
+        if next_pages[-1][0] < num_pages - 1:
+            links.append(PageLink(ELLIPSIS, None))
+        links.append(PageLink(str(num_pages), query(num_pages, None, last=True)))
+
+    return KeysetPage(
+        sort=sort,
+        object_list=current,
+        number=number,
+        num_pages=num_pages,
+        previous=previous_pages[-1][1] if previous_pages else None,
+        next=next_pages[0][1] if next_pages else None,
+        links=links if len(links) > 1 else [],
+    )
@@ -0,0 +1,243 @@
+import re
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Category, Product
+
+SEARCH_TABLE = 'store_product_search'
+
+
+def _search_terms(query: str) -> list[str]:
+    return re.findall(r'\w+', query.lower())
+
+
+class BaseSearchBackend:
+    """
+    Interface of the product search backends.
+
+    Backends index `Product.name`, `description`, `manufacturer` and the names of
+    the product categories, and return product ids ranked by relevance.
+    """
+
+    def index_products(self, product_ids: Iterable[int]) -> None:
+        """
+        Add or refresh the index entries of products.
+
+        @param product_ids: The ids of the products to index.
+        """
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        """
+        Remove the index entries of products.
+
+        @param product_ids: The ids of the products to remove.
+        """
+
+    def rebuild(self) -> int:
+        """
+        Index the whole catalog from scratch.
+
+        @return: The number of indexed products.
+        """
+        return 0
+
+    def search(
+            self, query: str, category: Optional[Category] = None, limit: Optional[int] = None
+    ) -> list[tuple[int, float]]:
+        """
+        Find the products matching every term of a query, each term matched as a prefix.
+
+        @param query: The text typed by the user.
+        @param category: Restrict the results to the subtree of this category.
+        @param limit: The maximum number of results, or None for all of them.
+        @return: List of (product id, score) pairs, best match first.
+        """
+        raise NotImplementedError
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        """
+        Restrict a product queryset to the products matching a query, with a subquery
+        rather than a list of ids, however many products match.
+
+        @param queryset: The products to filter.
+        @param query: The text typed by the user.
+        @return: The matching products of the queryset, unranked.
+        """
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Index-free backend matching terms with LIKE queries, for databases without FTS5."""
+
+    @staticmethod
+    def _matching(query: str) -> QuerySet:
+        products = Product.objects.all()
+        for term in _search_terms(query):
+            products = products.filter(
+                Q(name__icontains=term) | Q(description__icontains=term)
+                | Q(manufacturer__icontains=term) | Q(categories__name__icontains=term)
+            )
+        return products
+
+    def search(self, query, category=None, limit=None):
+        products = self._matching(query)
+        if category is not None:
+            products = products.filter(
+                categories__tree_id=category.tree_id,
+                categories__lft__gte=category.lft,
+                categories__rght__lte=category.rght,
+            )
+
+        product_ids = products.order_by('name').values_list('id', flat=True).distinct()
+        if limit is not None:
+            product_ids = product_ids[:limit]
+
+        return [(product_id, 0.0) for product_id in product_ids]
+
+    def filter(self, queryset, query):
+        return queryset.filter(id__in=self._matching(query).values('id'))
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Backend using the SQLite FTS5 table created by the store migrations.
+
+    Rows of the table use the product id as rowid. Results are ranked with bm25,
+    weighting name matches above manufacturer, category and description matches.
+    Without the table, e.g. on another database, the index is not maintained and
+    searches fall back to `SimpleSearchBackend`.
+    """
+    weights = (10.0, 1.0, 5.0, 3.0)
+    # Products indexed or removed per query.
+    batch_size = 500
+
+    def __init__(self):
+        self._table_exists = False
+
+    def has_table(self) -> bool:
+        """
+        Tell whether the FTS5 table exists, looking it up until it is found.
+
+        @return: True on SQLite databases migrated past the search index migration.
+        """
+        if connection.vendor != 'sqlite':
+            return False
+        if not self._table_exists:
+            self._table_exists = SEARCH_TABLE in connection.introspection.table_names()
+        return self._table_exists
+
+    def _insert(self, where: str = '', params: Iterable = ()) -> None:
+        through_table = Product.categories.through._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, manufacturer, categories) '
+                f"SELECT p.id, p.name, COALESCE(p.description, ''), p.manufacturer, "
+                f"(SELECT COALESCE(GROUP_CONCAT(c.name, ' '), '') FROM {through_table} pc "
+                f'JOIN {Category._meta.db_table} c ON c.id = pc.category_id '
+                f'WHERE pc.product_id = p.id) '
+                f'FROM {Product._meta.db_table} p {where}',
+                list(params),
+            )
+
+    def _batches(self, product_ids: Iterable[int]) -> Iterator[list[int]]:
+        # One placeholder per id; batches stay below the SQLite limit of bound variables.
+        product_ids = iter(product_ids)
+        while batch := list(islice(product_ids, self.batch_size)):
+            yield batch
+
+    def index_products(self, product_ids):
+        if not self.has_table():
+            return
+
+        for batch in self._batches(product_ids):
+            self._remove(batch)
+            placeholders = ', '.join(['%s'] * len(batch))
+            self._insert(f'WHERE p.id IN ({placeholders})', batch)
+
+    def remove_products(self, product_ids):
+        if not self.has_table():
+            return
+
+        for batch in self._batches(product_ids):
+            self._remove(batch)
+
+    @staticmethod
+    def _remove(product_ids: list[int]) -> None:
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+    def rebuild(self):
+        if not self.has_table():
+            return 0
+
+        # A single INSERT ... SELECT indexes the catalog without loading it into Python.
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self._insert()
+        return Product.objects.count()
+
+    @staticmethod
+    def _match(terms: list[str]) -> str:
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, query, category=None, limit=None):
+        if not self.has_table():
+            return SimpleSearchBackend().search(query, category, limit)
+
+        terms = _search_terms(query)
+        if not terms:
+            return []
+
+        match = self._match(terms)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        sql = (f'SELECT rowid, bm25({SEARCH_TABLE}, {weights}) AS score FROM {SEARCH_TABLE} '
+               f'WHERE {SEARCH_TABLE} MATCH %s')
+        params = [match]
+
+        if category is not None:
+            through_table = Product.categories.through._meta.db_table
+            category_table = Category._meta.db_table
+            sql += (f' AND rowid IN (SELECT pc.product_id FROM {through_table} pc '
+                    f'JOIN {category_table} c ON c.id = pc.category_id '
+                    f'WHERE c.tree_id = %s AND c.lft >= %s AND c.rght <= %s)')
+            params += [category.tree_id, category.lft, category.rght]
+
+        sql += ' ORDER BY score'
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # bm25 scores are negative, lower meaning more relevant.
+            return [(product_id, -score) for product_id, score in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        if not self.has_table():
+            return SimpleSearchBackend().filter(queryset, query)
+
+        terms = _search_terms(query)
+        if not terms:
+            return queryset.none()
+
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [self._match(terms)]
+        ))
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> BaseSearchBackend:
+    """
+    Instantiate the backend configured by the `STORE_SEARCH_BACKEND` setting.
+
+    @return: The product search backend.
+    """
+    return import_string(settings.STORE_SEARCH_BACKEND)()
@@ -0,0 +1,258 @@
+"""
+Serialization of the catalog JSON endpoints: `/products/`, `/categories/` and `/categories/tree/`.
+
+Every field of a payload is declared with the columns it is computed from, so a
+sparse fieldset (`?fields=id,name,price`) only selects those columns, as
+dictionaries from `.values()` rather than model instances. The JSON is compact
+unless `?pretty=1` is given, is encoded by orjson when it is installed, and is
+compressed with brotli (when installed) or gzip for the clients accepting it.
+"""
+import asyncio
+import gzip
+import json
+from operator import itemgetter
+from typing import Any, Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .feeds import alist, category_rows, group_category_rows
+from .images import derivative_srcsets
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Field(NamedTuple):
+    """A payload field: the columns it is read from and its value for a row of them."""
+    columns: tuple[str, ...]
+    value: Callable[[dict], Any]
+
+
+def column(name: str) -> Field:
+    return Field((name,), itemgetter(name))
+
+
+PRODUCT_FIELDS = {
+    'id': column('id'),
+    'name': column('name'),
+    'price': column('price'),
+    'stock_quantity': column('stock_quantity'),
+    'image_url': Field(
+        ('image',), lambda row: default_storage.url(row['image']) if row['image'] else None,
+    ),
+    'image_srcset': Field(
+        ('image_derivatives',), lambda row: derivative_srcsets(row['image_derivatives']),
+    ),
+    'time_of_creation': column('created_at'),
+    'time_of_update': column('updated_at'),
+    'active_status': column('is_active'),
+    # Filled in by serialize_products() with one query for all the products.
+    'categories': Field(('id',), itemgetter('categories')),
+}
+
+CATEGORY_FIELDS = {
+    'id': column('id'),
+    'name': column('name'),
+    'description': column('description'),
+    'time_of_creation': column('created_at'),
+    'time_of_update': column('updated_at'),
+    'active_status': column('is_active'),
+    # The parent name is joined, instead of being loaded per category.
+    'parent_category': Field(
+        ('parent_id', 'parent__name'),
+        lambda row: {'id': row['parent_id'], 'name': row['parent__name']} if row['parent_id'] else None,
+    ),
+}
+
+
+def parse_fields(request: HttpRequest, fields: dict[str, Field]) -> list[str]:
+    """
+    Read the sparse fieldset of a request.
+
+    @param request: The HTTP request object.
+    @param fields: The fields of the payload.
+    @return: The requested field names in payload order, every field when `fields` is missing.
+    @raise ValueError: If an unknown field is requested.
+    """
+    value = request.GET.get('fields')
+    if not value:
+        return list(fields)
+
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested - fields.keys()
+    if unknown:
+        raise ValueError(
+            f'Unknown fields: {", ".join(sorted(unknown))}. Available: {", ".join(fields)}.'
+        )
+    return [name for name in fields if name in requested]
+
+
+def select_fields(queryset: QuerySet, fields: dict[str, Field], names: list[str]) -> QuerySet:
+    """
+    Restrict a queryset to the columns of some fields.
+
+    @param queryset: The queryset to restrict.
+    @param fields: The fields of the payload.
+    @param names: The selected field names.
+    @return: QuerySet of dictionaries holding the columns of these fields.
+    """
+    columns = dict.fromkeys(name for field in names for name in fields[field].columns)
+    return queryset.values(*columns)
+
+
+def serialize_rows(rows: list[dict], fields: dict[str, Field], names: list[str]) -> list[dict]:
+    """
+    Convert the rows of `select_fields()` into JSON-ready dictionaries.
+
+    @param rows: The rows.
+    @param fields: The fields of the payload.
+    @param names: The selected field names.
+    @return: One dictionary per row, with the selected fields in payload order.
+    """
+    values = [(name, fields[name].value) for name in names]
+    return [{name: value(row) for name, value in values} for row in rows]
+
+
+def _with_categories(rows: list[dict], category_map: dict[int, list[dict]]) -> list[dict]:
+    for row in rows:
+        row['categories'] = category_map.get(row['id'], [])
+    return rows
+
+
+def serialize_products(queryset: QuerySet, names: list[str]) -> list[dict]:
+    """
+    Serialize products with two queries at most: their columns, and the categories
+    of all of them, selected with a subquery of `queryset`.
+
+    @param queryset: The products, in payload order.
+    @param names: The selected field names of `PRODUCT_FIELDS`.
+    @return: The JSON-ready products.
+    """
+    rows = list(select_fields(queryset, PRODUCT_FIELDS, names))
+    if 'categories' in names:
+        _with_categories(rows, group_category_rows(category_rows(queryset.values('id'))))
+    return serialize_rows(rows, PRODUCT_FIELDS, names)
+
+
+async def aserialize_products(queryset: QuerySet, names: list[str]) -> list[dict]:
+    """Asynchronous `serialize_products`, running both queries concurrently."""
+    if 'categories' not in names:
+        rows = await alist(select_fields(queryset, PRODUCT_FIELDS, names))
+        return serialize_rows(rows, PRODUCT_FIELDS, names)
+
+    rows, categories = await asyncio.gather(
+        alist(select_fields(queryset, PRODUCT_FIELDS, names)),
+        alist(category_rows(queryset.values('id'))),
+    )
+    _with_categories(rows, group_category_rows(categories))
+    return serialize_rows(rows, PRODUCT_FIELDS, names)
+
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def encode_json(data: Any, pretty: bool = False) -> bytes:
+    """
+    Encode data as UTF-8 JSON, with orjson when it is installed and `STORE_API_FAST_JSON` is set.
+
+    Both encoders produce the same document: datetimes, decimals and the other types
+    of `DjangoJSONEncoder` are converted by it in either case.
+
+    @param data: The data to encode.
+    @param pretty: Whether to indent the document.
+    @return: The JSON document.
+    """
+    if orjson is not None and settings.STORE_API_FAST_JSON:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, default=_django_encoder.default, option=option)
+
+    return json.dumps(
+        data, cls=DjangoJSONEncoder, ensure_ascii=False,
+        indent=2 if pretty else None, separators=(',', ': ') if pretty else (',', ':'),
+    ).encode()
+
+
+def negotiate_encoding(request: HttpRequest) -> Optional[str]:
+    """
+    Choose the content coding of a response from the Accept-Encoding header of the request.
+
+    @param request: The HTTP request object.
+    @return: "br" or "gzip", or None to send the content as is.
+    """
+    qualities = {}
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+
+    # On equal quality values, brotli is preferred: it is smaller and faster at these levels.
+    supported = ('br', 'gzip') if brotli is not None else ('gzip',)
+    candidates = [
+        (qualities.get(coding, qualities.get('*', 0.0)), -rank, coding)
+        for rank, coding in enumerate(supported)
+    ]
+    quality, _, coding = max(candidates)
+    return coding if quality > 0 else None
+
+
+def wants_pretty(request: HttpRequest) -> bool:
+    return request.GET.get('pretty') in ('1', 'true')
+
+
+def json_response(request: HttpRequest, data: Any, status: int = 200) -> HttpResponse:
+    """
+    Build a JSON response, compressed as by `encoded_response`.
+
+    @param request: The HTTP request object; `?pretty=1` indents the document.
+    @param data: The data to encode.
+    @param status: The status code.
+    @return: The response, varying on Accept-Encoding.
+    """
+    return encoded_response(request, encode_json(data, pretty=wants_pretty(request)), status)
+
+
+def encoded_response(request: HttpRequest, content: bytes, status: int = 200) -> HttpResponse:
+    """
+    Build a response of an encoded JSON document, compressed when the client accepts
+    it and the document is at least `STORE_API_COMPRESS_MIN_LENGTH` bytes long.
+
+    @param request: The HTTP request object.
+    @param content: The JSON document.
+    @param status: The status code.
+    @return: The response, varying on Accept-Encoding.
+    """
+    response = HttpResponse(content_type='application/json', status=status)
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    coding = None
+    if len(content) >= settings.STORE_API_COMPRESS_MIN_LENGTH:
+        coding = negotiate_encoding(request)
+    if coding == 'br':
+        content = brotli.compress(content, quality=settings.STORE_API_BROTLI_QUALITY)
+    elif coding == 'gzip':
+        content = gzip.compress(content, compresslevel=settings.STORE_API_GZIP_LEVEL, mtime=0)
+    if coding:
+        response['Content-Encoding'] = coding
+
+    response.content = content
+    return response
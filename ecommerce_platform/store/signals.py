@@ -0,0 +1,255 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save,
+)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from mptt.signals import node_moved
+
+from .caching import invalidate_catalog, invalidate_categories
+from .category_tree import refresh_category_paths, refresh_primary_roots
+from .images import schedule_derivatives
+from .models import Category, CategoryStats, Product
+from .search import get_search_backend
+from .stats import apply_product_change, refresh_category_stats
+
+ProductCategories = Product.categories.through
+STATS_VALUE_FIELDS = ('price', 'stock_quantity')
+
+# Sent by code changing products through QuerySet.update() or bulk_create(), which
+# bypass the model signals. Arguments: `product_ids`, and `fields`, the changed
+# field names, or None when any field may have changed.
+products_updated = Signal()
+
+
+def _product_categories(product_ids) -> list[tuple[int, int]]:
+    """Return the (id, tree_id) pairs of the categories of the given products."""
+    return list(
+        ProductCategories.objects.filter(product_id__in=product_ids).values_list(
+            'category_id', 'category__tree_id'
+        )
+    )
+
+
+def _stats_values(product_id: int):
+    """Return the stored (price, stock_quantity) of a product, None if it does not exist."""
+    return Product.objects.filter(pk=product_id).values_list(*STATS_VALUE_FIELDS).first()
+
+
+def _tree_ids(category_ids) -> set[int]:
+    return set(Category.objects.filter(id__in=category_ids).values_list('tree_id', flat=True))
+
+
+@receiver(post_init, sender=Product)
+def remember_loaded_image(sender, instance, **kwargs):
+    """Keep the image name a product was loaded with, to detect a new image on save."""
+    # Read from __dict__ so that instances loaded with .only() do not query a deferred image.
+    instance._loaded_image = instance.__dict__.get('image')
+
+
+def _image_changed(instance) -> bool:
+    if 'image' not in instance.__dict__:
+        return False
+    return (instance.image.name or '') != (getattr(instance, '_loaded_image', None) or '')
+
+
+@receiver(pre_save, sender=Product)
+def drop_stale_derivatives(sender, instance, **kwargs):
+    """Forget the derivatives of a replaced image until the new ones are generated."""
+    if _image_changed(instance):
+        instance.image_derivatives = {}
+
+
+@receiver(pre_save, sender=Product)
+def remember_stats_values(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored price and stock of a product about to change, to apply the difference."""
+    instance._stats_values = None
+    if instance.pk is None:
+        return
+    if update_fields is None or set(STATS_VALUE_FIELDS) & set(update_fields):
+        instance._stats_values = _stats_values(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def update_on_product_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Apply the price and stock change of a saved product to the statistics of its
+    categories, refresh their cached pages and generate the derivatives of a new image.
+    """
+    if _image_changed(instance):
+        instance._loaded_image = instance.image.name
+        if instance.image:
+            schedule_derivatives(instance.pk)
+
+    # New products have no categories yet; those are handled on m2m_changed.
+    categories = [] if created else _product_categories([instance.pk])
+
+    old_values = getattr(instance, '_stats_values', None)
+    if categories and old_values is not None:
+        # Only the difference is applied, the categories of the product being unchanged.
+        new_values = _stats_values(instance.pk)
+        if new_values != old_values:
+            apply_product_change(
+                (category_id for category_id, _ in categories), old_values, new_values
+            )
+    invalidate_catalog(
+        tree_ids={tree_id for _, tree_id in categories}, product_ids=[instance.pk]
+    )
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(products_updated)
+def update_on_products_updated(sender, product_ids, fields=None, **kwargs):
+    """Refresh the statistics, cached pages and search entries of bulk-updated products."""
+    product_ids = list(product_ids)
+    categories = _product_categories(product_ids)
+    fields = set(fields) if fields is not None else None
+
+    if fields is None or {'price', 'stock_quantity'} & fields:
+        refresh_category_stats(category_id for category_id, _ in categories)
+    invalidate_catalog(
+        tree_ids={tree_id for _, tree_id in categories}, product_ids=product_ids
+    )
+    if fields is None or {'name', 'description', 'manufacturer'} & fields:
+        get_search_backend().index_products(product_ids)
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_categories(sender, instance, **kwargs):
+    """
+    Keep the categories, price and stock of a product, as the M2M rows are removed
+    before post_delete.
+    """
+    instance._deleted_categories = _product_categories([instance.pk])
+    instance._stats_values = _stats_values(instance.pk) if instance._deleted_categories else None
+
+
+@receiver(post_delete, sender=Product)
+def update_on_product_delete(sender, instance, **kwargs):
+    """Remove a deleted product from the statistics and cached pages of its former categories."""
+    categories = getattr(instance, '_deleted_categories', [])
+    old_values = getattr(instance, '_stats_values', None)
+    if old_values is not None:
+        apply_product_change((category_id for category_id, _ in categories), old_values, None)
+    invalidate_catalog(
+        tree_ids={tree_id for _, tree_id in categories}, product_ids=[instance.pk]
+    )
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=ProductCategories)
+def update_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh the statistics and cached pages of categories that gained or lost products."""
+    if action == 'pre_clear':
+        # Keep the links about to be removed, as (product ids, category ids).
+        if reverse:
+            instance._cleared_links = (
+                list(instance.products.values_list('id', flat=True)), [instance.pk]
+            )
+        else:
+            instance._cleared_links = (
+                [instance.pk],
+                [category_id for category_id, _ in _product_categories([instance.pk])],
+            )
+        return
+
+    if action == 'post_clear':
+        product_ids, category_ids = instance._cleared_links
+    elif action in ('post_add', 'post_remove'):
+        product_ids, category_ids = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+    else:
+        return
+
+    # The categories are part of the product payload, whose delta requests use updated_at.
+    Product.objects.filter(id__in=product_ids).update(updated_at=timezone.now())
+    refresh_primary_roots(product_ids)
+    refresh_category_stats(category_ids)
+    invalidate_catalog(tree_ids=_tree_ids(category_ids), product_ids=product_ids)
+    get_search_backend().index_products(product_ids)
+
+
+@receiver(post_init, sender=Category)
+def remember_loaded_parent(sender, instance, **kwargs):
+    """Keep the parent a category was loaded with, to know where a later move started."""
+    # Read from __dict__ so that instances loaded with .only() do not query a deferred parent.
+    instance._loaded_parent_id = instance.__dict__.get('parent_id')
+
+
+@receiver(post_save, sender=Category)
+def update_on_category_save(sender, instance, created, **kwargs):
+    """
+    Set the path of the category, create the statistics row of a new category,
+    invalidate the pages of its tree and reindex its products.
+    """
+    if created:
+        CategoryStats.objects.get_or_create(category=instance)
+
+    # The id of a new category is only known now, and the path held by an existing
+    # instance may be stale if one of its ancestors moved since it was loaded.
+    parent_path = ''
+    if instance.parent_id is not None:
+        parent_path = Category.objects.filter(id=instance.parent_id).values_list('path', flat=True).get()
+    path = f'{parent_path}{instance.pk}/'
+    if instance.path != path:
+        Category.objects.filter(pk=instance.pk).update(path=path)
+        instance.path = path
+
+    # Product pages and the search index hold the names of the product categories.
+    product_ids = [] if created else list(instance.products.values_list('id', flat=True))
+    invalidate_catalog(
+        tree_ids=[instance.tree_id], product_ids=product_ids,
+        structure=created and instance.parent_id is None,
+    )
+    invalidate_categories()
+    get_search_backend().index_products(product_ids)
+
+
+@receiver(node_moved, sender=Category)
+def update_on_node_moved(sender, instance, **kwargs):
+    """
+    Refresh both ancestor chains of a category moved to another parent, the paths
+    of the moved subtree and the primary roots of its products.
+
+    MPTT sends this signal once the tree fields are updated, so ancestors are
+    resolved from the new tree. The old parent keeps its own ancestors.
+    Moves and sibling reorders may shift tree ids, so every cached page is invalidated.
+    """
+    old_parent_id = instance._loaded_parent_id
+    if old_parent_id != instance.parent_id:
+        refresh_category_stats(
+            parent_id for parent_id in (old_parent_id, instance.parent_id) if parent_id
+        )
+        # Sets instance.path too, which the save() in progress, if any, writes again.
+        refresh_category_paths(instance)
+        refresh_primary_roots(ProductCategories.objects.filter(
+            category__path__startswith=instance.path
+        ).values('product_id'))
+    instance._loaded_parent_id = instance.parent_id
+    invalidate_catalog(structure=True)
+    invalidate_categories()
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_products(sender, instance, **kwargs):
+    """Keep the products of a category, as the M2M rows are removed before post_delete."""
+    instance._deleted_product_ids = list(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def update_on_category_delete(sender, instance, **kwargs):
+    """
+    Refresh the statistics and cached pages of the ancestors of a deleted category,
+    and the primary roots and search index of the products it contained.
+
+    MPTT closes the gap in the tree before deleting, so ancestors are resolved
+    from the parent rather than from the stale tree fields of the instance.
+    """
+    product_ids = getattr(instance, '_deleted_product_ids', [])
+    refresh_primary_roots(product_ids)
+    if instance.parent_id:
+        refresh_category_stats([instance.parent_id])
+    invalidate_catalog(
+        tree_ids=[instance.tree_id], product_ids=product_ids,
+        structure=instance.parent_id is None,
+    )
+    invalidate_categories()
+    get_search_backend().index_products(product_ids)
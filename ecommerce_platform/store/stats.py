@@ -0,0 +1,217 @@
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Q, QuerySet, Sum
+from django.utils import timezone
+
+from .models import Category, CategoryStats, Product
+
+STATS_FIELDS = (
+    'direct_product_count', 'cumulative_product_count', 'total_stock_value', 'price_sum',
+    'min_price', 'max_price', 'avg_price', 'updated_at',
+)
+
+
+def get_category_stats(category: Category) -> CategoryStats:
+    """
+    Return the statistics of a category, or empty ones when they were not built yet.
+
+    @param category: The category, ideally loaded with select_related('stats').
+    @return: The CategoryStats of the category.
+    """
+    return getattr(category, 'stats', None) or CategoryStats(category=category)
+
+
+def subtree_products(category: Category):
+    """
+    Build a queryset of the distinct products in a category and all of its descendants.
+
+    @param category: The root of the subtree, with its MPTT fields loaded.
+    @return: QuerySet of products, each one appearing once.
+    """
+    product_ids = Product.categories.through.objects.filter(
+        category__tree_id=category.tree_id,
+        category__lft__gte=category.lft,
+        category__rght__lte=category.rght,
+    ).values('product_id')
+
+    return Product.objects.filter(id__in=product_ids)
+
+
+def compute_category_stats(categories: Iterable[Category]) -> list[CategoryStats]:
+    """
+    Compute fresh statistics for the given categories.
+
+    Direct counts are resolved with a single grouped query; the cumulative
+    values need one aggregate query per category.
+
+    @param categories: Categories with their MPTT fields loaded.
+    @return: Unsaved CategoryStats instances, one per category.
+    """
+    categories = list(categories)
+    direct_counts = dict(
+        Product.categories.through.objects.filter(
+            category_id__in=[category.id for category in categories]
+        ).values('category_id').annotate(count=Count('product_id')).values_list(
+            'category_id', 'count'
+        )
+    )
+
+    stats = []
+    for category in categories:
+        aggregates = subtree_products(category).aggregate(
+            cumulative_product_count=Count('id'),
+            total_stock_value=Sum(F('price') * F('stock_quantity')),
+            price_sum=Sum('price'),
+            min_price=Min('price'),
+            max_price=Max('price'),
+            avg_price=Avg('price'),
+        )
+        aggregates['total_stock_value'] = aggregates['total_stock_value'] or 0
+        aggregates['price_sum'] = aggregates['price_sum'] or 0
+        stats.append(CategoryStats(
+            category_id=category.id,
+            direct_product_count=direct_counts.get(category.id, 0),
+            **aggregates,
+        ))
+
+    return stats
+
+
+def save_category_stats(categories: Iterable[Category]) -> None:
+    """
+    Recompute and upsert the statistics of the given categories.
+
+    @param categories: Categories with their MPTT fields loaded.
+    """
+    CategoryStats.objects.bulk_create(
+        compute_category_stats(categories),
+        update_conflicts=True,
+        unique_fields=['category'],
+        update_fields=STATS_FIELDS,
+    )
+
+
+def ancestor_categories(category_ids: Iterable[int]) -> QuerySet:
+    """
+    Build a queryset of the given categories and of all their ancestors.
+
+    @param category_ids: Ids of categories; those that no longer exist are ignored.
+    @return: QuerySet of the categories with their MPTT fields, empty if none exists.
+    """
+    ancestors_filter = Q()
+    for tree_id, lft, rght in Category.objects.filter(id__in=category_ids).values_list(
+            'tree_id', 'lft', 'rght'):
+        ancestors_filter |= Q(tree_id=tree_id, lft__lte=lft, rght__gte=rght)
+
+    if not ancestors_filter:
+        return Category.objects.none()
+    return Category.objects.filter(ancestors_filter).only('id', 'tree_id', 'lft', 'rght')
+
+
+def refresh_category_stats(category_ids: Iterable[int]) -> None:
+    """
+    Refresh the statistics of the given categories and of all their ancestors,
+    which are the only rows a change to those categories can affect.
+    Ids of categories that no longer exist are ignored.
+
+    @param category_ids: Ids of the categories whose products changed.
+    """
+    category_ids = set(category_ids)
+    if category_ids:
+        save_category_stats(ancestor_categories(category_ids))
+
+
+def apply_product_change(
+        category_ids: Iterable[int], old: tuple[Decimal, int], new: Optional[tuple[Decimal, int]]
+) -> None:
+    """
+    Apply the change of the price or stock of one product, or its deletion, to the
+    statistics of its categories and of all their ancestors, without aggregating
+    their subtrees again.
+
+    Counts, stock values and price sums are shifted with F() expressions, and average
+    prices derived from them. A minimum or maximum price is only aggregated again
+    where the old price was that boundary and moved inwards.
+
+    @param category_ids: Ids of the categories of the product, which did not change.
+    @param old: The stored price and stock quantity of the product before the change.
+    @param new: The stored price and stock quantity after it, None if the product was deleted.
+    """
+    category_ids = set(category_ids)
+    if not category_ids:
+        return
+    old_price, old_stock = old
+    removed = new is None
+    new_price, new_stock = (Decimal(0), 0) if removed else new
+
+    with transaction.atomic():
+        rows = CategoryStats.objects.filter(
+            category_id__in=list(ancestor_categories(category_ids).values_list('id', flat=True))
+        )
+        # The rows stay locked until the commit, so the values read back below are current.
+        rows.update(
+            cumulative_product_count=F('cumulative_product_count') - int(removed),
+            price_sum=F('price_sum') + (new_price - old_price),
+            total_stock_value=F('total_stock_value') + (new_price * new_stock - old_price * old_stock),
+            updated_at=timezone.now(),
+        )
+        if removed:
+            CategoryStats.objects.filter(category_id__in=category_ids).update(
+                direct_product_count=F('direct_product_count') - 1
+            )
+
+        changed, stale = [], []
+        for stats in rows.only(
+                'category_id', 'cumulative_product_count', 'price_sum', 'min_price', 'max_price'):
+            count = stats.cumulative_product_count
+            if count == 0:
+                stats.min_price = stats.max_price = stats.avg_price = None
+                changed.append(stats)
+                continue
+            moved_up = removed or new_price > old_price
+            moved_down = removed or new_price < old_price
+            if (
+                stats.min_price is None or stats.max_price is None
+                or (stats.min_price == old_price and moved_up)
+                or (stats.max_price == old_price and moved_down)
+            ):
+                stale.append(stats.category_id)
+                continue
+            if not removed:
+                stats.min_price = min(stats.min_price, new_price)
+                stats.max_price = max(stats.max_price, new_price)
+            stats.avg_price = (stats.price_sum / count).quantize(Decimal('0.01'))
+            changed.append(stats)
+
+        CategoryStats.objects.bulk_update(changed, ['min_price', 'max_price', 'avg_price'])
+        if stale:
+            save_category_stats(
+                Category.objects.filter(id__in=stale).only('id', 'tree_id', 'lft', 'rght')
+            )
+
+
+def rebuild_category_stats(batch_size: int = 500) -> int:
+    """
+    Recompute the statistics of every category.
+
+    @param batch_size: Number of categories upserted per query.
+    @return: The number of categories processed.
+    """
+    categories = Category.objects.only('id', 'tree_id', 'lft', 'rght').order_by('id')
+    batch = []
+    total = 0
+
+    for category in categories.iterator(chunk_size=batch_size):
+        batch.append(category)
+        if len(batch) == batch_size:
+            save_category_stats(batch)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        save_category_stats(batch)
+        total += len(batch)
+
+    return total
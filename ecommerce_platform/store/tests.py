@@ -1,3 +1,533 @@
-from django.test import TestCase
+import base64
+import json
+import tempfile
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ecommerce_platform.benchmarks import (
+    DEEP_ROOT, WIDE_ROOT, BenchmarkTestCase, get_sizes, seed_catalog,
+)
+
+from .caching import get_cache
+from .category_tree import verify_category_tree
+from .models import Category, CategoryStats, Product
+from .pagination import SORTS, decode_cursor, encode_cursor
+from .search import SQLiteFTS5Backend
+from .stats import STATS_FIELDS, compute_category_stats
+
+
+class StoreEndpointBenchmarks(BenchmarkTestCase):
+    """Query counts and latency of the store endpoints, with the page cache cleared."""
+    query_budgets = {
+        'store:store_homepage': 0,
+        'store:products': 2,
+        'store:products (sparse)': 1,
+        'store:products (gzip)': 2,
+        'store:products (not modified)': 0,
+        'store:products_feed': 2,
+        'store:products_browse': 9,
+        'store:search': 3,
+        'store:product_categories': 1,
+        'store:product_categories (not modified)': 0,
+        'store:category_tree': 1,
+        'store:category_tree (subtree)': 2,
+        'store:category_tree (cached)': 0,
+        'store:categories_list': 1,
+        'store:category_products': 3,
+        'store:category_products (next page)': 4,
+        'store:category_products (last page)': 3,
+        'store:product_page': 4,
+        'store:async_products': 2,
+        'store:async_products_feed': 2,
+        'store:async_product_categories': 1,
+        'store:async_categories_list': 1,
+        'store:async_category_products': 3,
+        'store:async_category_products (next page)': 4,
+        'store:async_product_page': 4,
+    }
+
+    def test_endpoints(self):
+        for size in get_sizes():
+            seed_catalog(size)
+            wide_root = Category.objects.get(name=WIDE_ROOT)
+            deep_root = Category.objects.get(name=DEEP_ROOT)
+            deep_leaf = Category.objects.get(name='Deep 12 leaf a')
+            product = Product.objects.filter(categories=deep_leaf).first()
+
+            endpoints = [
+                ('store:store_homepage', '/', None),
+                ('store:products', '/products/', None),
+                ('store:products_feed', '/products/feed/?limit=100', None),
+                ('store:products_browse',
+                 f'/products/browse/?manufacturer=Acme&in_stock=true&category={wide_root.id}', None),
+                ('store:search', '/search/?q=benchmark+product', None),
+                ('store:product_categories', '/categories/', None),
+                ('store:category_tree', '/categories/tree/', None),
+                ('store:category_tree', f'/categories/tree/?root={deep_root.id}&depth=3', 'subtree'),
+                ('store:categories_list', '/category/', None),
+                ('store:category_products', f'/category/{wide_root.id}/products/', 'wide root'),
+                ('store:category_products', f'/category/{deep_root.id}/products/', 'deep root'),
+                ('store:category_products', f'/category/{deep_leaf.id}/products/', 'deep leaf'),
+                ('store:product_page', f'/category/{deep_root.id}/products/{product.id}/', None),
+            ]
+            for name, url, variant in endpoints:
+                label = f'{name} ({variant})' if variant else name
+                with self.subTest(endpoint=label, size=size):
+                    self.benchmark(name, size, url, setup=get_cache().clear, label=label)
+
+            # Following pages start after a cursor, and the last one is read backwards, with no count.
+            get_cache().clear()
+            first_page = self.client.get(f'/category/{wide_root.id}/products/').context['page_object']
+            for variant, url in (
+                ('next page', f'/category/{wide_root.id}/products/{first_page.next}'),
+                ('last page', f'/category/{wide_root.id}/products/?page=last'),
+            ):
+                label = f'store:category_products ({variant})'
+                with self.subTest(endpoint=label, size=size):
+                    self.benchmark(
+                        'store:category_products', size, url, setup=get_cache().clear, label=label,
+                    )
+
+            # The tree is served from the cache until a category changes.
+            with self.subTest(endpoint='store:category_tree (cached)', size=size):
+                self.client.get('/categories/tree/')
+                self.benchmark(
+                    'store:category_tree', size, '/categories/tree/', label='store:category_tree (cached)',
+                )
+
+            # Sparse fieldsets skip the category query, and both shrink the payload.
+            full_size = len(self.client.get('/products/').content)
+            for variant, url, headers in (
+                ('sparse', '/products/?fields=id,name,price', None),
+                ('gzip', '/products/', {'Accept-Encoding': 'gzip'}),
+            ):
+                label = f'store:products ({variant})'
+                with self.subTest(endpoint=label, size=size):
+                    result = self.benchmark('store:products', size, url, label=label, headers=headers)
+                    self.assertLess(result['response_bytes'], full_size / 3)
+
+            # Conditional requests are answered from the catalog version alone.
+            for name, url in (('store:products', '/products/'), ('store:product_categories', '/categories/')):
+                label = f'{name} (not modified)'
+                with self.subTest(endpoint=label, size=size):
+                    etag = self.client.get(url)['ETag']
+                    self.benchmark(
+                        name, size, url, label=label, headers={'If-None-Match': etag},
+                        expected_status=304,
+                    )
+
+            async_endpoints = [
+                ('store:async_products', '/async/products/', None),
+                ('store:async_products_feed', '/async/products/feed/?limit=100', None),
+                ('store:async_product_categories', '/async/categories/', None),
+                ('store:async_categories_list', '/async/category/', None),
+                ('store:async_category_products', f'/async/category/{wide_root.id}/products/', 'wide root'),
+                ('store:async_category_products', f'/async/category/{deep_leaf.id}/products/', 'deep leaf'),
+                ('store:async_category_products', f'/async/category/{wide_root.id}/products/{first_page.next}',
+                 'next page'),
+                ('store:async_product_page', f'/async/category/{deep_root.id}/products/{product.id}/', None),
+            ]
+            for name, url, variant in async_endpoints:
+                label = f'{name} ({variant})' if variant else name
+                with self.subTest(endpoint=label, size=size):
+                    self.benchmark(
+                        name, size, url, client=AsyncClient(), setup=get_cache().clear, label=label,
+                    )
+
+
+class BrowseFilterTests(TestCase):
+    """Invalid facet filters are rejected instead of reaching the database."""
+
+    def test_invalid_prices(self):
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf', 'ten'):
+            with self.subTest(price=value):
+                response = self.client.get('/products/browse/', {'price_min': value})
+                self.assertEqual(response.status_code, 400)
+
+    def test_price_range(self):
+        for price in (5, 15, 25):
+            Product.objects.create(name=f'Product {price}', manufacturer='Acme', price=Decimal(price))
+        response = self.client.get('/products/browse/', {'price_min': '10', 'price_max': '20.5'})
+        self.assertEqual([product['name'] for product in response.json()['results']], ['Product 15'])
+
+
+class CategoryTreeLoaderTests(TestCase):
+    """The bulk loader builds a valid tree, and the integrity check finds broken ones."""
+
+    def load(self, name: str, content: str) -> str:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / name
+            path.write_text(content, encoding='utf-8')
+            output = StringIO()
+            call_command('load_category_tree', str(path), stdout=output)
+        return output.getvalue()
+
+    def test_load_json_and_csv(self):
+        self.load('tree.json', json.dumps([
+            {'name': 'Electronics', 'children': [
+                {'name': 'Phones', 'children': [{'name': 'Smartphones'}]},
+                {'name': 'Cameras'},
+            ]},
+            {'name': 'Books', 'description': 'Paper and ebooks.'},
+        ]))
+        # Existing categories are matched by name and receive the new children.
+        output = self.load('tree.csv', 'path\nElectronics/Cameras/Lenses\nGarden/Tools\n')
+        self.assertIn('Created 3 categories', output)
+
+        self.assertEqual(verify_category_tree(), [])
+        lenses = Category.objects.get(name='Lenses')
+        self.assertEqual(
+            [category.name for category in lenses.get_ancestors()], ['Electronics', 'Cameras']
+        )
+        self.assertEqual(
+            lenses.path_ids, [*lenses.get_ancestors().values_list('id', flat=True), lenses.id]
+        )
+        # Siblings are ordered by name, as MPTTMeta.order_insertion_by requires.
+        self.assertEqual(
+            [category.name for category in Category.objects.get(name='Electronics').get_children()],
+            ['Cameras', 'Phones'],
+        )
+        self.assertEqual(Category.objects.get(name='Books').description, 'Paper and ebooks.')
+        self.assertEqual(CategoryStats.objects.count(), Category.objects.count())
+        self.assertIn('Created 0 categories', self.load('again.csv', 'path\nGarden/Tools\n'))
+
+    def test_conflicting_parent(self):
+        self.load('tree.csv', 'path\nElectronics/Cameras\n')
+        with self.assertRaisesMessage(CommandError, 'already exists under another parent'):
+            self.load('conflict.csv', 'path\nPhotography/Cameras\n')
+        self.assertFalse(Category.objects.filter(name='Photography').exists())
+
+    def test_verify_and_rebuild(self):
+        self.load('tree.csv', 'path\nElectronics/Phones\nElectronics/Cameras\n')
+        Category.objects.filter(name='Phones').update(lft=F('lft') + 1)
+        self.assertNotEqual(verify_category_tree(), [])
+        with self.assertRaises(CommandError):
+            call_command('verify_category_tree', stdout=StringIO())
+
+        call_command('verify_category_tree', rebuild=True, stdout=StringIO())
+        self.assertEqual(verify_category_tree(), [])
+
+        Category.objects.filter(name='Cameras').update(path='1/')
+        self.assertEqual(verify_category_tree(), ['"Cameras" has a stale path.'])
+
+
+class CategoryPaginationTests(TestCase):
+    """Keyset cursors round-trip, and following the page links visits every product once."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.category = Category.objects.create(name='Paginated')
+        products = Product.objects.bulk_create([
+            Product(name=f'Product {index:02}', manufacturer='Acme', price=Decimal(index % 4))
+            for index in range(11)
+        ])
+        self.category.products.add(*products)
+
+    def test_cursor_round_trip(self):
+        product = Product.objects.get(name='Product 05')
+        for sort, value in (('name', 'Product 05'), ('-price', Decimal(1))):
+            with self.subTest(sort=sort):
+                self.assertEqual(
+                    decode_cursor(encode_cursor(product, sort), sort), (value, product.id)
+                )
+        for cursor in ('not base64!', base64.urlsafe_b64encode(b'[1]').decode(), ''):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor, 'price')
+
+    @override_settings(STORE_CATEGORY_PAGE_SIZE=3, STORE_CATEGORY_PAGE_WINDOW=1)
+    def test_pages_cover_every_product(self):
+        url = f'/category/{self.category.id}/products/'
+        for sort in SORTS:
+            with self.subTest(sort=sort):
+                expected = Product.objects.order_by(sort, '-id' if sort.startswith('-') else 'id')
+                names, numbers = [], []
+                query = f'?sort={sort}'
+                while query:
+                    get_cache().clear()
+                    page = self.client.get(url + query).context['page_object']
+                    names.extend(product.name for product in page.object_list)
+                    numbers.append(page.number)
+                    self.assertEqual(page.num_pages, 4)
+                    query = page.next
+                self.assertEqual(names, [product.name for product in expected])
+                self.assertEqual(numbers, [1, 2, 3, 4])
+
+                get_cache().clear()
+                last = self.client.get(f'{url}?sort={sort}&page=last').context['page_object']
+                self.assertEqual([product.name for product in last.object_list], names[9:])
+                self.assertEqual(last.number, 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/category/{self.category.id}/products/?after=garbage&page=2')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductPageTests(TestCase):
+    """Breadcrumbs of the product pages, built from the stored category paths."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.root = Category.objects.create(name='Root')
+        self.leaf = Category.objects.create(name='Leaf', parent=self.root)
+        self.product = Product.objects.create(
+            name='Toaster', manufacturer='Acme', price=Decimal(20), stock_quantity=1
+        )
+        self.leaf.products.add(self.product)
+
+    def test_stale_path(self):
+        # The path still names a category deleted without the signals, and lacks the root.
+        missing = Category.objects.order_by('-id').values_list('id', flat=True).first() + 1
+        Category.objects.filter(id=self.leaf.id).update(path=f'{missing}/{self.leaf.id}/')
+
+        url = f'/category/{{}}/products/{self.product.id}/'
+        self.assertEqual(self.client.get(url.format(missing)).status_code, 404)
+        response = self.client.get(url.format(self.leaf.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['category'], self.leaf)
+        self.assertEqual(response.context['breadcrumbs'], [self.leaf])
+
+        self.assertEqual(self.client.get(f'/async{url.format(missing)}').status_code, 404)
+        self.assertEqual(self.client.get(f'/async{url.format(self.leaf.id)}').content, response.content)
+
+
+class CategoryStatsTests(TestCase):
+    """The statistics kept by the signal receivers match statistics computed from scratch."""
+
+    def setUp(self):
+        self.root = Category.objects.create(name='Root')
+        self.branch = Category.objects.create(name='Branch', parent=self.root)
+        self.leaf = Category.objects.create(name='Leaf', parent=self.branch)
+        self.other = Category.objects.create(name='Other')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {index}', manufacturer='Acme',
+                price=Decimal(10 * index), stock_quantity=index,
+            )
+            for index in (1, 2, 3)
+        ]
+
+    def stats(self, category: Category) -> CategoryStats:
+        return CategoryStats.objects.get(category=category)
+
+    def assertStatsCurrent(self):
+        expected = {stats.category_id: stats for stats in compute_category_stats(Category.objects.all())}
+        stored = {stats.category_id: stats for stats in CategoryStats.objects.all()}
+        self.assertEqual(stored.keys(), expected.keys())
+        for category_id, stats in stored.items():
+            for field in STATS_FIELDS:
+                if field != 'updated_at':
+                    with self.subTest(category=category_id, field=field):
+                        # Stored averages are rounded to the cents of the column.
+                        self.assertEqual(*(
+                            round(value, 2) if isinstance(value, Decimal) else value
+                            for value in (getattr(stats, field), getattr(expected[category_id], field))
+                        ))
+
+    def test_categories_added_and_removed(self):
+        first, second, third = self.products
+        first.categories.add(self.leaf, self.branch)
+        self.leaf.products.add(second, third)
+        self.assertStatsCurrent()
+        # A product in two categories of the subtree is counted once.
+        self.assertEqual(self.stats(self.root).cumulative_product_count, 3)
+        self.assertEqual(self.stats(self.branch).direct_product_count, 1)
+        self.assertEqual(self.stats(self.root).total_stock_value, Decimal(10 + 40 + 90))
+
+        first.categories.remove(self.leaf)
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.leaf).cumulative_product_count, 2)
+
+        self.leaf.products.clear()
+        first.categories.clear()
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).cumulative_product_count, 0)
+        self.assertIsNone(self.stats(self.root).min_price)
+
+    def test_product_saved_and_deleted(self):
+        first, second, _ = self.products
+        self.leaf.products.add(first, second)
+
+        first.price = Decimal(50)
+        first.save()
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).max_price, Decimal(50))
+
+        second.delete()
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.branch).cumulative_product_count, 1)
+
+    def test_product_price_boundaries(self):
+        first, second, third = self.products
+        self.leaf.products.add(first, second, third)
+        self.root.products.add(first)
+
+        # Moving an inner price or widening the range needs no aggregation.
+        second.price = Decimal(5)
+        with CaptureQueriesContext(connection) as context:
+            second.save()
+        self.assertFalse([query for query in context.captured_queries if 'MIN(' in query['sql']])
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).min_price, Decimal(5))
+
+        # The minimum moving inwards is aggregated again.
+        second.price = Decimal(25)
+        second.save()
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).min_price, Decimal(10))
+
+        third.stock_quantity = 0
+        third.save(update_fields=['stock_quantity'])
+        first.delete()
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).direct_product_count, 0)
+        self.assertEqual(self.stats(self.leaf).min_price, Decimal(25))
+
+        second.delete()
+        third.delete()
+        self.assertStatsCurrent()
+        self.assertIsNone(self.stats(self.root).avg_price)
+
+    def test_category_moved(self):
+        self.leaf.products.add(*self.products)
+        self.branch.products.add(self.products[0])
+
+        leaf = Category.objects.get(id=self.leaf.id)
+        leaf.parent = self.other
+        leaf.save()
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).cumulative_product_count, 1)
+        self.assertEqual(self.stats(self.other).cumulative_product_count, 3)
+
+        Category.objects.get(id=self.branch.id).move_to(self.other, 'first-child')
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).cumulative_product_count, 0)
+
+    def test_category_deleted(self):
+        self.leaf.products.add(*self.products[:2])
+        self.root.products.add(self.products[2])
+
+        Category.objects.get(id=self.branch.id).delete()
+        self.assertStatsCurrent()
+        self.assertEqual(self.stats(self.root).cumulative_product_count, 1)
+        self.assertEqual(self.stats(self.root).direct_product_count, 1)
+
+
+class SearchIndexTests(TestCase):
+    """The FTS5 index is maintained in batches of ids, below the SQLite variable limit."""
+
+    def test_batches(self):
+        products = Product.objects.bulk_create(
+            Product(name=f'Gadget {index}', manufacturer='Acme', price=Decimal(10), stock_quantity=1)
+            for index in range(5)
+        )
+        backend = SQLiteFTS5Backend()
+        backend.batch_size = 2
+        product_ids = [product.id for product in products]
+        backend.remove_products(product_ids)
+        self.assertEqual(backend.search('gadget'), [])
+
+        backend.index_products(iter(product_ids))
+        self.assertCountEqual([product_id for product_id, _ in backend.search('gadget')], product_ids)
+
+        backend.remove_products(product_ids[1:])
+        self.assertEqual([product_id for product_id, _ in backend.search('gadget')], product_ids[:1])
+
+
+class ProductImportExportTests(TestCase):
+    """Exported catalogs import back to the same products, categories and statistics."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.parent = Category.objects.create(name='Kitchen')
+        self.child = Category.objects.create(name='Toasters', parent=self.parent)
+        toaster = Product.objects.create(
+            sku='TOAST-1', name='Toaster', description='Two slots, "wide"', manufacturer='Acme',
+            price=Decimal('24.90'), stock_quantity=5,
+        )
+        toaster.categories.add(self.child, self.parent)
+        Product.objects.create(
+            sku='KETTLE-1', name='Kettle', manufacturer='Globex', price=Decimal('19.00'),
+            is_active=False,
+        )
+
+    def snapshot(self) -> list[tuple]:
+        return [
+            (product.sku, product.name, product.description or '', product.manufacturer,
+             product.price, product.stock_quantity, product.is_active,
+             [category.name for category in product.categories.order_by('name')])
+            for product in Product.objects.order_by('sku')
+        ]
+
+    def round_trip(self, file_format: str):
+        path = str(Path(self.directory.name) / f'catalog.{file_format}')
+        call_command('export_products', path, format=file_format, stderr=StringIO())
+        expected = self.snapshot()
+
+        Product.objects.all().delete()
+        self.assertEqual(CategoryStats.objects.get(category=self.parent).cumulative_product_count, 0)
+        call_command('import_products', path, stdout=StringIO())
+
+        self.assertEqual(self.snapshot(), expected)
+        stats = CategoryStats.objects.get(category=self.parent)
+        self.assertEqual(stats.cumulative_product_count, 1)
+        self.assertEqual(stats.total_stock_value, Decimal('124.50'))
+        self.assertEqual(Product.objects.get(sku='TOAST-1').primary_root_id, self.parent.id)
+
+    def test_csv_round_trip(self):
+        self.round_trip('csv')
+
+    def test_jsonl_round_trip(self):
+        self.round_trip('jsonl')
+
+    def test_import_updates_by_sku(self):
+        path = Path(self.directory.name) / 'update.csv'
+        path.write_text(
+            'sku,name,manufacturer,price,categories\n'
+            'TOAST-1,Toaster XL,Acme,30.00,Toasters|Unknown\n'
+            'NEW-1,Blender,Initech,45.00,Kitchen\n',
+            encoding='utf-8',
+        )
+        output = StringIO()
+        call_command('import_products', str(path), stdout=output)
+
+        self.assertIn('Skipped unknown categories: Unknown.', output.getvalue())
+        toaster = Product.objects.get(sku='TOAST-1')
+        self.assertEqual((toaster.name, toaster.price, toaster.stock_quantity), ('Toaster XL', 30, 5))
+        self.assertEqual(list(toaster.categories.all()), [self.child])
+        stats = CategoryStats.objects.get(category=self.parent)
+        self.assertEqual((stats.direct_product_count, stats.cumulative_product_count), (1, 2))
+
+    def test_export_skips_products_without_sku(self):
+        Product.objects.create(name='Legacy', manufacturer='Acme', price=Decimal(1))
+        path = str(Path(self.directory.name) / 'catalog.jsonl')
+        errors = StringIO()
+        call_command('export_products', path, format='jsonl', stderr=errors)
+
+        with open(path, encoding='utf-8') as file:
+            self.assertEqual(
+                sorted(json.loads(line)['sku'] for line in file), ['KETTLE-1', 'TOAST-1']
+            )
+        self.assertIn('Skipped 1 products without a SKU', errors.getvalue())
+
+    def test_sku_backfill(self):
+        # Products without SKUs get one from their id, unless another product holds it.
+        first = Product.objects.create(name='Mixer', manufacturer='Acme', price=Decimal(50))
+        second = Product.objects.create(name='Grill', manufacturer='Acme', price=Decimal(60), sku='')
+        Product.objects.filter(sku='KETTLE-1').update(sku=f'PRODUCT-{second.id}')
+
+        import_module('store.migrations.0011_backfill_product_sku').backfill_skus(apps, None)
+
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('sku', flat=True)),
+            ['TOAST-1', f'PRODUCT-{second.id}', f'PRODUCT-{first.id}', f'PRODUCT-{second.id}-2'],
+        )
@@ -1,13 +1,25 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name='store'
 
 urlpatterns = [
     path('', views.store_homepage, name='store_homepage'),
     path('products/', views.list_products, name='products'),
+    path('products/feed/', views.products_feed, name='products_feed'),
+    path('products/browse/', views.browse_products, name='products_browse'),
+    path('search/', views.search_products, name='search'),
     path('categories/', views.list_categories, name='product_categories'),
+    path('categories/tree/', views.category_tree, name='category_tree'),
     path('category/', views.categories_list_view, name='categories_list'),
     path('category/<int:category_id>/products/', views.category_detailed_view, name='category_products'),
     path('category/<int:category_id>/products/<int:product_id>/', views.product_detailed_view, name='product_page'),
+    path('async/products/', async_views.list_products, name='async_products'),
+    path('async/products/feed/', async_views.products_feed, name='async_products_feed'),
+    path('async/categories/', async_views.list_categories, name='async_product_categories'),
+    path('async/category/', async_views.categories_list_view, name='async_categories_list'),
+    path('async/category/<int:category_id>/products/', async_views.category_detailed_view,
+         name='async_category_products'),
+    path('async/category/<int:category_id>/products/<int:product_id>/', async_views.product_detailed_view,
+         name='async_product_page'),
 ]
@@ -1,10 +1,76 @@
-from django.db.models.functions import Coalesce
-from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
-from django.db.models import Count, Sum, Max, Min, Avg, F, Prefetch, Q, OuterRef, Subquery
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from datetime import datetime, timezone
+from typing import Optional
 
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404
+from django.db.models import F, Prefetch
+from django.http import (
+    HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+from django.views.decorators.http import condition
+
+from ecommerce_platform.db_routing import use_replica
+
+from .caching import (
+    catalog_etag, catalog_last_modified, categories_page_key, category_page_key, category_tree_etag,
+    product_page_key, versioned_cache_page,
+)
+from .category_tree import breadcrumb_categories, category_tree_json
+from .facets import compute_facets, filter_products, parse_filters
+from .feeds import attach_categories, serialize_product, stream_product_feed
+from .images import image_srcsets
 from .models import Product, Category
+from .pagination import SORTS, build_page, page_queries, parse_page_request
+from .search import get_search_backend
+from .serialization import (
+    CATEGORY_FIELDS, PRODUCT_FIELDS, encoded_response, json_response, parse_fields, select_fields,
+    serialize_products, serialize_rows, wants_pretty,
+)
+from .stats import get_category_stats, subtree_products
+
+
+def parse_keyset_params(request: HttpRequest) -> tuple[Optional[int], int]:
+    """
+    Read the `after` cursor and the `limit` page size of a keyset-paginated request.
+
+    @param request: The HTTP request object.
+    @return: The cursor, or None for the first page, and the page size.
+    @raise ValueError: If a parameter is not a valid integer.
+    """
+    try:
+        after_id = int(request.GET['after']) if request.GET.get('after') else None
+        limit = int(request.GET.get('limit', settings.STORE_FEED_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('after and limit must be integers.') from None
+
+    if limit < 1:
+        raise ValueError('limit must be a positive integer.')
+
+    return after_id, min(limit, settings.STORE_FEED_MAX_PAGE_SIZE)
+
+
+def parse_since(request: HttpRequest) -> Optional[datetime]:
+    """
+    Read the `since` parameter of a delta request, as ISO 8601 or Unix time.
+
+    @param request: The HTTP request object.
+    @return: The aware datetime, or None when the parameter is missing.
+    @raise ValueError: If the parameter is not a valid timestamp.
+    """
+    value = request.GET.get('since')
+    if not value:
+        return None
+
+    try:
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        pass
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError('since must be an ISO 8601 datetime or a Unix timestamp.')
+    return make_aware(since) if is_naive(since) else since
 
 
 def store_homepage(request: HttpRequest) -> HttpResponse:
@@ -17,62 +83,202 @@ def store_homepage(request: HttpRequest) -> HttpResponse:
     return HttpResponse('Welcome to the Store!')
 
 
-def list_products(request: HttpRequest) -> JsonResponse:
+@use_replica
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def list_products(request: HttpRequest) -> HttpResponse:
     """
     Return a JSON response with a list of products and their details,
     including id, categories, price, image URL, stock, creation, and update timestamps.
 
+    Responses carry the ETag and Last-Modified of the catalog version, and requests
+    whose If-None-Match or If-Modified-Since match it get a 304 without any query.
+    With `since`, only the products created or updated after that time are listed;
+    deleted products are not reported.
+
+    Query parameters:
+        fields: Comma-separated fields to include, e.g. `id,name,price`; all by default.
+        since: Only list the products updated after this ISO 8601 or Unix time.
+        pretty: `1` to indent the JSON document.
+
     @param request: The HTTP request object.
-    @return: JSON containing product information.
+    @return: JSON containing product information, compressed if the client accepts it.
+    """
+    try:
+        since = parse_since(request)
+        fields = parse_fields(request, PRODUCT_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    products = Product.objects.order_by('id')
+    if since is not None:
+        products = products.filter(updated_at__gt=since)
+
+    return json_response(request, serialize_products(products, fields))
+
+
+def products_feed(request: HttpRequest) -> HttpResponse:
+    """
+    Stream one page of the product catalog as JSON, using keyset pagination on the product id.
+    Products are read in batches from a server-side cursor, so memory use does not grow
+    with the size of the catalog.
+
+    Query parameters:
+        after: The `next_cursor` value returned by the previous page.
+        limit: The number of products in a page, capped by `STORE_FEED_MAX_PAGE_SIZE`.
+
+    @param request: The HTTP request object.
+    @return: A streaming JSON response with `results` and `next_cursor`.
+    """
+    try:
+        after_id, limit = parse_keyset_params(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    content = stream_product_feed(after_id, limit, settings.STORE_FEED_CHUNK_SIZE)
+
+    return StreamingHttpResponse(content, content_type='application/json')
+
+
+def browse_products(request: HttpRequest) -> JsonResponse:
     """
-    products = Product.objects.all()
-    data = []
+    Return a JSON response with one keyset page of filtered products and the facet counts
+    of the filtered catalog: per manufacturer, per price bucket, per stock availability,
+    per active status and per child category.
 
-    for item in products:
-        data.append({
-            'id': item.id,
-            'name': item.name,
-            'price': item.price,
-            'stock_quantity': item.stock_quantity,
-            'image_url': item.image.url if item.image.url else None,
-            'time_of_creation': item.created_at,
-            'time_of_update': item.updated_at,
-            'active_status': item.is_active,
-            'categories': [{'id': cat.id, 'name': cat.name} for cat in item.categories.all()],
-        })
+    Query parameters:
+        manufacturer: Keep products of these manufacturers; can be repeated.
+        price_min, price_max: Keep products in this price range.
+        in_stock, is_active: Keep products with this availability or active status.
+        category: Keep products in the subtree of this category.
+        after, limit: Keyset pagination, as in `products_feed`.
 
-    return JsonResponse(data, safe=False, json_dumps_params={'indent': 2})
+    @param request: The HTTP request object.
+    @return: JSON containing `results`, `next_cursor` and `facets`.
+    """
+    try:
+        after_id, limit = parse_keyset_params(request)
+        filters, category = parse_filters(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except Category.DoesNotExist:
+        return JsonResponse({'error': 'category does not exist.'}, status=404)
+
+    products = filter_products(filters).order_by('id')
+    if after_id is not None:
+        products = products.filter(id__gt=after_id)
+
+    page = list(products[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    attach_categories(page)
+
+    return JsonResponse({
+        'results': [serialize_product(product) for product in page],
+        'next_cursor': page[-1].id if has_more else None,
+        'facets': compute_facets(filters, category),
+    })
+
+
+def search_products(request: HttpRequest) -> JsonResponse:
+    """
+    Return a JSON response with the products matching a full-text query, best match first.
+    Every word of the query is matched as a prefix against the product name, description,
+    manufacturer and category names.
 
+    Query parameters:
+        q: The search text.
+        category: Restrict the results to the subtree of this category.
+        limit: The maximum number of results, capped by `STORE_FEED_MAX_PAGE_SIZE`.
 
-def list_categories(request: HttpRequest) -> JsonResponse:
+    @param request: The HTTP request object.
+    @return: JSON containing the ranked products and their relevance score.
+    """
+    query = request.GET.get('q', '')
+    try:
+        category_id = int(request.GET['category']) if request.GET.get('category') else None
+        limit = int(request.GET.get('limit', settings.STORE_SEARCH_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'category and limit must be integers.'}, status=400)
+
+    category = None
+    if category_id is not None:
+        category = get_object_or_404(Category.objects.only('tree_id', 'lft', 'rght'), id=category_id)
+
+    limit = max(1, min(limit, settings.STORE_FEED_MAX_PAGE_SIZE))
+    ranked = get_search_backend().search(query, category=category, limit=limit)
+    products = Product.objects.in_bulk([product_id for product_id, _ in ranked])
+    results = [
+        (products[product_id], score) for product_id, score in ranked if product_id in products
+    ]
+    attach_categories([product for product, _ in results])
+
+    data = [
+        {**serialize_product(product), 'score': round(score, 4)} for product, score in results
+    ]
+
+    return JsonResponse({'query': query, 'results': data})
+
+
+@use_replica
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def list_categories(request: HttpRequest) -> HttpResponse:
     """
     Return a JSON response with a list of categories and their details,
     including their id, parent, description, and timestamps.
 
+    Conditional requests and the `since`, `fields` and `pretty` parameters work as
+    for `list_products`.
+
     @param request: The HTTP request object.
-    @return: JSON containing category information.
+    @return: JSON containing category information, compressed if the client accepts it.
+    """
+    try:
+        since = parse_since(request)
+        fields = parse_fields(request, CATEGORY_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    categories = Category.objects.order_by('tree_id', 'lft')
+    if since is not None:
+        categories = categories.filter(updated_at__gt=since)
+
+    rows = select_fields(categories, CATEGORY_FIELDS, fields)
+
+    return json_response(request, serialize_rows(rows, CATEGORY_FIELDS, fields))
+
+
+@use_replica
+@condition(etag_func=category_tree_etag)
+def category_tree(request: HttpRequest) -> HttpResponse:
     """
-    categories = Category.objects.all()
+    Return the category tree as nested JSON nodes with `id`, `name`, `has_children`
+    and `children`, from a single query. The document is cached until a category
+    changes, and its ETag is the category version.
 
-    data = []
+    Query parameters:
+        root: Only return the subtree of this category.
+        depth: The number of levels included below the top nodes; all by default.
+        pretty: `1` to indent the JSON document.
 
-    for category in categories:
-        data.append({
-            'id': category.id,
-            'name': category.name,
-            'description': category.description,
-            'time_of_creation': category.created_at,
-            'time_of_update': category.updated_at,
-            'active_status': category.is_active,
-            'parent_category': {
-                'id': category.parent.id,
-                'name': category.parent.name,
-            } if category.parent else None,
-        })
+    @param request: The HTTP request object.
+    @return: JSON containing the list of top nodes, compressed if the client accepts it.
+    """
+    try:
+        root_id = int(request.GET['root']) if request.GET.get('root') else None
+        depth = int(request.GET['depth']) if request.GET.get('depth') else None
+    except ValueError:
+        return JsonResponse({'error': 'root and depth must be integers.'}, status=400)
+    if depth is not None and depth < 0:
+        return JsonResponse({'error': 'depth must not be negative.'}, status=400)
 
-    return JsonResponse(data, safe=False, json_dumps_params={'indent': 2})
+    content = category_tree_json(root_id, depth, pretty=wants_pretty(request))
+    if content is None:
+        return JsonResponse({'error': 'category does not exist.'}, status=404)
 
+    return encoded_response(request, content)
 
+
+@versioned_cache_page(categories_page_key)
 def categories_list_view(request: HttpRequest) -> HttpResponse:
     """
     Renders a list of root categories and the amount of their products.
@@ -80,85 +286,109 @@ def categories_list_view(request: HttpRequest) -> HttpResponse:
     @param request: The HTTP request object.
     @return: The HTTP response with the rendered list of root categories and product amounts.
     """
-    product_count_subquery = Product.objects.filter(
-        Q(categories=OuterRef('pk')) |
-        Q(categories__lft__gt=OuterRef('lft'),
-          categories__rght__lt=OuterRef('rght'),
-          categories__tree_id=OuterRef('tree_id'))
-    ).values('categories__tree_id').annotate(
-        product_count=Count('id', distinct=True)
-    ).values('product_count')
-
-    root_categories = Category.objects.root_nodes().annotate(
-        total_products=Coalesce(Subquery(product_count_subquery), 0)
-    )
+    root_categories = Category.objects.root_nodes().select_related('stats')
 
     categories_data = [{
         'category': category,
-        'total_products': category.total_products,
+        'total_products': get_category_stats(category).cumulative_product_count,
     } for category in root_categories]
 
     return render(request, "categories.html", {'categories': categories_data})
 
 
+@versioned_cache_page(category_page_key)
 def category_detailed_view(request: HttpRequest, category_id: int) -> HttpResponse:
     """
     Renders the detailed view of a category, including products under the category tree,
     and statistics, e.g. most expensive product, cheapest product, average price,
-    and total value of products
+    and total value of products. Products are paginated by `store.pagination`, in the
+    order of `?sort=`, from the cursor of `?after=`.
 
     @param request: The HTTP request object.
     @param category_id: The ID of the category to retrieve.
     @return: The HTTP response with the rendered category details, products, and statistics.
     """
-    category = get_object_or_404(Category, id=category_id)
-    products = Product.objects.filter(
-        categories__in=category.get_descendants()).distinct().annotate(
-        total_value=F('price') * F('stock_quantity')
-    )
-
-    paginator = Paginator(products, 3)
-    page_number = request.GET.get('page')
-    page_object = paginator.get_page(page_number)
-
-    statistics = products.aggregate(
-        category_total_value=Sum(F('price') * F('stock_quantity')),
-        max_price=Max('price'),
-        min_price=Min('price'),
-        avg_price=Avg('price'),
-        total_products=Count('id'),
-    )
+    try:
+        page_request = parse_page_request(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    category = get_object_or_404(Category.objects.select_related('stats'), id=category_id)
+    products = subtree_products(category).annotate(total_value=F('price') * F('stock_quantity'))
+
+    # The total comes from the statistics, rather than a COUNT of the subtree per page.
+    category_stats = get_category_stats(category)
+    total = category_stats.cumulative_product_count
+    results = [list(query) for query in page_queries(products, page_request, total)]
+    page_object = build_page(page_request, results, total)
+
+    statistics = {
+        'category_total_value': category_stats.total_stock_value,
+        'max_price': category_stats.max_price,
+        'min_price': category_stats.min_price,
+        'avg_price': category_stats.avg_price,
+        'total_products': category_stats.cumulative_product_count,
+    }
 
     context = {
         'category': category,
         'page_object': page_object,
+        'sorts': SORTS,
         'statistics': statistics,
     }
 
     return render(request, 'category.html', context)
 
 
+def breadcrumb_category(product_categories: list[Category], category_id: int) -> Optional[Category]:
+    """
+    Pick the deepest category of a product within the category of its page URL,
+    whose path the breadcrumbs follow, from the paths alone.
+
+    @param product_categories: The categories of the product, with their path.
+    @param category_id: The ID of the category of the page URL.
+    @return: The category, or None when the product is not within that category.
+    """
+    within = [category for category in product_categories if category.is_within(category_id)]
+    return max(within, key=lambda category: len(category.path_ids), default=None)
+
+
+@versioned_cache_page(product_page_key)
 def product_detailed_view(request: HttpRequest, category_id: int, product_id: int) -> HttpResponse:
     """
-    Renders the detailed view of a product.
+    Renders the detailed view of a product, with breadcrumbs from the root category
+    to the deepest category of the product under the category of the URL.
 
     @param request: The HTTP request object.
     @param category_id: The ID of the root category associated with the product.
     @param product_id: The ID of the product to retrieve.
     @return: The HTTP response with the rendered product details.
     """
-    category = get_object_or_404(Category.objects.only('id', 'name'), id=category_id)
     product = get_object_or_404(
         Product.objects.prefetch_related(
-            Prefetch('categories', queryset=Category.objects.only('name')),
+            Prefetch('categories', queryset=Category.objects.only('name', 'path')),
         ),
         id=product_id
     )
-    product_categories = ', '.join(category.name for category in product.categories.all())
+    product_categories = list(product.categories.all())
+
+    last = breadcrumb_category(product_categories, category_id)
+    if last is not None:
+        breadcrumbs = list(breadcrumb_categories(last))
+    else:
+        breadcrumbs = []
+    # The category of the URL is usually one of the breadcrumbs, loaded with them, unless
+    # the stored path is stale, e.g. the category was deleted since.
+    category = next((crumb for crumb in breadcrumbs if crumb.id == category_id), None)
+    if category is None:
+        category = get_object_or_404(Category.objects.only('id', 'name'), id=category_id)
+
     context = {
         'product': product,
-        'product_categories': product_categories,
+        'product_categories': ', '.join(category.name for category in product_categories),
         'category': category,
+        'breadcrumbs': breadcrumbs,
+        'image_srcsets': image_srcsets(product),
     }
 
     return render(request, 'product.html', context)
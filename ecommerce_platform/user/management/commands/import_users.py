@@ -0,0 +1,197 @@
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Optional
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from user.models import CustomUser
+
+IMPORTED_FIELDS = {
+    'username', 'email', 'first_name', 'last_name', 'phone_number', 'date_of_birth',
+    'gender', 'account_type', 'country', 'city', 'street_address', 'postal_code',
+    'is_verified', 'newsletter_subscription',
+}
+BOOLEAN_FIELDS = {'is_verified', 'newsletter_subscription'}
+UNIQUE_FIELDS = ('username', 'email')
+
+
+def _init_worker() -> None:
+    # Workers started with the "spawn" method do not inherit the configured apps.
+    if not django.apps.apps.ready:
+        django.setup()
+
+
+def _hash_passwords(passwords: list[Optional[str]]) -> list[str]:
+    return [make_password(password) for password in passwords]
+
+
+def read_rows(path: Path, file_format: str) -> Iterator[dict]:
+    """
+    Stream the rows of a CSV file with a header line, or of a JSON Lines file.
+
+    Args:
+        path: The file to read.
+        file_format: Either 'csv' or 'jsonl'.
+
+    Yields:
+        dict: One user record per row.
+    """
+    with path.open(newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-import users from a CSV or JSON Lines file. Rows hold CustomUser fields, '
+        'plus either a plain "password", hashed on import, or an already hashed "password_hash". '
+        'Users without a password get an unusable one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, help='The CSV or JSON Lines file to import.')
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'),
+            help='File format; guessed from the file extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help='Number of users inserted per query.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of processes hashing plain passwords in parallel.',
+        )
+        parser.add_argument(
+            '--account-type', choices=('individual', 'company'),
+            help='Account type of rows that do not set one.',
+        )
+        parser.add_argument(
+            '--skip-existing', action='store_true',
+            help='Skip rows whose username or email is already taken instead of failing.',
+        )
+
+    def check_rows(self, path: Path, file_format: str, skip_existing: bool, batch_size: int) -> set[int]:
+        """
+        Validate the usernames and emails of the whole file before anything is inserted,
+        so that a bad row does not abort the import after earlier batches were committed.
+
+        Args:
+            path: The file to read.
+            file_format: Either 'csv' or 'jsonl'.
+            skip_existing: Whether rows repeating a username or email are skipped.
+            batch_size: Number of values looked up per query.
+
+        Returns:
+            set[int]: Numbers of the rows to skip, counting from 1, which repeat a username
+            or email of an earlier row or of an existing user.
+
+        Raises:
+            CommandError: If a row lacks a username or email, or repeats one without
+            --skip-existing.
+        """
+        skipped = set()
+        # The row number of every username and email, first row first.
+        numbers = {field: {} for field in UNIQUE_FIELDS}
+        for number, row in enumerate(read_rows(path, file_format), 1):
+            values = {field: row.get(field) or '' for field in UNIQUE_FIELDS}
+            for field, value in values.items():
+                if not value.strip():
+                    raise CommandError(f'Row {number} has no {field}.')
+                if value in numbers[field]:
+                    if not skip_existing:
+                        raise CommandError(
+                            f'Row {number} repeats the {field} "{value}" of row {numbers[field][value]}.'
+                        )
+                    skipped.add(number)
+            if number not in skipped:
+                for field, value in values.items():
+                    numbers[field][value] = number
+
+        for field, field_numbers in numbers.items():
+            values = list(field_numbers)
+            for start in range(0, len(values), batch_size):
+                for value in CustomUser.objects.filter(
+                        **{f'{field}__in': values[start:start + batch_size]}
+                ).values_list(field, flat=True):
+                    if not skip_existing:
+                        raise CommandError(
+                            f'The {field} "{value}" of row {field_numbers[value]} is already taken.'
+                        )
+                    skipped.add(field_numbers[value])
+
+        return skipped
+
+    def build_user(self, row: dict, account_type: Optional[str]) -> CustomUser:
+        values = {field: value for field, value in row.items() if field in IMPORTED_FIELDS}
+        for field in BOOLEAN_FIELDS & values.keys():
+            if isinstance(values[field], str):
+                values[field] = values[field].strip().lower() in ('1', 'true', 'yes')
+        if account_type and not values.get('account_type'):
+            values['account_type'] = account_type
+        if not values.get('date_of_birth'):
+            values.pop('date_of_birth', None)
+
+        return CustomUser(password=row.get('password_hash') or '', **values)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'jsonl')
+        batch_size = options['batch_size']
+
+        started = time.perf_counter()
+        skipped = self.check_rows(path, file_format, options['skip_existing'], batch_size)
+        hashing_time = 0.0
+        processed = 0
+        # Counted from the table, as conflicting rows are ignored rather than reported.
+        existing = CustomUser.objects.count()
+        rows = (
+            row for number, row in enumerate(read_rows(path, file_format), 1) if number not in skipped
+        )
+
+        with ProcessPoolExecutor(options['workers'], initializer=_init_worker) as executor:
+            while batch := list(islice(rows, batch_size)):
+                users = [self.build_user(row, options['account_type']) for row in batch]
+
+                # Hash plain passwords in chunks spread over the worker processes.
+                hashing_started = time.perf_counter()
+                pending = [
+                    (user, row.get('password') or None)
+                    for user, row in zip(users, batch) if not user.password
+                ]
+                chunk_size = max(1, len(pending) // options['workers'] + 1)
+                chunks = [
+                    [password for _, password in pending[start:start + chunk_size]]
+                    for start in range(0, len(pending), chunk_size)
+                ]
+                hashes = [hashed for chunk in executor.map(_hash_passwords, chunks) for hashed in chunk]
+                for (user, _), hashed in zip(pending, hashes):
+                    user.password = hashed
+                hashing_time += time.perf_counter() - hashing_started
+
+                # Users created since the check still conflict; they are skipped too.
+                CustomUser.objects.bulk_create(
+                    users, batch_size=batch_size, ignore_conflicts=options['skip_existing']
+                )
+                processed += len(users)
+                self.stdout.write(f'Processed {processed} rows...')
+
+        elapsed = time.perf_counter() - started
+        processed += len(skipped)
+        imported = CustomUser.objects.count() - existing
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} users and skipped {processed - imported} of {processed} rows '
+            f'in {elapsed:.2f}s ({processed / elapsed if elapsed else 0:.0f} rows/s, '
+            f'{hashing_time:.2f}s spent hashing passwords).'
+        ))
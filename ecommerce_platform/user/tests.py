@@ -1,3 +1,48 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 
-# Create your tests here.
+from .models import CustomUser
+
+
+class ImportUsersTests(TestCase):
+    """The import_users command validates the whole file before inserting users."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'users.csv'
+        CustomUser.objects.create_user(username='taken', email='taken@example.com')
+
+    def import_users(self, *rows: str, **options) -> str:
+        self.path.write_text(
+            'username,email,password_hash\n' + ''.join(f'{row},!\n' for row in rows), encoding='utf-8'
+        )
+        output = StringIO()
+        call_command('import_users', str(self.path), batch_size=2, stdout=output, **options)
+        return output.getvalue()
+
+    def test_invalid_rows_abort_before_inserting(self):
+        for rows, message in (
+            (('ann,ann@example.com', 'bob,'), 'Row 2 has no email.'),
+            (('ann,ann@example.com', 'bob,bob@example.com', 'ann2,ann@example.com'),
+             'Row 3 repeats the email "ann@example.com" of row 1.'),
+            (('ann,ann@example.com', 'bob,bob@example.com', 'taken,new@example.com'),
+             'The username "taken" of row 3 is already taken.'),
+        ):
+            with self.subTest(message=message), self.assertRaisesMessage(CommandError, message):
+                self.import_users(*rows)
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_skip_existing(self):
+        output = self.import_users(
+            'ann,ann@example.com', 'bob,bob@example.com', 'ann,other@example.com',
+            'carl,taken@example.com', 'dan,dan@example.com', skip_existing=True,
+        )
+        self.assertIn('Imported 3 users and skipped 2 of 5 rows', output)
+        self.assertCountEqual(
+            CustomUser.objects.values_list('username', flat=True), ['taken', 'ann', 'bob', 'dan']
+        )